@@ -28,36 +28,50 @@ def main_menu():
         f"2) Convert Date to Block Number\n"
         f"3) Export Log Data into csv\n"
         f"4) Call Contract function\n"
+        f"5) Follow Log Data live into csv\n"
+        f"6) Build Block Time Index (current network)\n"
+        f"7) Convert Timestamps/Dates to Block Numbers in bulk\n"
+        f"8) Export Log Data of several models concurrently (async)\n"
         f"9) Exit\n"
     )
 
 
+def run_option(choice: str):
+    if choice == "0":
+        dt.change_network()
+    elif choice == "1":
+        dt.get_block_number_by_timestamp()
+    elif choice == "2":
+        dt.get_block_number_by_date()
+    elif choice == "3":
+        dt.export_log_data()
+    elif choice == "4":
+        dt.export_call_data()
+    elif choice == "5":
+        dt.follow_log_data()
+    elif choice == "6":
+        dt.update_block_index()
+    elif choice == "7":
+        dt.export_block_numbers()
+    elif choice == "8":
+        dt.export_log_data_async()
+
+
 if __name__ == "__main__":
-    dt = None
-    try:
-        dt = DemonicTutor(NETWORKS["ETHEREUM"])
-    except ConnectionError as ce:
-        logger.error(ce)
-        exit()
-    except Exception as e:
-        logger.error(f"Unexpected error during initialization: {e}")
-        exit()
+    # the node is connected on first use, by the option needing it
+    dt = DemonicTutor(NETWORKS["ETHEREUM"])
 
     while True:
         clear_screen()
         main_menu()
         choice = input("Please choose an option (0-9): ")
-        if choice == "0":
-            dt.change_network()
-        elif choice == "1":
-            dt.get_block_number_by_timestamp()
-        elif choice == "2":
-            dt.get_block_number_by_date()
-        elif choice == "3":
-            dt.export_log_data()
-        elif choice == "4":
-            dt.export_call_data()
-        elif choice == "9":
+        try:
+            run_option(choice)
+        except ConnectionError as ce:
+            logger.error(ce)
+        except Exception as e:
+            logger.error(f"Unexpected error running option {choice}: {e}")
+        if choice == "9":
             break
-        if choice in ["1", "2", "3", "4"]:
+        if choice in ["1", "2", "3", "4", "5", "6", "7", "8"]:
             input("Press Enter to continue...")
@@ -1,8 +1,89 @@
 LOG_BACKUP_COUNT = 15  # Number of log backups to retain
 LOG_FILE_MAX_SIZE = 300 * 10**6  # 300 MB
+LOG_FOLDER = "logs"  # Folder of the dated log files (relative to the working directory)
+LOG_LEVEL = "INFO"  # Level of the app loggers (overridden by the LOG_LEVEL env variable)
+LOG_PROGRESS_INTERVAL = 2  # Min seconds between progress messages (e.g.: blocks processed)
 EVM_WORD_SIZE = (
     32  # Size in bytes for each record in the data section of an Ethereum event
 )
+FETCH_WORKERS = 4  # Default number of concurrent workers fetching event logs
+FETCH_BUFFER_PER_WORKER = 2  # Chunks fetched ahead per worker before pausing (backpressure)
+FETCH_RETRIES = 3  # Retries on transient (network) errors for the same block range
+FETCH_RETRY_DELAY = 1  # Seconds to wait before the first retry (doubled on each retry)
+CHUNK_INITIAL_SIZE = 10_000  # Blocks per eth_getLogs call when no chunk size is remembered
+CHUNK_GROWTH_FACTOR = 2  # Chunk size multiplier after a sparse successful call
+CHUNK_GROWTH_THRESHOLD = 0.25  # Grow only if results < 25% of the provider's result limit
+CHUNK_SIZES_FILE = "chunk_sizes.json"  # Remembered chunk sizes per network, contract & topic0
+LOG_CACHE_FOLDER = "logs"  # Sub-folder (in the cache folder) for the raw eth_getLogs cache
+FOLLOW_POLL_INTERVAL = 12  # Seconds between eth_getLogs polls in follow mode
+FOLLOW_REORG_DEPTH = 12  # Recent blocks re-checked for reorgs in follow mode
+HEADER_CACHE_SIZE = 100_000  # Block timestamps kept in memory (LRU) per network
+HEADER_CACHE_FOLDER = "headers"  # Sub-folder (in the cache folder) for block timestamps
+HEADER_FETCH_BATCH = 100  # Block headers fetched per batch when enriching events
+RPC_BATCH_SIZE = 100  # Max requests per JSON-RPC batch (halved if refused by the provider)
+MULTICALL3_ADDR = "0xcA11bde05977b3631167028862bE2a173976CA11"  # Same on all EVM networks
+MULTICALL_GAS_LIMIT = 50_000_000  # Gas of each aggregate3 eth_call (geth's default RPC gas cap)
+MULTICALL_CALL_GAS = 100_000  # Gas budgeted per sub-call, to size aggregate3 calls
+# Errors of an aggregate3 call too large to succeed as a whole, which is then split
+# (others, e.g.: rate limits, are raised as is)
+MULTICALL_SPLIT_ERRORS = (
+    "out of gas",
+    "execution reverted",
+    "gas required exceeds",
+    "exceeds block gas limit",
+    "response size exceeded",
+    "http 413",
+)
+BLOCK_INDEX_FOLDER = "blocks"  # Sub-folder (in the cache folder) for the block time index
+BLOCK_INDEX_STEP = 1_000  # Blocks between samples of the block time index
+BLOCK_INDEX_BATCH = 10_000  # Samples fetched before appending them to the index file
+POOL_MAX_ATTEMPTS = 5  # Endpoints tried per request before giving up (at least one each)
+POOL_BREAKER_THRESHOLD = 3  # Consecutive failures that open the circuit of an endpoint
+POOL_BREAKER_COOLDOWN = 30  # Seconds an endpoint is left out after its circuit opens
+POOL_BACKOFF_BASE = 1  # Seconds an endpoint rests after a 429 (doubled on each one in a row)
+POOL_BACKOFF_MAX = 60  # Max seconds an endpoint rests after consecutive 429s
+POOL_TIMEOUT = 30  # Seconds before an HTTP request to an endpoint times out
+ASYNC_MAX_CONNECTIONS = 200  # Max open connections of the shared aiohttp session (all hosts)
+ASYNC_MAX_CONNECTIONS_PER_HOST = 100  # Max open connections to the same node provider
+ASYNC_FETCH_WORKERS = 16  # Default number of concurrent eth_getLogs tasks per async extraction
+RUNNER_MAX_JOBS = 8  # Max jobs (models) run at a time by the batch runner
+RUNNER_JOBS_PER_NETWORK = 2  # Default max jobs at a time per network in the batch runner
+METRICS_FOLDER = "metrics"  # Sub-folder (in the output folder) for the run metrics
+METRICS_PREFIX = "demonic_tutor"  # Prefix of the metric names in the Prometheus files
+# Upper bounds (seconds) of the JSON-RPC latency histogram buckets
+METRICS_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Read-only JSON-RPC methods whose identical requests in flight are sent once (batch runner)
+MERGE_METHODS = ("eth_getLogs", "eth_getBlockByNumber", "eth_call", "eth_blockNumber")
+HEDGE_PERCENTILE = 95  # Latency percentile after which a read request is hedged
+HEDGE_MIN_SAMPLES = 20  # Latencies of a method needed before hedging its requests
+HEDGE_WINDOW = 200  # Recent latencies kept per method
+HEDGE_MAX_PER_SECOND = 2  # Max hedged (duplicated) requests per second and network
+HEDGE_WORKERS = 32  # Threads sending the primary & hedged requests of a pool
+# Read-only JSON-RPC methods, which can be sent twice (hedged) without side effects
+HEDGE_METHODS = (
+    "eth_getLogs",
+    "eth_getBlockByNumber",
+    "eth_call",
+    "eth_blockNumber",
+    "eth_chainId",
+    "eth_getTransactionReceipt",
+)
+# Compute units per JSON-RPC method, to rate-limit endpoints by provider budget (Alchemy's)
+COMPUTE_UNITS = {
+    "eth_getLogs": 75,
+    "eth_call": 26,
+    "eth_getBlockByNumber": 16,
+    "eth_blockNumber": 10,
+    "eth_chainId": 0,
+    "default": 20,
+}
+# Errors returned by the providers when their request rate limit is exceeded
+PROVIDER_RATE_LIMIT_ERRORS = (
+    "rate limit",
+    "too many requests",
+    "request rate exceeded",  # Infura
+    "compute units per second",  # Alchemy
+)
 DEFAULT_CALL_FILE = "default_call.json"
 DEFAULT_EVENT_FILE = "default_event.json"
 NETWORKS = {
@@ -21,4 +102,34 @@ GENESIS_TS = {
     "OPTIMISM": 1610639500, # Thursday 14 January 2021 15:51:40
     "POLYGON": 1590824836, # Saturday 30 May 2020 7:47:16
 }
+# Range and result limits for eth_getLogs, by provider host (None if not limited)
+PROVIDER_LIMIT_PROFILES = {
+    "infura.io": {"max_range": None, "max_results": 10_000},
+    "alchemy.com": {"max_range": None, "max_results": 10_000},
+    "quiknode.pro": {"max_range": 10_000, "max_results": 10_000},
+    "ankr.com": {"max_range": 3_000, "max_results": 10_000},
+    "binance.org": {"max_range": 5_000, "max_results": 10_000},
+    "default": {"max_range": None, "max_results": 10_000},
+}
+# Error messages returned by the providers when a range or result limit is exceeded
+PROVIDER_LIMIT_ERRORS = (
+    "query returned more than 10000 results",  # Infura
+    "log response size exceeded",  # Alchemy
+    "blocks range",  # QuickNode: "eth_getLogs is limited to a 10,000 blocks range"
+    "block range is too wide",  # Ankr
+    "exceed maximum block range",  # BSC & geth-based public nodes
+    "block range too large",
+    "range limit exceeded",
+    "response size exceeded",
+    "query timeout exceeded",
+)
+# Blocks behind the head considered final, if the node doesn't support the `finalized` tag
+FINALITY_DEPTH = {
+    "ETHEREUM": 64,
+    "ARBITRUM": 64,
+    "AVALANCHE": 64,
+    "BINANCE": 64,
+    "OPTIMISM": 64,
+    "POLYGON": 256,
+}
 
@@ -1,15 +1,9 @@
-import os
 import json
+import asyncio
 
-from web3 import Web3
-from web3.middleware import geth_poa_middleware
 from dotenv import load_dotenv
 from utils.context import Context
-from utils.block import BlockUtils
 from utils.logger import setup_logger
-from exporters.event import EventExporter
-from exporters.call import CallExporter
-from web3.exceptions import ABIFunctionNotFound
 from constants import NETWORKS, DEFAULT_CALL_FILE, DEFAULT_EVENT_FILE
 from utils.exceptions import (
     FileUtilsError,
@@ -25,25 +19,44 @@ logger = setup_logger(__name__)
 class DemonicTutor:
     def __init__(self, network):
         self.network = network
-        self.set_network(network)
+        self.connections = {}
+
+    @property
+    def w3(self):
+        """Connection to the current network, opened on first use"""
+        return self.get_connection(self.network)
+
+    def get_connection(self, network: str):
+        """Returns the connection to a network, opened once and kept for later use"""
+        if network not in self.connections:
+            self.connections[network] = self.connect(network)
+        return self.connections[network]
 
     def set_network(self, network: str):
-        provider_url = os.getenv(f"PROVIDER_{network}")
-        self.w3 = Web3(Web3.HTTPProvider(provider_url))
-        # To properly interpret the PoA-specific block structure: (e.g.: Polygon network)
-        self.w3.middleware_onion.inject(geth_poa_middleware, layer=0)
         self.network = network
-        if not self.w3.is_connected():
+
+    @staticmethod
+    def connect(network: str):
+        from web3 import Web3
+        from web3.middleware import geth_poa_middleware
+        from utils.provider_pool import PoolProvider, redact
+
+        # pool of the endpoints in PROVIDER_<NETWORK> (comma-separated)
+        w3 = Web3(PoolProvider.from_env(network))
+        # To properly interpret the PoA-specific block structure: (e.g.: Polygon network)
+        w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        if not w3.is_connected():
             try:
                 # Try some dummy operation to trigger an exception
-                # @TODO: careful, if unauthorized for url, gives the full url incl. key
-                self.w3.eth.block_number
+                w3.eth.block_number
             except Exception as e:
+                # errors may contain the provider url, incl. the API key
                 raise ConnectionError(
-                    f"Initial connection to node provider failed. Reason: {str(e)}"
+                    f"Initial connection to node provider failed. Reason: {redact(e)}"
                 )
             else:
                 raise ConnectionError("Initial connection to node provider failed.")
+        return w3
 
     def change_network(self):
         num_networks = len(NETWORKS) - 1
@@ -61,6 +74,8 @@ class DemonicTutor:
             """back to main menu"""
 
     def get_block_number_by_timestamp(self):
+        from utils.block import BlockUtils
+
         try:
             timestamp = int(input("Enter a unix timestamp: "))
             block = BlockUtils(
@@ -73,6 +88,8 @@ class DemonicTutor:
             """handled in class utils.block"""
 
     def get_block_number_by_date(self):
+        from utils.block import BlockUtils
+
         # eg: 20221010 10:10:10
         try:
             date_input = input("Enter the date in format 'YYYYMMDD HH:MM:SS': ")
@@ -83,28 +100,110 @@ class DemonicTutor:
         except BlockUtilsError:
             """handled in class utils.block"""
 
+    def export_block_numbers(self, source: str = "", networks: list = None):
+        from exporters.block import BlockExporter
+
+        # eg: dates.csv (one timestamp or 'YYYYMMDD HH:MM:SS' date per line)
+        try:
+            if not source:
+                source = input("Enter the file with timestamps or dates (src/models): ")
+            if networks is None:
+                user_input = input(
+                    f"Enter the networks, comma-separated (default: {self.network}): "
+                )
+                networks = [n.strip().upper() for n in user_input.split(",") if n.strip()]
+            w3_instances = {}
+            for network in networks or [self.network]:
+                if network not in NETWORKS:
+                    logger.error(f"Unknown network: {network}")
+                    return
+                w3_instances[network] = self.get_connection(network)
+            BlockExporter(w3_instances, source).extract_data()
+        except ConnectionError as e:
+            logger.error(e)
+
+    def update_block_index(self):
+        from utils.block import BlockUtils
+
+        # samples every BLOCK_INDEX_STEP blocks, up to the finalized block
+        try:
+            block_utils = BlockUtils(self.w3, self.network)
+            num_samples = block_utils.update_index()
+            print(
+                f"{num_samples} samples added -> {len(block_utils.index)} samples "
+                f"up to block {block_utils.index.last_block}"
+            )
+        except BlockUtilsError:
+            """handled in class utils.block"""
+
     def export_log_data(self, model: str = "", context: str = Context.MAIN.INPUT):
+        from exporters.event import EventExporter
+
         # eg: gro-gtranche_withdrawal.json
         try:
             if not model:
                 user_input = input("Enter the model for log extraction (src/models): ")
                 model = user_input if user_input else DEFAULT_EVENT_FILE
-            ev_exporter = EventExporter(self.w3, model, context)
+            ev_exporter = EventExporter(self.w3, model, context, self.network)
+            # events are streamed into src/data (main context) or returned (tests)
             events = ev_exporter.extract_data()
-            # print(events) # to add new tests
             return events
         except FileUtilsError:
             """handled in utils.file"""
         except FilterEventError:
             """handled in filters.event"""
 
+    def export_log_data_async(self, models: list = None):
+        # eg: gro-gtranche_withdrawal.json, default_event.json (current network)
+        if models is None:
+            user_input = input(
+                "Enter the models for log extraction, comma-separated (src/models): "
+            )
+            models = [m.strip() for m in user_input.split(",") if m.strip()]
+        try:
+            asyncio.run(self._export_log_data_async(models or [DEFAULT_EVENT_FILE]))
+        except ConnectionError as e:
+            logger.error(e)
+
+    async def _export_log_data_async(self, models: list):
+        """Extracts the models concurrently, over one shared aiohttp session"""
+        from utils.async_connector import AsyncConnector
+        from exporters.async_event import AsyncEventExporter
+
+        async with AsyncConnector() as connector:
+            w3 = await connector.connect(self.network)
+
+            async def export(model):
+                try:
+                    await AsyncEventExporter(w3, model, network=self.network).extract_data()
+                except FileUtilsError:
+                    """handled in utils.file"""
+
+            await asyncio.gather(*(export(model) for model in models))
+
+    def follow_log_data(self, model: str = "", context: str = Context.MAIN.INPUT):
+        from exporters.follow import EventFollower
+
+        # eg: gro-gtranche_withdrawal.json (stop with Ctrl+C)
+        try:
+            if not model:
+                user_input = input("Enter the model to follow live (src/models): ")
+                model = user_input if user_input else DEFAULT_EVENT_FILE
+            follower = EventFollower(self.w3, model, context, self.network)
+            follower.follow()
+        except FileUtilsError:
+            """handled in utils.file"""
+
     def export_call_data(self, model: str = "", context: str = Context.MAIN.INPUT):
+        from exporters.call import CallExporter
+        from web3.exceptions import ABIFunctionNotFound
+
         try:
             # TODO: exceptions
             if not model:
                 user_input = input("Enter the model for contract call (src/models): ")
                 model = user_input if user_input else DEFAULT_CALL_FILE
-            call_exporter = CallExporter(self.w3, model, context)
+            call_exporter = CallExporter(self.w3, model, context, self.network)
             data = call_exporter.extract_data()
             if data is not None:
                 data_json = json.dumps(data, indent=4)
@@ -0,0 +1,281 @@
+import asyncio
+
+from aiohttp import ClientError
+from utils.context import Context
+from utils.log_cache import LogCache
+from utils.block import AsyncBlockUtils
+from utils.logger import setup_logger
+from utils.header_cache import AsyncBlockHeaderCache
+from exporters.event import EventExporter
+from utils.exceptions import FilterEventError, ParserEventError, BlockUtilsError
+from utils.chunker import (
+    AsyncBlockRangeChunker,
+    ChunkSizeStore,
+    get_provider_profile,
+)
+from constants import (
+    NETWORKS,
+    ASYNC_FETCH_WORKERS,
+    FETCH_BUFFER_PER_WORKER,
+    FETCH_RETRIES,
+    FETCH_RETRY_DELAY,
+)
+
+logger = setup_logger(__name__)
+
+
+class AsyncEventExporter(EventExporter):
+    """
+    EventExporter for AsyncWeb3 connections (see utils.async_connector): block ranges
+    are fetched by concurrent tasks in the event loop instead of threads, and dates &
+    block timestamps are resolved with AsyncBlockUtils. Models, outputs, checkpoints
+    and caches are the same as in the synchronous mode, so that several models (and
+    networks) can be extracted concurrently in one process, e.g.:
+
+        async with AsyncConnector() as connector:
+            w3 = await connector.connect("ETHEREUM")
+            await asyncio.gather(
+                *(AsyncEventExporter(w3, model).extract_data() for model in models)
+            )
+    """
+
+    def __init__(
+        self,
+        w3_instance,
+        model: str,
+        context: str = Context.MAIN.INPUT,
+        network: str = NETWORKS["ETHEREUM"],
+    ):
+        super().__init__(w3_instance, model, context, network)
+        self.workers = self.config.get("workers", ASYNC_FETCH_WORKERS)
+        self.block_timestamps = {}
+        # a profiler would cover every extraction running in the event loop
+        self.metrics.profiler = None
+
+    async def extract_data(self):
+        """Parses and exports event logs (see EventExporter.extract_data())"""
+        output = None
+        try:
+            with self.metrics.track():
+                await self.resolve_dates()
+                dispatch, filter_params = self.prepare_filter()
+                output = self._open_output(filter_params, dispatch)
+
+                # Pipeline: retrieve logs in chunks -> decode them -> write them
+                chunks = self.iter_logs_in_range(filter_params)
+                try:
+                    while True:
+                        with self.metrics.stage("fetch"):
+                            try:
+                                _, to_block, logs = await chunks.__anext__()
+                            except StopAsyncIteration:
+                                break
+                        rows_by_name = await self._decode_chunk(logs, dispatch)
+                        with self.metrics.stage("write"):
+                            output.add(to_block, rows_by_name)
+                finally:
+                    # stops the fetching tasks if the pipeline fails
+                    await chunks.aclose()
+                with self.metrics.stage("write"):
+                    return output.finish()
+
+        except KeyError as e:
+            logger.error(f'extract_data(): Error found on key {e}')
+        except FilterEventError:
+            """handled in function build_filter_params()"""
+        except ParserEventError:
+            """handled in classes EventFunc*"""
+        except BlockUtilsError:
+            """handled in class utils.block"""
+        except Exception as e:
+            logger.error(f"extract_data(): {e}")
+        finally:
+            if output:
+                output.close()
+            self._save_metrics()
+
+    async def resolve_dates(self):
+        """Converts `start_date` & `end_date` into blocks (see EventExporter)"""
+        if "start_date" not in self.config and "end_date" not in self.config:
+            return
+        block_utils = AsyncBlockUtils(self.w3, self.network, self.cache_folder)
+        if "start_date" in self.config:
+            timestamp = block_utils.convert_date_to_ts(self.config["start_date"])
+            block = await block_utils.get_closest_block_number_by_timestamp(timestamp)
+            if await block_utils.get_block_timestamp(block) < timestamp:
+                block += 1
+            self.config["start_block"] = block
+        if "end_date" in self.config:
+            self.config["end_block"] = await block_utils.get_closest_block_number_by_date(
+                self.config["end_date"]
+            )
+        if self.context == Context.MAIN.INPUT:
+            logger.info(
+                f"Dates resolved to blocks {self.config.get('start_block')} "
+                f"to {self.config.get('end_block')}"
+            )
+
+    def _resolve_dates(self):
+        """Dates are resolved before preparing the filter, in `resolve_dates()`"""
+
+    async def _decode_chunk(self, logs: list, dispatch: dict) -> dict:
+        """Decodes a chunk of logs into {event name: rows}, fetching their timestamps first"""
+        if self.block_timestamp and logs:
+            with self.metrics.stage("fetch"):
+                self.block_timestamps = await self._fetch_block_timestamps(
+                    {log["blockNumber"] for log in logs}
+                )
+        _, rows_by_name = next(self._decode_chunks([(None, None, logs)], dispatch))
+        return rows_by_name
+
+    def _get_block_timestamps(self, block_numbers) -> dict:
+        """Timestamps fetched ahead by `_decode_chunk()`, as decoding is synchronous"""
+        return self.block_timestamps
+
+    async def _fetch_block_timestamps(self, block_numbers) -> dict:
+        if self.finalized_block is None:
+            self.finalized_block = await AsyncBlockUtils(
+                self.w3, self.network, self.cache_folder
+            ).get_finalized_block_number()
+        headers = AsyncBlockHeaderCache.shared(self.w3, self.network, self.cache_folder)
+        return await headers.get_timestamps(block_numbers, self.finalized_block)
+
+    async def get_logs_in_range(self, params):
+        """Fetches all logs in the provided block range, returned in block order"""
+        results = []
+        chunks = self.iter_logs_in_range(params)
+        try:
+            async for _, _, logs in chunks:
+                results.append(logs)
+        finally:
+            await chunks.aclose()
+        return self._merge_logs(results)
+
+    async def iter_logs_in_range(self, params):
+        """
+        Yields (from block, to block, logs) for the provided block range chunk by chunk,
+        in block order, reading the cached ranges from disk (see EventExporter)
+        """
+        params = await self._resolve_block_range(params)
+        if params["fromBlock"] > params["toBlock"]:
+            self._log_event_processing(params["fromBlock"], params["toBlock"], "No new")
+            return
+        if not self.use_cache:
+            chunks = self._fetch_logs_in_range(params)
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+            return
+
+        log_cache = LogCache(self.network, params, self.cache_folder)
+        finalized_block = None
+        for from_block, to_block, cached in log_cache.plan(
+            params["fromBlock"], params["toBlock"]
+        ):
+            if cached:
+                self._log_event_processing(from_block, to_block, "Cached")
+                for chunk in log_cache.read(from_block, to_block):
+                    self.metrics.count("cached_chunks")
+                    yield chunk
+                continue
+
+            if finalized_block is None:
+                finalized_block = await AsyncBlockUtils(
+                    self.w3, self.network, self.cache_folder
+                ).get_finalized_block_number()
+
+            gap_params = {**params, "fromBlock": from_block, "toBlock": to_block}
+            chunks = self._fetch_logs_in_range(gap_params)
+            try:
+                async for chunk_from, chunk_to, logs in chunks:
+                    # only finalized blocks are cached, so that reorgs can't poison the cache
+                    if chunk_from <= finalized_block:
+                        cached_to = min(chunk_to, finalized_block)
+                        log_cache.store(
+                            chunk_from,
+                            cached_to,
+                            [log for log in logs if log["blockNumber"] <= cached_to],
+                        )
+                    yield chunk_from, chunk_to, logs
+            finally:
+                await chunks.aclose()
+
+    async def _fetch_logs_in_range(self, params):
+        """
+        Fetches logs in the provided block range with concurrent tasks, yielding
+        (from block, to block, logs) for each chunk in block order (adaptive chunks
+        and backpressure as in the synchronous mode)
+        """
+        key = ChunkSizeStore.get_key(self.network, params)
+        workers = max(1, self.workers)
+        chunker = AsyncBlockRangeChunker(
+            params,
+            get_provider_profile(self.w3),
+            self.chunk_sizes.get(key),
+            workers * FETCH_BUFFER_PER_WORKER,
+        )
+
+        tasks = [asyncio.create_task(self._fetch_chunks(chunker)) for _ in range(workers)]
+        try:
+            async for chunk in chunker.iter_chunks():
+                yield chunk
+        finally:
+            # stop the tasks if the consumer stops early or fails
+            await chunker.abort()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        # remember the chunk size for the next extraction of the same contract & topic
+        self.chunk_sizes.set(key, chunker.size)
+
+    async def _fetch_chunks(self, chunker):
+        """Task loop: fetches the chunks handed out by the chunker"""
+        try:
+            while (current_range := await chunker.next_range()) is not None:
+                from_block, to_block = (
+                    current_range["fromBlock"],
+                    current_range["toBlock"],
+                )
+                self._log_event_processing(from_block, to_block, "Reading")
+
+                try:
+                    logs = await self._get_logs_with_retry(current_range)
+                    await chunker.report_success(current_range, logs)
+                    self.metrics.count("chunks")
+                    self._log_event_processing(from_block, to_block, "Processed")
+
+                except ValueError as e:
+                    await chunker.report_overflow(current_range, self._get_overflow(e))
+                    self.metrics.count("range_splits")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await chunker.abort(e)
+
+    async def _resolve_block_range(self, params):
+        """Converts block tags (e.g.: 'latest') into block numbers"""
+        params = params.copy()
+        for key in ("fromBlock", "toBlock"):
+            if not isinstance(params[key], int):
+                params[key] = (await self.w3.eth.get_block(params[key]))["number"]
+        return params
+
+    async def _get_logs_with_retry(self, params):
+        """Retrieves the logs for a single block range, retrying on transient network errors"""
+        delay = FETCH_RETRY_DELAY
+        for attempt in range(FETCH_RETRIES + 1):
+            try:
+                return await self.w3.eth.get_logs(params)
+            except (ClientError, asyncio.TimeoutError) as e:
+                if attempt == FETCH_RETRIES:
+                    raise e
+                logger.warning(
+                    f"Retrying blocks {params['fromBlock']} to {params['toBlock']} "
+                    f"in {delay}s ({attempt + 1}/{FETCH_RETRIES}): {type(e).__name__}"
+                )
+                self.metrics.count("retries")
+                await asyncio.sleep(delay)
+                delay *= 2
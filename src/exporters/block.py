@@ -0,0 +1,126 @@
+import os
+import csv
+import time
+
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from constants import GENESIS_TS
+from utils.block import BlockUtils
+from utils.context import Context
+from utils.writers import get_writer
+from utils.logger import setup_logger
+from utils.exceptions import BlockUtilsError, FileUtilsError
+
+logger = setup_logger(__name__)
+
+
+class BlockExporter:
+    """
+    Converts many timestamps or dates into block numbers for several networks at once.
+    Timestamps are swept in ascending order per network (see BlockUtils), and networks
+    are converted concurrently. The result is a table with a row per timestamp and a
+    column per network, written into src/data/<source>_blocks.csv in the main context,
+    or returned otherwise.
+    """
+
+    def __init__(self, w3_instances: dict, source, context: str = Context.MAIN.INPUT):
+        self.w3_instances = w3_instances
+        self.source = source
+        self.context = context
+        self.cache_folder = Context.CACHE
+
+    def extract_data(self):
+        try:
+            inputs = self._read_inputs()
+            timestamps = sorted(set(inputs.values()))
+            networks = list(self.w3_instances)
+            if self.context == Context.MAIN.INPUT:
+                logger.info(
+                    f"Converting {len(timestamps)} timestamps for {', '.join(networks)}"
+                )
+
+            with ThreadPoolExecutor(max_workers=max(1, len(networks))) as executor:
+                blocks = dict(
+                    zip(
+                        networks,
+                        executor.map(
+                            lambda network: self._convert(network, timestamps), networks
+                        ),
+                    )
+                )
+
+            labels = {}
+            for label, timestamp in inputs.items():
+                labels.setdefault(timestamp, label)
+            rows = [
+                {
+                    "input": labels[timestamp],
+                    "timestamp": timestamp,
+                    "date": datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S"),
+                    **{network: blocks[network].get(timestamp) for network in networks},
+                }
+                for timestamp in timestamps
+            ]
+
+            if self.context == Context.MAIN.INPUT:
+                base_name = os.path.splitext(os.path.basename(str(self.source)))[0]
+                with get_writer(f"{base_name}_blocks", Context.MAIN.OUTPUT).open() as writer:
+                    writer.write_rows(rows)
+                logger.info(f"# records: {writer.num_rows} -> {writer.path}")
+                return None
+            return rows
+
+        except (BlockUtilsError, FileUtilsError):
+            """handled in utils.block & here"""
+
+    def _convert(self, network: str, timestamps: list) -> dict:
+        """
+        Returns {timestamp: block number} for a network. Timestamps before its genesis,
+        or after its latest block (or now) are skipped, and if the conversion fails,
+        the network gets no blocks.
+        """
+        try:
+            block_utils = BlockUtils(self.w3_instances[network], network, self.cache_folder)
+            chain_bounds = block_utils.get_chain_bounds()
+            (_, earliest_ts), (_, latest_ts) = chain_bounds
+            last_ts = min(latest_ts, int(time.time()))
+            first_ts = max(earliest_ts, GENESIS_TS[network])
+            valid = [ts for ts in timestamps if first_ts <= ts <= last_ts]
+            if len(valid) < len(timestamps):
+                logger.warning(
+                    f"{len(timestamps) - len(valid)} timestamps out of the {network} "
+                    f"range [{first_ts}, {last_ts}]"
+                )
+            return block_utils.get_closest_block_numbers_by_timestamps(valid, chain_bounds)
+        except BlockUtilsError:
+            logger.error(f"Timestamps not converted for {network}")
+            return {}
+        except Exception as e:
+            logger.error(f"Timestamps not converted for {network}: {e}")
+            return {}
+
+    def _read_inputs(self) -> dict:
+        """
+        Returns {input: timestamp} for a list of unix timestamps or dates in format
+        'YYYYMMDD HH:MM:SS', or for the first column of a file (in the context folder)
+        with one value per line. A header line, if any, is skipped.
+        """
+        values = self.source
+        if isinstance(self.source, str):
+            try:
+                with open(os.path.join(self.context, self.source), "r") as f:
+                    values = [row[0] for row in csv.reader(f) if row and row[0].strip()]
+            except Exception as e:
+                logger.error(f"_read_inputs(): {e}")
+                raise FileUtilsError()
+
+        inputs = {}
+        for i, value in enumerate(values):
+            value = str(value).strip()
+            if value.isdigit():
+                inputs[value] = int(value)
+            elif i == 0 and not value[:1].isdigit():
+                continue  # header
+            else:
+                inputs[value] = BlockUtils.convert_date_to_ts(value)
+        return inputs
@@ -1,9 +1,24 @@
+import os
+import csv
+import json
+
+from datetime import datetime
+from hexbytes import HexBytes
+from concurrent.futures import ThreadPoolExecutor
 from utils.file import FileUtils
+from utils.batch import BatchTransport
+from utils.multicall import Multicall
+from utils.writers import get_writer
+from utils.block import BlockUtils
 from utils.context import Context
 from utils.logger import setup_logger
-from utils.exceptions import ParserCallError
+from utils.metrics import RunMetrics, in_context
+from utils.exceptions import ParserCallError, BlockUtilsError
 from parsers.call_args_parser import CallArgsParser
 from parsers.call_result_parser import CallResultParser
+from web3._utils.abi import get_abi_output_types, map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+from constants import NETWORKS, FETCH_WORKERS, MULTICALL_CALL_GAS, RPC_BATCH_SIZE
 
 logger = setup_logger(__name__)
 
@@ -14,15 +29,41 @@ class CallExporter:
         w3_instance,
         model: str,
         context: str = Context.MAIN.INPUT,
+        network: str = NETWORKS["ETHEREUM"],
     ):
         self.model = model
         self.w3 = w3_instance
         self.context = context
+        self.network = network
+        self.cache_folder = Context.CACHE
         self.config = FileUtils.read_file(model, context)
         self.arg_parser = CallArgsParser(self.w3)
         self.result_parser = CallResultParser(self.w3)
+        self.transport = BatchTransport(self.w3)
+        self.metrics = RunMetrics(model, network, self.config.get("profile", False))
 
     def extract_data(self):
+        """Runs the model, saving the run metrics into src/data/metrics in the main context"""
+        try:
+            with self.metrics.track(self.w3.provider):
+                return self._extract_data()
+        finally:
+            self._save_metrics()
+
+    def _save_metrics(self):
+        if self.context != Context.MAIN.INPUT or not self.config.get("metrics", True):
+            return
+        try:
+            path = self.metrics.save(Context.MAIN.OUTPUT, self.config.get("prometheus", False))
+            self.metrics.log_summary(path)
+        except OSError as e:
+            logger.error(f"Run metrics not saved: {e}")
+
+    def _extract_data(self):
+        if "functions" in self.config or "arguments_file" in self.config:
+            return self.extract_sweep()
+        if "block_range" in self.config or "date_range" in self.config:
+            return self.extract_series()
         try:
             # Get model config
             abi, contract_addr, block = self._get_contract()
@@ -40,9 +81,8 @@ class CallExporter:
                 )
 
             # Get data from function contract
-            result = contract.functions[func_name](*parsed_args).call(
-                block_identifier=block
-            )
+            function = contract.functions[func_name](*parsed_args)
+            result = self.call_at_blocks(function, [block])[0]
 
             # Return parse result from contract call
             return self.result_parser.parse_result(
@@ -57,11 +97,294 @@ class CallExporter:
             logger.error(f"extract_data(): {e}")
             raise ParserCallError(e)
 
+    def call_at_blocks(self, function, blocks: list) -> list:
+        """
+        Calls a contract function at every given block (number or tag), sending the
+        eth_call requests in JSON-RPC batches. Results are decoded as web3 does:
+        a single value, or a list if the function has 2+ outputs.
+        """
+        call = {"to": function.address, "data": function._encode_transaction_data()}
+        output_types = get_abi_output_types(function.abi)
+        raw_results = self.transport.request(
+            [
+                ("eth_call", [call, hex(block) if isinstance(block, int) else block])
+                for block in blocks
+            ]
+        )
+        return [self._decode_output(output_types, raw) for raw in raw_results]
+
+    def extract_sweep(self):
+        """
+        Sweep mode: calls one or several functions (`functions`) with many argument
+        sets (`arguments_file`, e.g.: balanceOf for a list of holders), packed into
+        Multicall3 aggregate3 calls at a pinned block. A row per argument set is written
+        into src/data/<model>.csv (or <model>_<function>.csv for several functions) in
+        the main context, or returned otherwise. Failed sub-calls get `success` = False.
+        """
+        writers = {}
+        rows = {}
+        try:
+            abi, contract_addr, block = self._get_contract()
+            contract = self.w3.eth.contract(
+                address=self.arg_parser.addr_utils.addr_checksum(contract_addr), abi=abi
+            )
+            block = self._pin_block(block)
+            specs = self.config.get("functions", [self.config])
+            multicall = Multicall(
+                self.w3,
+                block,
+                self.config.get("call_gas", MULTICALL_CALL_GAS),
+                self.config.get("workers", FETCH_WORKERS),
+            )
+            if self.context == Context.MAIN.INPUT:
+                logger.info(f"Sweeping {len(specs)} function(s) at block {block}")
+
+            for spec in specs:
+                name = spec["function_name"]
+                if self.context == Context.MAIN.INPUT and name not in writers:
+                    base_name = os.path.splitext(self.model)[0]
+                    file_name = self.model if len(specs) == 1 else f"{base_name}_{name}"
+                    writers[name] = get_writer(
+                        file_name,
+                        Context.MAIN.OUTPUT,
+                        self.config.get("output_format"),
+                        self.config.get("compression"),
+                    ).open()
+
+                # Slices of argument sets are called and written one after another
+                arg_sets = self._get_argument_sets(spec)
+                slice_size = multicall.batch_size * multicall.workers
+                for i in range(0, len(arg_sets), slice_size):
+                    arg_slice = arg_sets[i : i + slice_size]
+                    functions = [
+                        contract.functions[name](
+                            *self.arg_parser.parse_args(args, spec["arg_types"])
+                        )
+                        for args in arg_slice
+                    ]
+                    results = multicall.aggregate(
+                        [(f.address, f._encode_transaction_data()) for f in functions]
+                    )
+                    slice_rows = [
+                        self._get_sweep_row(spec, abi, args, function, success, data)
+                        for args, function, (success, data) in zip(
+                            arg_slice, functions, results
+                        )
+                    ]
+                    if name in writers:
+                        writers[name].write_rows(slice_rows)
+                    else:
+                        rows.setdefault(name, []).extend(slice_rows)
+
+            if writers:
+                for writer in writers.values():
+                    logger.info(f"# records: {writer.num_rows} -> {writer.path}")
+                return None
+            if "functions" in self.config:
+                return rows
+            return rows.get(self.config["function_name"], [])
+
+        except KeyError as e:
+            logger.error(f"extract_sweep(): Error found on key {e}")
+        except ParserCallError:
+            """handled in parsers.call_*_parser & utils.multicall"""
+        except Exception as e:
+            logger.error(f"extract_sweep(): {e}")
+            raise ParserCallError(e)
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+    def extract_series(self):
+        """
+        Time-series mode: calls the function at every block of `block_range` (start,
+        end, step) or at the closest block to every date of `date_range` (start, end,
+        calendar interval). Blocks are called concurrently in JSON-RPC batches, and a
+        row per block (date, block_num, block_timestamp, outputs) is streamed into
+        src/data/<model>.csv in the main context, or returned otherwise.
+        """
+        writer = None
+        rows = []
+        try:
+            abi, contract_addr, _ = self._get_contract()
+            func_name, func_args, arg_types = self._get_function()
+            output_decimals = self._get_outout()
+
+            # Contract & function are set up once for all the blocks
+            contract = self.w3.eth.contract(address=contract_addr, abi=abi)
+            parsed_args = self.arg_parser.parse_args(func_args, arg_types)
+            function = contract.functions[func_name](*parsed_args)
+            output_names = self.result_parser.get_output_names(function.abi)
+
+            # headers of finalized blocks are cached on disk
+            block_utils = BlockUtils(self.w3, self.network, self.cache_folder)
+            block_utils.finalized_block = block_utils.get_finalized_block_number()
+            series = self._get_block_series(block_utils)
+            if self.context == Context.MAIN.INPUT:
+                logger.info(f"Calling `{func_name}` at {len(series)} blocks")
+                writer = get_writer(
+                    self.model,
+                    Context.MAIN.OUTPUT,
+                    self.config.get("output_format"),
+                    self.config.get("compression"),
+                ).open()
+
+            slices = [
+                series[i : i + RPC_BATCH_SIZE] for i in range(0, len(series), RPC_BATCH_SIZE)
+            ]
+            workers = max(1, self.config.get("workers", FETCH_WORKERS))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(
+                    in_context(lambda s: self._call_series_slice(function, [b for _, b in s])),
+                    slices,
+                )
+                # slices are written in order, as soon as they (and the previous) are done
+                for series_slice, slice_results in zip(slices, results):
+                    timestamps = block_utils.headers.get_timestamps(
+                        [block for _, block in series_slice], block_utils.finalized_block
+                    )
+                    slice_rows = []
+                    for (date, block), result in zip(series_slice, slice_results):
+                        row = {"block_num": block, "block_timestamp": timestamps[block]}
+                        if date is not None:
+                            row = {"date": date, **row}
+                        if result is None:
+                            row.update({name: None for name in output_names})
+                        else:
+                            row.update(
+                                self.result_parser.parse_result(
+                                    func_name, abi, result, output_decimals
+                                )
+                            )
+                        slice_rows.append(row)
+                    if writer:
+                        writer.write_rows(slice_rows)
+                    else:
+                        rows.extend(slice_rows)
+
+            if writer:
+                logger.info(f"# records: {writer.num_rows} -> {writer.path}")
+                return None
+            return rows
+
+        except KeyError as e:
+            logger.error(f"extract_series(): Error found on key {e}")
+        except (ParserCallError, BlockUtilsError):
+            """handled in parsers.call_*_parser & utils.block"""
+        except Exception as e:
+            logger.error(f"extract_series(): {e}")
+            raise ParserCallError(e)
+        finally:
+            if writer:
+                writer.close()
+
+    def _get_block_series(self, block_utils: BlockUtils) -> list:
+        """Returns the [(date or None, block number)] to call the function at"""
+        if "block_range" in self.config:
+            block_range = self.config["block_range"]
+            blocks = range(
+                block_range["start"], block_range["end"] + 1, block_range.get("step", 1)
+            )
+            return [(None, block) for block in blocks]
+
+        date_range = self.config["date_range"]
+        timestamps = BlockUtils.get_date_series(
+            date_range["start"], date_range["end"], date_range["interval"]
+        )
+        workers = max(1, self.config.get("workers", FETCH_WORKERS))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            blocks = list(
+                executor.map(
+                    in_context(block_utils.get_closest_block_number_by_timestamp), timestamps
+                )
+            )
+        return [
+            (datetime.utcfromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"), block)
+            for ts, block in zip(timestamps, blocks)
+        ]
+
+    def _call_series_slice(self, function, blocks: list) -> list:
+        """
+        Calls the function at the given blocks in one batch. If the batch fails (e.g.:
+        the contract didn't exist yet at some blocks), blocks are called one by one,
+        and those failing get None.
+        """
+        try:
+            return self.call_at_blocks(function, blocks)
+        except Exception:
+            results = []
+            for block in blocks:
+                try:
+                    results.append(self.call_at_blocks(function, [block])[0])
+                except Exception as e:
+                    logger.warning(f"Call failed at block {block}: {e}")
+                    results.append(None)
+            return results
+
+    def _get_sweep_row(self, spec, abi, args, function, success, data):
+        """Returns the argument set followed by the decoded outputs of a sub-call"""
+        output_names = self.result_parser.get_output_names(function.abi)
+        outputs = {name: None for name in output_names}
+        if success:
+            try:
+                result = self._decode_output(get_abi_output_types(function.abi), data)
+                outputs = self.result_parser.parse_result(
+                    spec["function_name"], abi, result, spec.get("output_decimals", {})
+                )
+            except ParserCallError:
+                raise
+            except Exception:
+                # e.g.: empty return data from an account without code
+                success = False
+        return {**args, "success": success, **outputs}
+
+    def _get_argument_sets(self, spec) -> list:
+        """
+        Returns the argument sets of a function: a single one (`arguments`), or one per
+        row of `arguments_file` (CSV with a header, or JSON list) in the models folder
+        """
+        arg_types = spec["arg_types"]
+        if "arguments_file" not in spec:
+            return [spec["arguments"]]
+
+        path = os.path.join(self.context, spec["arguments_file"])
+        with open(path, "r") as f:
+            if path.endswith(".json"):
+                arg_sets = json.load(f)
+            else:
+                arg_sets = [
+                    {name: self._parse_csv_value(value, arg_types[name])
+                     for name, value in row.items()}
+                    for row in csv.DictReader(f)
+                ]
+        # arguments are passed in the order of `arg_types`
+        return [{name: args[name] for name in arg_types} for args in arg_sets]
+
+    def _pin_block(self, block):
+        """Resolves the latest block once, so that all the sub-calls see the same state"""
+        if block is None or block == "latest":
+            return self.w3.eth.block_number
+        return block
+
+    def _decode_output(self, output_types, raw_result):
+        """Decodes a call result as web3 does: a single value, or a list if 2+ outputs"""
+        decoded = self.w3.codec.decode(output_types, HexBytes(raw_result))
+        normalized = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, decoded)
+        return normalized[0] if len(normalized) == 1 else normalized
+
+    @staticmethod
+    def _parse_csv_value(value: str, arg_type: str):
+        if arg_type.startswith("uint") or arg_type.startswith("int"):
+            return int(value)
+        if arg_type == "bool":
+            return value.strip().lower() == "true"
+        return value
+
     def _get_contract(self):
         return (
             self.config["abi"],
             self.config["contract_addr"],
-            self.config["block"],
+            self.config.get("block"),
         )
 
     def _get_function(self):
@@ -1,16 +1,45 @@
+import os
 import json
+import time
 
+from collections import namedtuple
+from hexbytes import HexBytes
+from requests.exceptions import RequestException
+from concurrent.futures import ThreadPoolExecutor
 from utils.file import FileUtils
+from utils.writers import get_writer
+from utils.block import BlockUtils
+from utils.log_cache import LogCache
+from utils.header_cache import BlockHeaderCache
+from utils.checkpoint import Checkpoint
 from utils.context import Context
-from utils.logger import setup_logger
-from filters.event import build_filter_params
+from utils.logger import setup_logger, ProgressLogger
+from utils.metrics import RunMetrics, in_context
+from filters.event import build_filter_params, build_multi_filter_params
 from parsers.event_func_sig_parser import EventFuncSigParser
 from parsers.event_func_args_list import EventFuncArgsList
 from parsers.event_func_args_parser import EventFuncArgsParser
-from utils.exceptions import FilterEventError, ParserEventError
+from utils.exceptions import FilterEventError, ParserEventError, BlockUtilsError
+from utils.chunker import (
+    BlockRangeChunker,
+    ChunkSizeStore,
+    get_provider_profile,
+    is_limit_error,
+)
+from constants import (
+    NETWORKS,
+    FETCH_WORKERS,
+    FETCH_BUFFER_PER_WORKER,
+    FETCH_RETRIES,
+    FETCH_RETRY_DELAY,
+)
 
 logger = setup_logger(__name__)
 
+# Event type of a model: name (None for single-event models), topic0 hash,
+# parsed arguments and their compiled decoding plan
+EventSpec = namedtuple("EventSpec", ["name", "topic", "parsed_args", "plan"])
+
 """ @TODO
     According to web3py docs, w3.eth.get_logs() should raise a `Web3Exception`,
     but it's not the case -> it's raising `ValueError` when too many records.
@@ -18,129 +47,484 @@ logger = setup_logger(__name__)
 """
 
 
+class EventOutput:
+    """
+    Destination of the decoded events of an extraction: the output file(s), saving
+    the checkpoint (watermark) as chunks are written, or a JSON result otherwise
+    """
+
+    def __init__(self, names: list, writers: dict = None, checkpoint=None):
+        self.names = names
+        self.writers = writers or {}
+        self.checkpoint = checkpoint
+        self.events = {}
+        self.num_records = {}
+        self.last_block = None
+        # columnar files are only complete once closed -> no watermark per chunk
+        self.resumable = all(writer.resumable for writer in self.writers.values())
+
+    def add(self, to_block: int, rows_by_name: dict):
+        """Writes (or keeps) the rows of a chunk, up to `to_block`"""
+        for name, rows in rows_by_name.items():
+            self.num_records[name] = self.num_records.get(name, 0) + len(rows)
+            if self.writers:
+                self.writers[name].write_rows(rows)
+            else:
+                self.events.setdefault(name, []).extend(rows)
+        self.last_block = to_block
+        if self.checkpoint and self.resumable:
+            self.checkpoint.save(to_block, self._get_offsets())
+
+    def finish(self):
+        """Closes the output file(s), returning None, or the events as JSON"""
+        if not self.writers:
+            if len(self.names) == 1:
+                return json.dumps(self.events.get(self.names[0], []), indent=4)
+            return json.dumps(
+                {name: self.events.get(name, []) for name in self.names}, indent=4
+            )
+
+        self.close()
+        if self.checkpoint and not self.resumable and self.last_block is not None:
+            self.checkpoint.save(self.last_block, self._get_offsets())
+        for name, writer in self.writers.items():
+            logger.info(f"# records: {self.num_records.get(name, 0)} -> {writer.path}")
+        return None
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+    def _get_offsets(self) -> dict:
+        # columnar part files are only created with their first rows
+        return {
+            writer.path: writer.offset
+            for writer in self.writers.values()
+            if os.path.exists(writer.path)
+        }
+
+
 class EventExporter:
     def __init__(
         self,
         w3_instance,
         model: str,
         context: str = Context.MAIN.INPUT,
+        network: str = NETWORKS["ETHEREUM"],
     ):
         self.model = model
         self.w3 = w3_instance
         self.context = context
+        self.network = network
         self.config = FileUtils.read_file(model, context)
+        self.workers = self.config.get("workers", FETCH_WORKERS)
+        self.use_cache = self.config.get("cache", True)
+        self.block_timestamp = self.config.get("block_timestamp", False)
+        self.log_index = self.config.get("log_index", False)
+        self.finalized_block = None
+        self.cache_folder = Context.CACHE
+        self.output_folder = Context.MAIN.OUTPUT
+        self.chunk_sizes = ChunkSizeStore(self.cache_folder)
+        self.progress = ProgressLogger(logger)
+        self.metrics = RunMetrics(model, network, self.config.get("profile", False))
         self.ev_func_sig_parser = EventFuncSigParser(self.w3, context)
         self.ev_func_args_list = EventFuncArgsList(self.w3, context)
         self.ev_func_args_parser = EventFuncArgsParser(self.w3, context)
 
     def extract_data(self):
-        """Parses and exports event logs, and converts the results to a CSV format"""
-        events = []
-        num_records = 0
+        """
+        Parses and exports event logs. In the main context, the results are streamed
+        into the output file (CSV by default) chunk by chunk, as they are fetched.
+        Otherwise (e.g.: tests), they are returned as JSON.
+        Models with several event signatures are extracted in a single pass, with one
+        output file (or JSON list) per event type.
+        The run metrics are saved into src/data/metrics in the main context.
+        """
+        output = None
+        try:
+            with self.metrics.track(self.w3.provider):
+                dispatch, filter_params = self.prepare_filter()
+                output = self._open_output(filter_params, dispatch)
+
+                # Pipeline: retrieve logs in chunks -> decode them -> write them
+                chunks = self.metrics.timed("fetch", self.iter_logs_in_range(filter_params))
+                for to_block, rows_by_name in self._decode_chunks(chunks, dispatch):
+                    with self.metrics.stage("write"):
+                        output.add(to_block, rows_by_name)
+                with self.metrics.stage("write"):
+                    return output.finish()
+
+        except KeyError as e:
+            logger.error(f'extract_data(): Error found on key {e}')
+        except FilterEventError:
+            """handled in function build_filter_params()"""
+        except ParserEventError:
+            """handled in classes EventFunc*"""
+        except BlockUtilsError:
+            """handled in class utils.block"""
+        except Exception as e:
+            logger.error(f"extract_data(): {e}")
+        finally:
+            if output:
+                output.close()
+            self._save_metrics()
 
+    def _save_metrics(self):
+        """Saves & logs the metrics of the run in the main context (see utils.metrics)"""
+        if self.context != Context.MAIN.INPUT or not self.config.get("metrics", True):
+            return
         try:
-            # Retrieve EIP-712 function signature
-            function_sig = self.ev_func_sig_parser.parse_function_sig(
-                self.config["function_sig"]
-            )
+            path = self.metrics.save(self.output_folder, self.config.get("prometheus", False))
+            self.metrics.log_summary(path)
+        except OSError as e:
+            logger.error(f"Run metrics not saved: {e}")
 
-            # Retrieve function arguments to be processed
-            parsed_args_list = self.ev_func_args_list.get_function_args_list(
-                self.config["function_sig"]
-            )
+    def prepare_filter(self):
+        """
+        Parses the event signature(s) of the model, returning the dispatch table
+        {topic0: EventSpec} and the filter parameters
+        """
+        self._resolve_dates()
+        if "function_sig" not in self.config:
+            return self._prepare_multi_filter()
+
+        # Retrieve EIP-712 function signature
+        function_sig = self.ev_func_sig_parser.parse_function_sig(
+            self.config["function_sig"]
+        )
 
-            # Build filter parameters based on indexed args
-            filter_params = build_filter_params(
-                self.config,
-                function_sig,
-                parsed_args_list,
-                self.w3,
-                self.context,
-                self.ev_func_args_list.num_indexed_args,
+        # Retrieve function arguments to be processed
+        parsed_args_list = self.ev_func_args_list.get_function_args_list(
+            self.config["function_sig"]
+        )
+
+        # Build filter parameters based on indexed args
+        filter_params = build_filter_params(
+            self.config,
+            function_sig,
+            parsed_args_list,
+            self.w3,
+            self.context,
+            self.ev_func_args_list.num_indexed_args,
+        )
+        plan = self.ev_func_args_parser.compile_plan(parsed_args_list, self.config)
+        spec = EventSpec(None, function_sig, parsed_args_list, plan)
+        return {function_sig: spec}, filter_params
+
+    def _resolve_dates(self):
+        """
+        Converts `start_date` & `end_date` ('YYYYMMDD HH:MM:SS', UTC) into the first
+        block at or after the start date and the last block before or at the end date.
+        With a block time index (see utils.block_index), this takes a couple of requests.
+        """
+        if "start_date" not in self.config and "end_date" not in self.config:
+            return
+        block_utils = BlockUtils(self.w3, self.network, self.cache_folder)
+        if "start_date" in self.config:
+            timestamp = block_utils.convert_date_to_ts(self.config["start_date"])
+            block = block_utils.get_closest_block_number_by_timestamp(timestamp)
+            if block_utils.get_block_timestamp(block) < timestamp:
+                block += 1
+            self.config["start_block"] = block
+        if "end_date" in self.config:
+            self.config["end_block"] = block_utils.get_closest_block_number_by_date(
+                self.config["end_date"]
+            )
+        if self.context == Context.MAIN.INPUT:
+            logger.info(
+                f"Dates resolved to blocks {self.config.get('start_block')} "
+                f"to {self.config.get('end_block')}"
             )
 
-            # Retrieve logs based on the filter parameters
-            logs = self.get_logs_in_range(filter_params)
+    def _prepare_multi_filter(self):
+        """
+        Parses several event signatures (`function_sigs`, or all events in `abi`),
+        which are retrieved at once by filtering on any of their topic0 hashes
+        """
+        signatures = self.config.get("function_sigs") or (
+            self.ev_func_sig_parser.get_abi_signatures(self.config["abi"])
+        )
+        dispatch = {}
+        for signature in signatures:
+            name = self.ev_func_sig_parser.get_function_name(signature)
+            topic = self.ev_func_sig_parser.parse_function_sig(signature)
+            # a new args list per signature, as it counts the indexed args parsed
+            parsed_args = EventFuncArgsList(
+                self.w3, self.context
+            ).get_function_args_list(signature)
+            # decimals are given per event name, e.g.: {"Transfer": {"wad": 18}}
+            config = {"decimals": self.config.get("decimals", {}).get(name, {})}
+            plan = self.ev_func_args_parser.compile_plan(parsed_args, config)
+            dispatch[topic] = EventSpec(name, topic, parsed_args, plan)
 
-            for log in logs:
-                # Extract transaction data
-                txn_data = self.ev_func_args_parser.parse_txn_data(log)
+        filter_params = build_multi_filter_params(
+            self.config, list(dispatch), self.w3, self.context
+        )
+        return dispatch, filter_params
 
-                # Extract indexed args
-                indexed_data = self.ev_func_args_parser.parse_indexed_args(
-                    log, parsed_args_list, self.config
-                )
+    def _open_output(self, filter_params, dispatch):
+        """
+        Opens the output file(s) in the main context, one per event type: <model>.csv
+        for single-event models, or <model>_<event name>.csv otherwise. If a checkpoint
+        (watermark) of a previous run of the same model exists, the extraction resumes
+        after it and rows are appended to the files (or written into new part files if
+        columnar). Otherwise (e.g.: tests), events are kept in memory.
+        """
+        names = [spec.name for spec in dispatch.values()]
+        if self.context != Context.MAIN.INPUT:
+            return EventOutput(names)
 
-                # Extract and decode non-indexed args
-                non_indexed_data = self.ev_func_args_parser.parse_non_indexed_args(
-                    log, parsed_args_list, self.config
-                )
+        base_name = os.path.splitext(self.model)[0]
+        writers = {
+            spec.name: get_writer(
+                self.model if spec.name is None else f"{base_name}_{spec.name}",
+                self.output_folder,
+                self.config.get("output_format"),
+                self.config.get("compression"),
+                self.get_columns(spec),
+            )
+            for spec in dispatch.values()
+        }
+        checkpoint, resume_block = None, None
+        if self.config.get("checkpoint", True):
+            checkpoint = Checkpoint(self.model, self.output_folder, self.config)
+            resume_block = checkpoint.get_resume_block()
+
+        if resume_block is not None:
+            logger.info(f"Resuming from block {resume_block} (checkpoint)")
+            filter_params["fromBlock"] = resume_block
 
-                # merge data to build the complete item
-                events.append({**txn_data, **indexed_data, **non_indexed_data})
+        append = resume_block is not None
+        writers = {name: w.open(append, resume_block) for name, w in writers.items()}
+        return EventOutput(names, writers, checkpoint)
 
-                num_records += 1
+    def _decode_chunks(self, chunks, dispatch):
+        """
+        Decodes every chunk of logs, dispatching each log on its topic0,
+        and yielding (to block, {event name: rows}) per chunk.
+        The logs of each event type are decoded as a batch (see EventDecodePlan).
+        """
+        single_spec = next(iter(dispatch.values())) if len(dispatch) == 1 else None
+        for _, to_block, logs in chunks:
+            self.metrics.count("logs", len(logs))
+            with self.metrics.stage("decode"):
+                if single_spec:
+                    groups = {single_spec.topic: logs}
+                else:
+                    groups = {topic: [] for topic in dispatch}
+                    for log in logs:
+                        topic = HexBytes(log["topics"][0]).hex()
+                        if topic in groups:
+                            groups[topic].append(log)
+                decoded = {
+                    topic: dispatch[topic].plan.decode_batch(group)
+                    for topic, group in groups.items()
+                }
+            yield to_block, {
+                dispatch[topic].name: self.enrich_rows(rows, groups[topic])
+                for topic, rows in decoded.items()
+            }
 
-            # dump data into csv file
-            if self.context == Context.MAIN.INPUT:
-                logger.info(f"# records: {num_records}")
-                FileUtils().json_to_csv(events, self.model, Context.MAIN.OUTPUT)
+    def get_columns(self, spec) -> list:
+        """Output columns of an event type: (name, ABI type, decimals)"""
+        columns = list(spec.plan.columns)
+        if self.log_index:
+            columns.insert(2, ("log_index", "uint64", 0))
+        if self.block_timestamp:
+            columns.insert(2, ("block_timestamp", "uint64", 0))
+        return columns
 
-            return json.dumps(events, indent=4)
+    def enrich_rows(self, rows, logs):
+        """
+        Adds the optional `block_timestamp` and `log_index` columns after `block_num`.
+        Timestamps are read from the block header cache (unique blocks only).
+        """
+        if not rows or not (self.block_timestamp or self.log_index):
+            return rows
+        if self.block_timestamp:
+            with self.metrics.stage("fetch"):
+                timestamps = self._get_block_timestamps({log["blockNumber"] for log in logs})
 
-        except KeyError as e:
-            logger.error(f'extract_data(): Error found on key {e}')
-        except FilterEventError:
-            """handled in function build_filter_params()"""
-        except ParserEventError:
-            """handled in classes EventFunc*"""
-        except Exception as e:
-            logger.error(f"extract_data(): {e}")
+        enriched = []
+        with self.metrics.stage("decode"):
+            for row, log in zip(rows, logs):
+                extra = {"txn_hash": row["txn_hash"], "block_num": row["block_num"]}
+                if self.block_timestamp:
+                    extra["block_timestamp"] = timestamps[log["blockNumber"]]
+                if self.log_index:
+                    extra["log_index"] = log["logIndex"]
+                enriched.append({**extra, **row})
+        return enriched
+
+    def _get_block_timestamps(self, block_numbers) -> dict:
+        if self.finalized_block is None:
+            self.finalized_block = BlockUtils(
+                self.w3, self.network, self.cache_folder
+            ).get_finalized_block_number()
+        headers = BlockHeaderCache.shared(self.w3, self.network, self.cache_folder)
+        headers.workers = self.workers
+        return headers.get_timestamps(block_numbers, self.finalized_block)
 
-    # iterative (non-recursive) binary-search approach
     def get_logs_in_range(self, params):
-        """Fetches logs in the provided block range, handling possible errors"""
-        logs = []
-        ranges_to_check = [params]
+        """Fetches all logs in the provided block range, returned in block order"""
+        return self._merge_logs(logs for _, _, logs in self.iter_logs_in_range(params))
+
+    def iter_logs_in_range(self, params):
+        """
+        Yields (from block, to block, logs) for the provided block range chunk by chunk,
+        in block order. Block ranges already in the local cache are read from disk; the
+        remaining ones are fetched from the node and cached once they are finalized.
+        """
+        params = self._resolve_block_range(params)
+        if params["fromBlock"] > params["toBlock"]:
+            self._log_event_processing(params["fromBlock"], params["toBlock"], "No new")
+            return
+        if not self.use_cache:
+            yield from self._fetch_logs_in_range(params)
+            return
 
-        while ranges_to_check:
-            current_range = ranges_to_check.pop()
-            from_block, to_block = current_range["fromBlock"], current_range["toBlock"]
-            self._log_event_processing(from_block, to_block, "Reading")
+        log_cache = LogCache(self.network, params, self.cache_folder)
+        finalized_block = None
+        for from_block, to_block, cached in log_cache.plan(
+            params["fromBlock"], params["toBlock"]
+        ):
+            if cached:
+                self._log_event_processing(from_block, to_block, "Cached")
+                # a chunk per cached file, so that memory stays bounded on large ranges
+                for chunk in log_cache.read(from_block, to_block):
+                    self.metrics.count("cached_chunks")
+                    yield chunk
+                continue
 
+            if finalized_block is None:
+                finalized_block = BlockUtils(
+                    self.w3, self.network, self.cache_folder
+                ).get_finalized_block_number()
+
+            gap_params = {**params, "fromBlock": from_block, "toBlock": to_block}
+            for chunk_from, chunk_to, logs in self._fetch_logs_in_range(gap_params):
+                # only finalized blocks are cached, so that reorgs can't poison the cache
+                if chunk_from <= finalized_block:
+                    cached_to = min(chunk_to, finalized_block)
+                    log_cache.store(
+                        chunk_from,
+                        cached_to,
+                        [log for log in logs if log["blockNumber"] <= cached_to],
+                    )
+                yield chunk_from, chunk_to, logs
+
+    def _fetch_logs_in_range(self, params):
+        """
+        Fetches logs in the provided block range with a pool of workers, yielding
+        (from block, to block, logs) for each chunk in block order. The range is read
+        in adaptive chunks (see utils.chunker), and workers pause when the consumer
+        falls behind.
+        """
+        key = ChunkSizeStore.get_key(self.network, params)
+        workers = max(1, self.workers)
+        chunker = BlockRangeChunker(
+            params,
+            get_provider_profile(self.w3),
+            self.chunk_sizes.get(key),
+            workers * FETCH_BUFFER_PER_WORKER,
+        )
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in range(workers):
+                executor.submit(in_context(self._fetch_chunks), chunker)
             try:
-                logs.extend(self.w3.eth.get_logs(current_range))
-                self._log_event_processing(from_block, to_block, "Processed")
-
-            except ValueError as e:
-                error_data = str(e)
-                if "'message': 'query returned more than 10000 results" in error_data:
-                    ranges_to_check.extend(self._split_block_range(current_range))
-                elif "'message': 'limit exceeded'" in error_data:
-                    logger.error(f"Limit error: {error_data}")
-                    raise e
-                else:
-                    logger.error(f"An unexpected error occurred: {error_data}")
-                    raise e
+                yield from chunker.iter_chunks()
+            finally:
+                # stop the workers if the consumer stops early or fails
+                chunker.abort()
 
-        return logs
+        # remember the chunk size for the next extraction of the same contract & topic
+        self.chunk_sizes.set(key, chunker.size)
+
+    def _fetch_chunks(self, chunker):
+        """
+        Worker loop: fetches the chunks handed out by the chunker, handling possible errors
+        """
+        try:
+            while (current_range := chunker.next_range()) is not None:
+                from_block, to_block = (
+                    current_range["fromBlock"],
+                    current_range["toBlock"],
+                )
+                self._log_event_processing(from_block, to_block, "Reading")
+
+                try:
+                    logs = self._get_logs_with_retry(current_range)
+                    chunker.report_success(current_range, logs)
+                    self.metrics.count("chunks")
+                    self._log_event_processing(from_block, to_block, "Processed")
+
+                except ValueError as e:
+                    chunker.report_overflow(current_range, self._get_overflow(e))
+                    self.metrics.count("range_splits")
+        except Exception as e:
+            chunker.abort(e)
 
     @staticmethod
-    def _split_block_range(filters):
-        """Splits the given block range into two equal halves"""
-        mid_block = (filters["fromBlock"] + filters["toBlock"]) // 2
-        # safety check (1 block can't be further divided)
-        if mid_block == filters["fromBlock"]:
-            logger.error(f"Too many results in a single block: {mid_block}")
-            return []
+    def _get_overflow(error: ValueError) -> str:
+        """
+        Returns the message of an error due to the provider's range or result limits
+        (the range must be split), re-raising any other error
+        """
+        error_data = str(error)
+        if "'message': 'limit exceeded'" in error_data:
+            logger.error(f"Limit error: {error_data}")
+            raise error
+        if is_limit_error(error_data):
+            return error_data
+        logger.error(f"An unexpected error occurred: {error_data}")
+        raise error
+
+    def _resolve_block_range(self, params):
+        """Converts block tags (e.g.: 'latest') into block numbers"""
+        params = params.copy()
+        for key in ("fromBlock", "toBlock"):
+            if not isinstance(params[key], int):
+                params[key] = self.w3.eth.get_block(params[key])["number"]
+        return params
 
-        lower, upper = filters.copy(), filters.copy()
-        lower["toBlock"] = mid_block
-        upper["fromBlock"] = mid_block + 1
+    def _get_logs_with_retry(self, params):
+        """
+        Retrieves the logs for a single block range, retrying on transient network errors.
+        Logs are only returned once the whole range succeeds, so retries can't duplicate them.
+        """
+        delay = FETCH_RETRY_DELAY
+        for attempt in range(FETCH_RETRIES + 1):
+            try:
+                return self.w3.eth.get_logs(params)
+            except RequestException as e:
+                if attempt == FETCH_RETRIES:
+                    raise e
+                logger.warning(
+                    f"Retrying blocks {params['fromBlock']} to {params['toBlock']} "
+                    f"in {delay}s ({attempt + 1}/{FETCH_RETRIES}): {type(e).__name__}"
+                )
+                self.metrics.count("retries")
+                time.sleep(delay)
+                delay *= 2
 
-        return lower, upper
+    @staticmethod
+    def _merge_logs(results):
+        """
+        Concatenates the logs from every chunk (already in block order),
+        discarding any log that was already returned
+        """
+        logs = []
+        seen = set()
+        for chunk_logs in results:
+            for log in chunk_logs:
+                key = (log["transactionHash"], log["logIndex"])
+                if key not in seen:
+                    seen.add(key)
+                    logs.append(log)
+        return logs
 
     def _log_event_processing(self, from_block, to_block, status):
-        """Helper function to log event processing status"""
+        """Helper function to log event processing status (rate-limited)"""
         if self.context == Context.MAIN.INPUT:
-            logger.info(f"{status} events from blocks {from_block} to {to_block}")
+            self.progress.info("%s events from blocks %s to %s", status, from_block, to_block)
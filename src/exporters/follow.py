@@ -0,0 +1,248 @@
+import os
+import json
+import time
+
+from hexbytes import HexBytes
+from utils.context import Context
+from utils.writers import get_writer
+from utils.logger import setup_logger
+from exporters.event import EventExporter
+from web3.datastructures import AttributeDict
+from websockets.sync.client import connect
+from websockets.exceptions import WebSocketException
+from constants import NETWORKS, FOLLOW_POLL_INTERVAL, FOLLOW_REORG_DEPTH
+from utils.exceptions import FilterEventError, ParserEventError, BlockUtilsError
+
+logger = setup_logger(__name__)
+
+
+class EventFollower(EventExporter):
+    """
+    Follows an event model live: backfills its logs up to the head of the chain, and
+    then appends new logs as they are mined, either from a websocket subscription
+    (env var `WS_PROVIDER_<NETWORK>`) or by polling eth_getLogs in small windows.
+    Logs dropped by a reorg are emitted again as retractions (column `removed` = True).
+    The output file is rewritten on every run (no checkpoints).
+    """
+
+    def __init__(
+        self,
+        w3_instance,
+        model: str,
+        context: str = Context.MAIN.INPUT,
+        network: str = NETWORKS["ETHEREUM"],
+        ws_url: str = None,
+    ):
+        super().__init__(w3_instance, model, context, network)
+        self.ws_url = ws_url or os.getenv(f"WS_PROVIDER_{network}")
+        self.poll_interval = self.config.get("poll_interval", FOLLOW_POLL_INTERVAL)
+        self.reorg_depth = self.config.get("reorg_depth", FOLLOW_REORG_DEPTH)
+        # Rows emitted for the latest blocks: {block number: {(block hash, log index): row}}
+        self.recent = {}
+        self.last_block = None
+        self.last_hash = None
+        self.num_events = 0
+        self.events = []
+        self.writer = None
+
+    def follow(self, max_events: int = None):
+        """
+        Backfills and follows the event model until interrupted (Ctrl+C), or until
+        `max_events` new rows (including retractions) are emitted after the backfill
+        """
+        ws = None
+        try:
+            dispatch, filter_params = self.prepare_filter()
+            if len(dispatch) > 1:
+                raise ValueError("Follow mode supports a single event signature per model")
+            spec = next(iter(dispatch.values()))
+            if self.context == Context.MAIN.INPUT:
+                self.writer = get_writer(
+                    self.model,
+                    self.output_folder,
+                    self.config.get("output_format"),
+                    self.config.get("compression"),
+                    self.get_columns(spec) + [("removed", "bool", 0)],
+                ).open()
+
+            # Subscribe before the backfill, so that no block is missed in between
+            if self.ws_url:
+                ws = self._subscribe(filter_params)
+
+            # Backfill up to the current head
+            head = self.w3.eth.get_block("latest")
+            self.last_block, self.last_hash = head.number, head.hash
+            backfill_params = {**filter_params, "toBlock": self.last_block}
+            for _, _, logs in self.iter_logs_in_range(backfill_params):
+                self._emit(logs, spec, count=False)
+            if self.context == Context.MAIN.INPUT:
+                logger.info(f"Backfill done up to block {self.last_block}, following...")
+
+            if ws:
+                try:
+                    self._follow_subscription(ws, spec, max_events)
+                except (WebSocketException, OSError) as e:
+                    logger.warning(f"Websocket closed ({e}), polling eth_getLogs instead")
+            self._follow_polling(filter_params, spec, max_events)
+
+        except KeyboardInterrupt:
+            logger.info(f"Follow mode stopped at block {self.last_block}")
+        except KeyError as e:
+            logger.error(f"follow(): Error found on key {e}")
+        except FilterEventError:
+            """handled in function build_filter_params()"""
+        except ParserEventError:
+            """handled in classes EventFunc*"""
+        except BlockUtilsError:
+            """handled in class utils.block"""
+        except Exception as e:
+            logger.error(f"follow(): {e}")
+        finally:
+            if ws:
+                ws.close()
+            if self.writer:
+                self.writer.close()
+
+    def _subscribe(self, filter_params):
+        """Opens the websocket connection and subscribes to the logs of the event model"""
+        ws = connect(self.ws_url)
+        log_filter = {
+            "address": filter_params["address"],
+            "topics": filter_params["topics"],
+        }
+        ws.send(
+            json.dumps(
+                {
+                    "jsonrpc": "2.0",
+                    "id": 1,
+                    "method": "eth_subscribe",
+                    "params": ["logs", log_filter],
+                }
+            )
+        )
+        response = json.loads(ws.recv())
+        if "error" in response:
+            ws.close()
+            raise ValueError(f"eth_subscribe failed: {response['error']}")
+        return ws
+
+    def _follow_subscription(self, ws, spec, max_events):
+        """Emits the logs notified by the websocket subscription"""
+        while not self._is_done(max_events):
+            message = json.loads(ws.recv())
+            if message.get("method") != "eth_subscription":
+                # e.g.: a late reply or an error object, not worth stopping for
+                logger.warning(f"Unexpected websocket message skipped: {message}")
+                continue
+            log = self.format_raw_log(message["params"]["result"])
+            if log["removed"]:
+                self._retract(log, spec)
+            # older logs were already emitted by the backfill
+            elif not self._is_emitted(log) and not self._is_final(log["blockNumber"]):
+                self._emit([log], spec)
+            self.last_block = max(self.last_block, log["blockNumber"])
+            self._prune()
+
+    def _follow_polling(self, filter_params, spec, max_events):
+        """
+        Polls the head of the chain, and eth_getLogs whenever it changes (new blocks,
+        or a reorg of the tip at the same height), re-reading the last `reorg_depth`
+        blocks to detect logs dropped or added by a reorg
+        """
+        while not self._is_done(max_events):
+            head = self.w3.eth.get_block("latest")
+            if head.number != self.last_block or head.hash != self.last_hash:
+                params = {
+                    **filter_params,
+                    "fromBlock": max(
+                        filter_params["fromBlock"],
+                        min(self.last_block, head.number) - self.reorg_depth + 1,
+                    ),
+                    "toBlock": head.number,
+                }
+                logs = [
+                    log
+                    for _, _, chunk in self._fetch_logs_in_range(params)
+                    for log in chunk
+                ]
+                self._reconcile(params["fromBlock"], logs, spec)
+                self.last_block, self.last_hash = head.number, head.hash
+                self._prune()
+            if not self._is_done(max_events):
+                time.sleep(self.poll_interval)
+
+    def _reconcile(self, from_block, logs, spec):
+        """Retracts emitted rows no longer in the canonical chain, and emits new ones"""
+        keys = {self._get_key(log) for log in logs}
+        for block_num in sorted(self.recent):
+            if block_num < from_block:
+                continue
+            for key, row in list(self.recent[block_num].items()):
+                if key not in keys:
+                    del self.recent[block_num][key]
+                    self._write([{**row, "removed": True}])
+        self._emit(
+            [log for log in logs if not self._is_emitted(log)], spec
+        )
+
+    def _emit(self, logs, spec, count=True):
+        """Decodes and writes new logs, keeping the rows of the latest blocks"""
+        rows = []
+        decoded = self.enrich_rows(spec.plan.decode_batch(logs), logs)
+        for log, row in zip(logs, decoded):
+            row = {**row, "removed": False}
+            if not self._is_final(log["blockNumber"]):
+                self.recent.setdefault(log["blockNumber"], {})[self._get_key(log)] = row
+            rows.append(row)
+        self._write(rows, count)
+
+    def _retract(self, log, spec):
+        """Writes a retraction for a log removed by a reorg"""
+        row = self.recent.get(log["blockNumber"], {}).pop(self._get_key(log), None)
+        if row is None:
+            row = self.enrich_rows(spec.plan.decode_batch([log]), [log])[0]
+        self._write([{**row, "removed": True}])
+
+    def _write(self, rows, count=True):
+        if self.writer:
+            self.writer.write_rows(rows)
+        else:
+            self.events.extend(rows)
+        if count:
+            self.num_events += len(rows)
+
+    def _prune(self):
+        """Forgets the rows of blocks that can't be reorged anymore"""
+        for block_num in [b for b in self.recent if self._is_final(b)]:
+            del self.recent[block_num]
+
+    def _is_final(self, block_num) -> bool:
+        """Checks if a block is too old to be reorged (beyond `reorg_depth`)"""
+        return block_num <= self.last_block - self.reorg_depth
+
+    def _is_emitted(self, log) -> bool:
+        return self._get_key(log) in self.recent.get(log["blockNumber"], {})
+
+    def _is_done(self, max_events) -> bool:
+        return max_events is not None and self.num_events >= max_events
+
+    @staticmethod
+    def _get_key(log):
+        return HexBytes(log["blockHash"]).hex(), log["logIndex"]
+
+    @staticmethod
+    def format_raw_log(log: dict) -> AttributeDict:
+        """Formats a raw JSON-RPC log (hex strings) as returned by web3"""
+        return AttributeDict(
+            {
+                **log,
+                "topics": [HexBytes(topic) for topic in log["topics"]],
+                "data": HexBytes(log["data"]),
+                "blockNumber": int(log["blockNumber"], 16),
+                "blockHash": HexBytes(log["blockHash"]),
+                "transactionHash": HexBytes(log["transactionHash"]),
+                "transactionIndex": int(log["transactionIndex"], 16),
+                "logIndex": int(log["logIndex"], 16),
+                "removed": log.get("removed", False),
+            }
+        )
@@ -62,3 +62,37 @@ def build_filter_params(
     except Exception as e:
         logger.error(f"build_filter_params(): {e}")
         raise FilterEventError()
+
+
+def build_multi_filter_params(config, topics, w3_instance, context):
+    """
+    Builds the filter parameters to retrieve several event types in a single
+    eth_getLogs call (OR-list of their hashes in topic0)
+    """
+    try:
+        addr_utils = AddressUtils(w3_instance)
+
+        # topics 1-3 would apply to all event types -> not supported
+        if any(value is not None for value in config.get("filters", {}).values()):
+            raise ValueError(
+                "Filters on indexed args are not supported with several event signatures"
+            )
+
+        filter_params = {
+            "fromBlock": config["start_block"],
+            "toBlock": config["end_block"],
+            "address": addr_utils.addr_checksum(config["contract_addr"]),
+            "topics": [topics],
+        }
+
+        if context == Context.MAIN.INPUT:
+            logger.info(f"filter: {filter_params}")
+
+        return filter_params
+
+    except KeyError as e:
+        logger.error(f"build_multi_filter_params(): Error found on key {e}")
+        raise FilterEventError()
+    except Exception as e:
+        logger.error(f"build_multi_filter_params(): {e}")
+        raise FilterEventError()
@@ -13,6 +13,18 @@ default_call = {
         "If `null` value, the call will be performed at the latest block"
         "E.g.: 18564560"
     ),
+    "block_range": (
+        "Optional: Instead of `block`, calls the function at every `step` blocks from "
+        "`start` to `end` (both included), writing a row per block into "
+        "/src/data/<model>.csv (block_num, block_timestamp, outputs). "
+        "E.g.: {'start': 18000000, 'end': 18500000, 'step': 7200}"
+    ),
+    "date_range": (
+        "Optional: Instead of `block`, calls the function at the closest block (before "
+        "or at) every date from `start` to `end` (format 'YYYYMMDD HH:MM:SS', UTC), "
+        "every calendar `interval`: hour, day, week or month. "
+        "E.g.: {'start': '20230101 00:00:00', 'end': '20231231 00:00:00', 'interval': 'day'}"
+    ),
     "function_name": (
         "Mandatory: Exact name of the contract function to be called. "
         "E.g.: vestedBalance"
@@ -23,6 +35,13 @@ default_call = {
         "Use `null` value when filtering is not needed ",
         "E.g.: {'account': '0xd0ec53a6144dee637052bf94b443fd1d49f45076'}",
     ),
+    "arguments_file": (
+        "Optional: Instead of `arguments`, file in /src/models with many argument sets "
+        "to call the function with, packed into Multicall3 calls at the same block. "
+        "CSV file with the argument names as header, or JSON list of arguments. "
+        "A row per argument set is written into /src/data/<model>.csv. "
+        "E.g.: holders.csv"
+    ),
     "arg_types": (
         "Mandatory: Types of the function arguments. "
         "Must match the argument types from the function signature exactly. "
@@ -33,5 +52,17 @@ default_call = {
         "if not fufilled, use an empty object '{}'. "
         "E.g.: {'vested': 18, 'available': 18}"
     ),
+    "functions": (
+        "Optional: Several functions to be called at the same block, instead of "
+        "`function_name`, `arguments`, `arg_types` and `output_decimals`. "
+        "One output file per function: /src/data/<model>_<function_name>.csv "
+        "E.g.: [{'function_name': 'balanceOf', 'arguments_file': 'holders.csv', "
+        "'arg_types': {'account': 'address'}, 'output_decimals': {'balance': 18}}]"
+    ),
+    "call_gas": (
+        "Optional: Gas per call when using `arguments_file` or `functions`, to size "
+        "each Multicall3 call (default: 100000)"
+    ),
+    "workers": "Optional: Concurrent Multicall3 calls or block batches (default: 4)",
     "abi": "Contract's ABI containing the function to be called. ",
 }
@@ -13,12 +13,33 @@ default_event = {
         "Mandatory: Start block number for data extraction. E.g.: 18473342"
     ),
     "end_block": (
-        "Mandatory:   End block number for data extraction." "E.g.: 18473542"
+        "Mandatory:   End block number for data extraction." "E.g.: 18473542. "
+        "A block tag such as `finalized` can be used for scheduled (incremental) runs"
+    ),
+    "start_date": (
+        "Optional: Instead of `start_block`, date from which events are extracted "
+        "(format 'YYYYMMDD HH:MM:SS', UTC), resolved to the first block at or after it. "
+        "E.g.: 20230101 00:00:00"
+    ),
+    "end_date": (
+        "Optional: Instead of `end_block`, date until which events are extracted, "
+        "resolved to the last block before or at it. E.g.: 20231231 23:59:59"
     ),
     "function_sig": (
         "Mandatory: Function signature copied from Etherscan or the smart contract code. "
         "E.g.: Transfer (index_topic_1 address src, index_topic_2 address dst, uint256 wad)"
     ),
+    "function_sigs": (
+        "Optional: List of function signatures, used instead of `function_sig` to extract "
+        "several event types of the contract in a single pass over the block range. "
+        "Rows are written into one file per event: /src/data/<model>_<event name>.csv. "
+        "Filters on indexed args are not supported: use {} or `null` values."
+    ),
+    "abi": (
+        "Optional: Contract ABI (list), used instead of `function_sig` to extract all its "
+        "events in a single pass (same output as `function_sigs`). Events with tuple "
+        "(struct) arguments are skipped."
+    ),
     "filters": (
         "Mandatory: Criteria used to filter events based on indexed parameters. "
         "Must contain ALL indexed arguments. If no indexed arguments in signature, use {}. "
@@ -28,6 +49,45 @@ default_event = {
     "decimals": (
         "Optional: Used to format integer values into their decimal representations. "
         "Must contain ALL arguments. Only fill in those that are uint or int. "
-        "E.g.: { 'src': null, 'dst': null, 'wad': 18 }"
+        "E.g.: { 'src': null, 'dst': null, 'wad': 18 }. "
+        "With `function_sigs` or `abi`, decimals are given per event name, "
+        "e.g.: { 'Transfer': { 'wad': 18 } }"
+    ),
+    "block_timestamp": (
+        "Optional: Add the `block_timestamp` column (unix time) after `block_num`. "
+        "Block headers are fetched once per block in concurrent batches, and finalized "
+        "ones are cached in /src/cache/headers. Default: false"
+    ),
+    "log_index": (
+        "Optional: Add the `log_index` column (position of the log in its block). "
+        "Default: false"
+    ),
+    "workers": (
+        "Optional: Number of concurrent workers fetching logs from the node provider. "
+        "Each worker pulls the next block range chunk from a shared chunker, whose chunk "
+        "size adapts to the node's result limits. Use 1 to fetch sequentially. "
+        "Default: 4"
+    ),
+    "output_format": (
+        "Optional: Format of the output file in /src/data: `csv` (default), `ndjson`, "
+        "or the typed columnar formats `parquet` and `arrow` (require pyarrow). "
+        "Rows are appended to the file as each block range is processed (one row group "
+        "per block range in columnar files, with a new part file per resumed run)."
+    ),
+    "compression": (
+        "Optional: Compression of the output file: `gzip` or `zstd` (requires zstandard). "
+        "Parquet files: `gzip` or `zstd` (snappy by default). Arrow files: `zstd`. "
+        "Default: null (no compression)"
+    ),
+    "cache": (
+        "Optional: Keep the raw logs of finalized blocks in /src/cache, so that later "
+        "extractions of the same contract & filters only request the missing block ranges. "
+        "Default: true"
+    ),
+    "checkpoint": (
+        "Optional: Record the last block written into the output file, so that a crashed "
+        "run resumes from there and a new run of the same model only appends the blocks "
+        "after it. Changing any field other than `end_block` starts a new extraction. "
+        "Default: true"
     ),
 }
@@ -28,7 +28,7 @@ class CallResultParser:
             # Check if there are output variable names
             if function_abi and "outputs" in function_abi:
                 # Retrieves output names or assigns `output_N` if not found
-                output_names = self._get_output_names(function_abi)
+                output_names = self.get_output_names(function_abi)
 
                 # if output_decimals is fulfilled in the Model
                 if output_decimals:
@@ -47,7 +47,7 @@ class CallResultParser:
             raise ParserCallError(e)
 
     @staticmethod
-    def _get_output_names(function_abi):
+    def get_output_names(function_abi):
         """
         Extracts or assigns names to ABI output parameters.
         """
@@ -0,0 +1,125 @@
+import re
+import numpy as np
+
+from constants import EVM_WORD_SIZE
+from utils.logger import setup_logger
+from utils.exceptions import ParserEventError
+
+logger = setup_logger(__name__)
+
+# Static scalar types, encoded in a single word at a fixed position of the log data
+STATIC_TYPE = re.compile(r"^(u?int\d*|address|bool|bytes\d+)$")
+# Integers below 2**53 and powers of ten up to 10**22 are exact as float64, so
+# numpy divisions return the same (correctly rounded) floats as Python's int / int
+MAX_EXACT_INT = 2**53
+MAX_EXACT_DECIMALS = 22
+
+
+class EventBatchDecoder:
+    """
+    Decodes a whole chunk of logs of a fixed-layout event at once: the data and
+    topics of all logs are stacked into contiguous (logs x words x 32 bytes) arrays,
+    and every argument is decoded as a column view of its word.
+    - addresses & fixed-size bytes: one hex conversion of the whole column
+    - integers: vectorised scaling when exact as float64, scalar path otherwise
+    Events with dynamic types (string, bytes, arrays) use the plan's scalar path.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.enabled = all(
+            STATIC_TYPE.match(arg_type) and not isinstance(decimals, list)
+            for arg_type, _, decimals in plan.indexed_args + plan.non_indexed_args
+        )
+        self.num_topics = len(plan.indexed_args) + 1
+        self.data_size = len(plan.non_indexed_args) * EVM_WORD_SIZE
+
+    def decode(self, logs: list) -> list:
+        """Decodes a chunk of logs into rows, in the same order and format as the plan"""
+        if not self.enabled or not self._is_fixed_layout(logs):
+            return [self.plan.decode(log) for log in logs]
+        try:
+            columns = {
+                "txn_hash": [log["transactionHash"].hex() for log in logs],
+                "block_num": [log["blockNumber"] for log in logs],
+            }
+            if self.plan.indexed_args:
+                topics = self._stack(
+                    b"".join(topic for log in logs for topic in log["topics"][1:]),
+                    len(logs),
+                )
+                for i, (arg_type, arg_name, decimals) in enumerate(self.plan.indexed_args):
+                    columns[arg_name] = self._decode_column(topics[:, i], arg_type, decimals)
+            if self.plan.non_indexed_args:
+                words = self._stack(b"".join(log["data"] for log in logs), len(logs))
+                for i, (arg_type, arg_name, decimals) in enumerate(
+                    self.plan.non_indexed_args
+                ):
+                    columns[arg_name] = self._decode_column(words[:, i], arg_type, decimals)
+
+            names = list(columns)
+            return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+        except Exception as e:
+            logger.error(f"EventBatchDecoder.decode(): {e}")
+            raise ParserEventError()
+
+    def _is_fixed_layout(self, logs: list) -> bool:
+        return bool(logs) and all(
+            len(log["topics"]) == self.num_topics and len(log["data"]) == self.data_size
+            for log in logs
+        )
+
+    @staticmethod
+    def _stack(buffer: bytes, num_logs: int) -> np.ndarray:
+        """Views a contiguous byte buffer as a (logs x words x 32 bytes) array"""
+        return np.frombuffer(buffer, dtype=np.uint8).reshape(num_logs, -1, EVM_WORD_SIZE)
+
+    def _decode_column(self, words: np.ndarray, arg_type: str, decimals) -> list:
+        """Decodes a (logs x 32 bytes) column of words of the given type"""
+        if arg_type == "address":
+            return self._to_hex(words[:, 12:], prefix="0x")
+        if arg_type == "bool":
+            return (words[:, -1] == 1).tolist()
+        if arg_type.startswith("bytes"):
+            return self._to_hex(words[:, : int(arg_type[len("bytes") :])])
+        return self._decode_integers(words, arg_type, decimals)
+
+    def _decode_integers(self, words: np.ndarray, arg_type: str, decimals) -> list:
+        """
+        Scales integers by their decimals. Values whose float64 division would not
+        match the scalar path (beyond 2**53) are decoded one by one.
+        """
+        signed = arg_type.startswith("int")
+        convert = self.plan.get_converter(arg_type, decimals)
+        decimals = decimals or 0
+        if decimals > MAX_EXACT_DECIMALS:
+            return [convert(self._to_int(word, signed)) for word in words]
+
+        low = np.ascontiguousarray(words[:, 24:]).view(">i8" if signed else ">u8")[:, 0]
+        if signed:
+            # negative values are sign-extended with 0xff bytes
+            padding = np.where(low < 0, 0xFF, 0).astype(np.uint8)
+            exact = (words[:, :24] == padding[:, None]).all(axis=1)
+            exact &= (low > -MAX_EXACT_INT) & (low < MAX_EXACT_INT)
+        else:
+            exact = ~words[:, :24].any(axis=1) & (low < MAX_EXACT_INT)
+
+        if decimals > 0:
+            values = (low.astype(np.float64) / float(10**decimals)).tolist()
+        else:
+            values = low.astype(np.int64).tolist()
+        for i in np.flatnonzero(~exact).tolist():
+            values[i] = convert(self._to_int(words[i], signed))
+        return values
+
+    @staticmethod
+    def _to_int(word: np.ndarray, signed: bool) -> int:
+        return int.from_bytes(word.tobytes(), byteorder="big", signed=signed)
+
+    @staticmethod
+    def _to_hex(column: np.ndarray, prefix: str = "") -> list:
+        """Converts every row of a (logs x N bytes) column into a hex string"""
+        size = column.shape[1] * 2
+        hex_data = np.ascontiguousarray(column).tobytes().hex()
+        return [prefix + hex_data[i : i + size] for i in range(0, len(hex_data), size)]
@@ -0,0 +1,170 @@
+import re
+
+from functools import lru_cache
+from utils.logger import setup_logger
+from utils.address import AddressUtils
+from utils.exceptions import ParserEventError
+from parsers.event_batch_decoder import EventBatchDecoder
+
+logger = setup_logger(__name__)
+
+# Outermost array dimension of a type, e.g.: uint256[3] -> ('uint256', '3')
+ARRAY_TYPE = re.compile(r"^(.*)\[(\d*)\]$")
+
+
+@lru_cache(maxsize=65536)
+def format_topic_address(topic: bytes) -> str:
+    """Formats an indexed address (32-byte topic) as a 0x-prefixed lowercase address"""
+    return AddressUtils.clean_address(topic.hex())
+
+
+class EventDecodePlan:
+    """
+    Decoding plan of an event signature, compiled once per extraction:
+    - indexed args: one converter per topic, with fast paths for the usual types
+    - non-indexed args: a single ABI decode of the whole log data (as a tuple),
+      followed by one precomputed converter per column
+    Decimals are resolved at compile time, so decoding a log only applies functions.
+    Chunks of logs of fixed-layout events are decoded column by column (see
+    parsers.event_batch_decoder).
+    """
+
+    def __init__(self, w3_instance, parsed_args: list, config: dict):
+        self.codec = w3_instance.codec
+        decimals = config.get("decimals") or {}
+        self.indexed = []
+        self.non_indexed = []
+        self.non_indexed_types = []
+        # (type, name, decimals) of every arg, for the batch decoder
+        self.indexed_args = []
+        self.non_indexed_args = []
+        # (name, ABI type, decimals) of every output column, for typed writers
+        self.columns = [("txn_hash", "string", 0), ("block_num", "uint64", 0)]
+        try:
+            for arg_type, arg_name, indexed in parsed_args:
+                arg_decimals = decimals.get(arg_name, 0)
+                if indexed:
+                    converter = self.get_topic_converter(arg_type, arg_decimals)
+                    self.indexed.append((arg_name, converter))
+                    self.indexed_args.append((arg_type, arg_name, arg_decimals))
+                else:
+                    converter = self.get_converter(arg_type, arg_decimals)
+                    self.non_indexed.append((arg_name, converter))
+                    self.non_indexed_types.append(arg_type)
+                    self.non_indexed_args.append((arg_type, arg_name, arg_decimals))
+            for arg_type, arg_name, arg_decimals in self.indexed_args:
+                # indexed bytes, string and arrays are hashed into a bytes32
+                if arg_type in ("string", "bytes") or "[" in arg_type:
+                    arg_type = "bytes32"
+                self.columns.append((arg_name, arg_type, arg_decimals))
+            for arg_type, arg_name, arg_decimals in self.non_indexed_args:
+                self.columns.append((arg_name, arg_type, arg_decimals))
+            self.batch_decoder = EventBatchDecoder(self)
+        except Exception as e:
+            logger.error(f"EventDecodePlan(): {e}")
+            raise ParserEventError()
+
+    def decode_batch(self, logs: list) -> list:
+        """Decodes a chunk of logs into rows, vectorised for fixed-layout events"""
+        return self.batch_decoder.decode(logs)
+
+    def decode(self, log) -> dict:
+        """
+        Decodes a log into a row: transaction data, indexed args and non-indexed args.
+        E.g.: {'txn_hash': '0x..', 'block_num': 17677591, 'src': '0x..', 'wad': 33.87}
+        """
+        row = {
+            "txn_hash": log["transactionHash"].hex(),
+            "block_num": log["blockNumber"],
+        }
+        row.update(self.decode_indexed(log))
+        row.update(self.decode_non_indexed(log))
+        return row
+
+    def decode_indexed(self, log) -> dict:
+        """Returns a dictionary with all indexed arguments from a log entry"""
+        try:
+            topics = log["topics"]
+            return {
+                arg_name: converter(bytes(topics[i + 1]))
+                for i, (arg_name, converter) in enumerate(self.indexed)
+            }
+        except Exception as e:
+            logger.error(f"decode_indexed(): {e}")
+            raise ParserEventError()
+
+    def decode_non_indexed(self, log) -> dict:
+        """Returns a dictionary with all non-indexed arguments from a log entry"""
+        if not self.non_indexed:
+            return {}
+        try:
+            values = self.codec.decode(self.non_indexed_types, bytes(log["data"]))
+            return {
+                arg_name: converter(value)
+                for (arg_name, converter), value in zip(self.non_indexed, values)
+            }
+        except Exception as e:
+            logger.error(f"decode_non_indexed(): {e}")
+            raise ParserEventError()
+
+    def get_topic_converter(self, arg_type: str, decimals):
+        """
+        Returns the function converting a 32-byte topic into the value of an indexed arg.
+        @DEV: indexed bytes, string and arrays are Keccak-256 hashed -> returned as hex
+        """
+        if arg_type == "address":
+            return format_topic_address
+        if arg_type.startswith("uint") or arg_type.startswith("int"):
+            signed = arg_type.startswith("int")
+            convert = self.get_converter(arg_type, decimals)
+            return lambda topic: convert(
+                int.from_bytes(topic, byteorder="big", signed=signed)
+            )
+        if arg_type == "bool":
+            return lambda topic: topic[-1] == 1
+        if arg_type.startswith("bytes") and arg_type != "bytes":
+            size = int(arg_type[len("bytes") :])
+            return lambda topic: topic[:size].hex()
+        if arg_type in ("string", "bytes") or "[" in arg_type:
+            return lambda topic: topic.hex()
+        return lambda topic: self.codec.decode([arg_type], topic)[0]
+
+    def get_converter(self, arg_type: str, decimals, index: int = 0):
+        """Returns the function converting an ABI-decoded value into its output format"""
+        array = ARRAY_TYPE.match(arg_type)
+        if array:
+            base_type, length = array.groups()
+            # fixed-size arrays may have decimals per item, dynamic ones use the first
+            if length and isinstance(decimals, list):
+                converters = [
+                    self.get_converter(base_type, decimals, i) for i in range(int(length))
+                ]
+                return lambda values: [
+                    convert(value) for convert, value in zip(converters, values)
+                ]
+            convert = self.get_converter(base_type, decimals)
+            return lambda values: [convert(value) for value in values]
+
+        # Fetch the right decimal if it's an array (get 0-index by default)
+        if isinstance(decimals, list):
+            decimals = decimals[index]
+
+        # Convert integer type
+        if arg_type.startswith("uint") or arg_type.startswith("int"):
+            decimals = decimals or 0
+            multiplier = 10**decimals
+            if decimals > 0:
+                return lambda value: value / multiplier
+            return lambda value: int(value / multiplier)
+
+        # Convert address type (already lowercase & 0x-prefixed once decoded)
+        if arg_type == "address":
+            return AddressUtils.clean_address
+
+        # Convert bytes type: dynamic bytes are 0x-prefixed, fixed-size bytes are not
+        if arg_type == "bytes":
+            return lambda value: "0x" + value.hex()
+        if arg_type.startswith("bytes"):
+            return lambda value: value.hex()
+
+        return lambda value: value
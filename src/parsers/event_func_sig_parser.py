@@ -23,6 +23,34 @@ class EventFuncSigParser:
             logger.error(e)
             raise ParserEventError()
 
+    @staticmethod
+    def get_function_name(signature: str) -> str:
+        """Returns the event name from a signature, e.g.: Transfer (address src, ...) -> Transfer"""
+        return signature.split("(")[0].strip()
+
+    @staticmethod
+    def get_abi_signatures(abi: list) -> list:
+        """
+        Builds the signatures of all the events in a contract ABI, e.g.:
+        Transfer (address indexed src, address indexed dst, uint256 wad)
+        Anonymous events and events with tuple (struct) arguments are skipped.
+        """
+        signatures = []
+        for entry in abi:
+            if entry.get("type") != "event" or entry.get("anonymous"):
+                continue
+            inputs = entry.get("inputs", [])
+            if any(arg["type"].startswith("tuple") for arg in inputs):
+                logger.warning(f"Event {entry['name']} skipped: tuple args not supported")
+                continue
+            args = [
+                f"{arg['type']} {'indexed ' if arg.get('indexed') else ''}"
+                f"{arg.get('name') or f'arg{i}'}"
+                for i, arg in enumerate(inputs)
+            ]
+            signatures.append(f"{entry['name']} ({', '.join(args)})")
+        return signatures
+
     @staticmethod
     def _clean_signature(signature: str) -> str:
         # Remove index_topic_N and "indexed" references, then strip whitespaces
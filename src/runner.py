@@ -0,0 +1,110 @@
+"""
+Headless batch runner: runs the event & call models of a manifest or folder (in
+src/models) concurrently across networks, without the interactive menu. E.g.:
+
+    python runner.py nightly.json
+    python runner.py nightly/ --network POLYGON --max-jobs 16 --jobs-per-network 4
+
+Manifest (JSON):
+    {
+        "jobs_per_network": {"ETHEREUM": 4, "POLYGON": 2},
+        "jobs": [
+            {"model": "dai_transfers.json", "network": "ETHEREUM", "priority": 10},
+            {"model": "gro-gtranche_withdrawal.json"}
+        ]
+    }
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+from dotenv import load_dotenv
+from utils.context import Context
+from utils.logger import setup_logger, set_quiet
+from utils.exceptions import FileUtilsError
+from demonic_tutor import DemonicTutor
+from scheduler import JobScheduler, read_jobs
+from constants import NETWORKS, RUNNER_MAX_JOBS, RUNNER_JOBS_PER_NETWORK
+
+load_dotenv()
+logger = setup_logger(__name__)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description="Runs event & call models concurrently across networks"
+    )
+    parser.add_argument("source", help="manifest (JSON) or folder of models, in src/models")
+    parser.add_argument(
+        "--network",
+        default=NETWORKS["ETHEREUM"],
+        choices=list(NETWORKS),
+        help="network of the jobs without one (default: ETHEREUM)",
+    )
+    parser.add_argument(
+        "--max-jobs",
+        type=int,
+        default=RUNNER_MAX_JOBS,
+        help=f"max jobs at a time (default: {RUNNER_MAX_JOBS})",
+    )
+    parser.add_argument(
+        "--jobs-per-network",
+        type=int,
+        default=None,
+        help=f"max jobs at a time per network (default: {RUNNER_JOBS_PER_NETWORK})",
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="only show warnings & errors (the log file keeps everything)",
+    )
+    return parser.parse_args(args)
+
+
+def get_limits(source: str, jobs_per_network: int = None) -> dict:
+    """Returns the max jobs per network: the manifest's, or the same for all networks"""
+    limits = {}
+    path = source if os.path.exists(source) else os.path.join(Context.MAIN.INPUT, source)
+    if os.path.isfile(path):
+        with open(path, "r") as f:
+            limits = {k.upper(): v for k, v in json.load(f).get("jobs_per_network", {}).items()}
+    if jobs_per_network is not None:
+        limits = {network: jobs_per_network for network in NETWORKS}
+    return limits
+
+
+def main(args=None) -> int:
+    args = parse_args(args)
+    set_quiet(args.quiet)
+    try:
+        jobs = read_jobs(args.source, args.network)
+        limits = get_limits(args.source, args.jobs_per_network)
+    except FileUtilsError:
+        """handled in scheduler.read_jobs()"""
+        return 1
+    except (ValueError, KeyError) as e:
+        logger.error(f"Wrong batch {args.source}: {e}")
+        return 1
+    if not jobs:
+        logger.error(f"No jobs found in {args.source}")
+        return 1
+
+    start = time.monotonic()
+    networks = sorted({job.network for job in jobs})
+    logger.info(f"Running {len(jobs)} jobs on {', '.join(networks)}")
+    results = JobScheduler(jobs, DemonicTutor.connect, limits, args.max_jobs).run()
+    failed = [job for job, succeeded in results.items() if not succeeded]
+    logger.info(
+        f"{len(results) - len(failed)} jobs done, {len(failed)} failed "
+        f"in {time.monotonic() - start:.1f}s"
+    )
+    for job in failed:
+        logger.error(f"Failed: {job.model} ({job.network})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from utils.file import FileUtils
+from utils.context import Context
+from utils.chunker import ChunkSizeStore
+from utils.inflight import InFlightRequests
+from utils.logger import setup_logger
+from utils.exceptions import FileUtilsError
+from constants import NETWORKS, RUNNER_MAX_JOBS, RUNNER_JOBS_PER_NETWORK
+
+logger = setup_logger(__name__)
+
+# A model to run on a network: `kind` is "event" or "call", higher priorities run first
+Job = namedtuple("Job", ["model", "network", "kind", "priority"])
+
+
+def read_jobs(source: str, network: str, context: str = Context.MAIN.INPUT) -> list:
+    """
+    Returns the jobs of a manifest (JSON file) or of every model in a folder, e.g.:
+        {"jobs": [{"model": "dai_transfers.json", "network": "ETHEREUM", "priority": 1}]}
+    Model paths are relative to the context folder (src/models). Jobs without a
+    network run on `network`, and the kind of each model is found from its fields.
+    A model can only be run once per batch, as its output file is named after it.
+    """
+    path = source if os.path.exists(source) else os.path.join(context, source)
+    if os.path.isdir(path):
+        entries = [
+            {"model": os.path.relpath(os.path.join(folder, file_name), context)}
+            for folder, _, file_names in sorted(os.walk(path))
+            for file_name in sorted(file_names)
+            if file_name.endswith(".json") and not file_name.endswith(".checkpoint.json")
+        ]
+    else:
+        try:
+            with open(path, "r") as f:
+                entries = json.load(f)["jobs"]
+        except Exception as e:
+            logger.error(f"read_jobs(): {e}")
+            raise FileUtilsError()
+
+    jobs, models = [], set()
+    for entry in entries:
+        model = entry["model"]
+        if model.startswith(".."):
+            logger.error(f"Model {model} is not in the models folder -> skipped")
+            continue
+        if model in models:
+            logger.error(f"Model {model} is already in the batch -> skipped")
+            continue
+        try:
+            config = FileUtils.read_file(model, context)
+        except FileUtilsError:
+            """handled in utils.file"""
+            continue
+        job_network = (entry.get("network") or config.get("network") or network).upper()
+        if job_network not in NETWORKS:
+            logger.error(f"Unknown network {job_network} for model {model} -> skipped")
+            continue
+        models.add(model)
+        jobs.append(Job(model, job_network, get_job_kind(config), entry.get("priority", 0)))
+    return jobs
+
+
+def get_job_kind(config: dict) -> str:
+    """Call models have `function_name` or `functions`, event models a signature or ABI"""
+    return "call" if "function_name" in config or "functions" in config else "event"
+
+
+class JobScheduler:
+    """
+    Runs jobs (event or call models) concurrently: the highest priority first, with at
+    most `limits[network]` jobs of a network at a time (RUNNER_JOBS_PER_NETWORK by
+    default) and `max_jobs` overall. Jobs of a network share its connection, created
+    on first use with `connect(network)`, on which identical read requests in flight
+    are sent once (see utils.inflight).
+    Job errors are logged by the exporters: a job fails if it logs any error.
+    """
+
+    def __init__(
+        self,
+        jobs: list,
+        connect,
+        limits: dict = None,
+        max_jobs: int = RUNNER_MAX_JOBS,
+        context: str = Context.MAIN.INPUT,
+        cache_folder: str = Context.CACHE,
+    ):
+        # sort is stable: jobs with the same priority keep their order
+        self.pending = sorted(jobs, key=lambda job: -job.priority)
+        self.connect = connect
+        self.limits = limits or {}
+        self.max_jobs = max_jobs
+        self.context = context
+        self.cache_folder = cache_folder
+        self.running = Counter()
+        self.results = {}
+        self.errors = Counter()
+        self.connections = {}
+        self.inflight = {}
+        self._current = {}  # {thread id: running job}
+        self._cond = threading.Condition()
+        self._connect_lock = threading.Lock()
+
+    def run(self) -> dict:
+        """Runs all the jobs, returning {job: True if succeeded}"""
+        handler = _JobErrorHandler(self)
+        logging.getLogger().addHandler(handler)
+        try:
+            workers = max(1, min(self.max_jobs, len(self.pending)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for _ in range(workers):
+                    executor.submit(self._work)
+        finally:
+            logging.getLogger().removeHandler(handler)
+        merged = sum(inflight.stats["merged"] for inflight in self.inflight.values())
+        if merged and self.context == Context.MAIN.INPUT:
+            logger.info(f"{merged} identical requests in flight merged")
+        return {job: self.errors[job] == 0 for job in self.results}
+
+    def get_limit(self, network: str) -> int:
+        return self.limits.get(network, RUNNER_JOBS_PER_NETWORK)
+
+    def _work(self):
+        """Worker loop: runs the next runnable job until none is left"""
+        while (job := self._next_job()) is not None:
+            self._current[threading.get_ident()] = job
+            start = time.monotonic()
+            try:
+                self.results[job] = self._run_job(job, self._get_connection(job.network))
+            except Exception as e:
+                logger.error(f"Job {job.model} ({job.network}) failed: {e}")
+                self.results[job] = None
+            finally:
+                self._current.pop(threading.get_ident(), None)
+                if self.context == Context.MAIN.INPUT:
+                    status = "failed" if self.errors[job] else "done"
+                    logger.info(
+                        f"Job {job.model} ({job.network}) {status} "
+                        f"in {time.monotonic() - start:.1f}s"
+                    )
+                with self._cond:
+                    self.running[job.network] -= 1
+                    self._cond.notify_all()
+
+    def _next_job(self):
+        """
+        Takes the first pending job (by priority) whose network is below its limit,
+        waiting while all the pending jobs are on busy networks
+        """
+        with self._cond:
+            while self.pending:
+                for i, job in enumerate(self.pending):
+                    if self.running[job.network] < self.get_limit(job.network):
+                        self.running[job.network] += 1
+                        return self.pending.pop(i)
+                self._cond.wait()
+            return None
+
+    def _get_connection(self, network: str):
+        """Returns the connection shared by the jobs of a network, created once"""
+        with self._connect_lock:
+            if network not in self.connections:
+                w3 = self.connect(network)
+                self.inflight[network] = InFlightRequests()
+                # innermost layer: responses are shared raw, and formatted per caller
+                w3.middleware_onion.inject(
+                    self.inflight[network].middleware, "inflight", layer=0
+                )
+                self.connections[network] = w3
+            return self.connections[network]
+
+    def _run_job(self, job: Job, w3):
+        """
+        Runs the exporter of the job. In the main context, events & call series are
+        written by the exporters, and other call results into src/data/<model>.json.
+        """
+        # imported on first use, so that the runner starts (and --help shows) fast
+        from exporters.call import CallExporter
+        from exporters.event import EventExporter
+
+        if job.kind == "call":
+            exporter = CallExporter(w3, job.model, self.context, job.network)
+            exporter.cache_folder = self.cache_folder
+            result = exporter.extract_data()
+            if result is not None and self.context == Context.MAIN.INPUT:
+                path = os.path.join(Context.MAIN.OUTPUT, os.path.splitext(job.model)[0])
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(f"{path}.json", "w") as f:
+                    json.dump(result, f, indent=4)
+                logger.info(f"Call result -> {path}.json")
+            return result
+
+        exporter = EventExporter(w3, job.model, self.context, job.network)
+        exporter.cache_folder = self.cache_folder
+        exporter.chunk_sizes = ChunkSizeStore(self.cache_folder)
+        return exporter.extract_data()
+
+
+class _JobErrorHandler(logging.Handler):
+    """Counts the errors logged while running each job (by the thread running it)"""
+
+    def __init__(self, scheduler: JobScheduler):
+        super().__init__(logging.ERROR)
+        self.scheduler = scheduler
+
+    def emit(self, record):
+        job = self.scheduler._current.get(record.thread)
+        if job is not None:
+            self.scheduler.errors[job] += 1
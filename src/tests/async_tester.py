@@ -0,0 +1,144 @@
+"""Offline tests for the asyncio execution mode, against a simulated node provider"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import AsyncWeb3
+from utils.context import Context
+from utils.batch import AsyncBatchTransport
+from web3.providers.async_rpc import AsyncHTTPProvider
+from utils.async_connector import AsyncConnector, ProviderResponseError, SessionHTTPProvider
+from utils.block import BlockUtils, AsyncBlockUtils
+from utils.chunker import ChunkSizeStore
+from exporters.event import EventExporter
+from exporters.async_event import AsyncEventExporter
+from tests.sim_provider import (
+    make_transfer_logs,
+    simulated_w3,
+    simulated_async_w3,
+    RefusingServer,
+    BLOCK_TIME,
+    GENESIS_TS,
+    TRANSFER_TOPIC,
+)
+
+PARAMS = {"fromBlock": 1, "toBlock": 1000, "topics": [TRANSFER_TOPIC]}
+
+
+class AsyncTester(unittest.TestCase):
+    def setUp(self):
+        self.logs = make_transfer_logs(1, 1000, logs_per_block=2)
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def _setup(self, exporter, workers):
+        exporter.workers = workers
+        exporter.use_cache = False
+        exporter.cache_folder = self.cache_dir.name
+        exporter.chunk_sizes = ChunkSizeStore(self.cache_dir.name)
+        return exporter
+
+    def _exporter(self, w3, model="sim_transfers.json", workers=4):
+        return self._setup(AsyncEventExporter(w3, model, Context.TEST_EVENT.INPUT), workers)
+
+    def test_same_logs_as_sync(self):
+        """Concurrent tasks split the range and return the same logs as the threads"""
+        w3 = simulated_w3(self.logs, result_limit=150)
+        expected = self._setup(
+            EventExporter(w3, "sim_transfers.json", Context.TEST_EVENT.INPUT), 4
+        ).get_logs_in_range(PARAMS)
+
+        exporter = self._exporter(simulated_async_w3(self.logs, result_limit=150))
+        logs = asyncio.run(exporter.get_logs_in_range(PARAMS))
+        self.assertEqual(logs, expected)
+
+    def test_concurrent_models(self):
+        """Several models share one connection, with their requests in flight together"""
+        w3 = simulated_async_w3(self.logs, result_limit=150, latency=0.01)
+        models = ["sim_transfers.json", "sim_transfers_dates.json"]
+
+        async def extract():
+            exporters = [self._exporter(w3, model) for model in models]
+            return await asyncio.gather(*(e.extract_data() for e in exporters))
+
+        transfers, dated = [json.loads(events) for events in asyncio.run(extract())]
+        self.assertEqual(len(transfers), 1000 * 2)
+        self.assertEqual((dated[0]["block_num"], dated[-1]["block_num"]), (101, 500))
+        self.assertGreater(w3.provider.max_in_flight, 4)
+
+    def test_block_utils(self):
+        """Concurrent searches find the same blocks as the synchronous ones"""
+        timestamps = [GENESIS_TS + i * 997 for i in range(1, 20)]
+        sync_utils = BlockUtils(simulated_w3([], head=5000), "ETHEREUM", self.cache_dir.name)
+        expected = [sync_utils.get_closest_block_number_by_timestamp(ts) for ts in timestamps]
+
+        w3 = simulated_async_w3([], head=5000, latency=0.01)
+        block_utils = AsyncBlockUtils(w3, "ETHEREUM", self.cache_dir.name)
+
+        async def search():
+            return await asyncio.gather(
+                *(block_utils.get_closest_block_number_by_timestamp(ts) for ts in timestamps)
+            )
+
+        self.assertEqual(asyncio.run(search()), expected)
+        self.assertEqual(expected, [(ts - GENESIS_TS) // BLOCK_TIME for ts in timestamps])
+        bulk = asyncio.run(block_utils.get_closest_block_numbers_by_timestamps(timestamps))
+        self.assertEqual([bulk[ts] for ts in timestamps], expected)
+
+    def test_batch_split(self):
+        """Refused batches are split in halves, and the accepted size is remembered"""
+        w3 = simulated_async_w3([], head=500, batch_limit=25)
+        transport = AsyncBatchTransport(w3)
+        calls = [("eth_getBlockByNumber", [hex(n), False]) for n in range(100)]
+        blocks = asyncio.run(transport.request(calls))
+        self.assertEqual([int(b["number"], 16) for b in blocks], list(range(100)))
+        self.assertEqual(transport.max_batch_size, 25)
+
+    def test_batch_http_errors(self):
+        """Over plain HTTP, only 400/413 split a batch: other errors are raised as is"""
+        calls = [("eth_blockNumber", [])] * 4
+        server = RefusingServer(413)
+        try:
+            transport = AsyncBatchTransport(AsyncWeb3(AsyncHTTPProvider(server.url)))
+            self.assertEqual(asyncio.run(transport.request(calls)), ["0x10"] * 4)
+            self.assertEqual(server.batches, 3)  # 4, then 2 & 2
+        finally:
+            server.close()
+
+        server = RefusingServer(429)
+        try:
+            transport = AsyncBatchTransport(AsyncWeb3(AsyncHTTPProvider(server.url)))
+            with self.assertRaises(ProviderResponseError):
+                asyncio.run(transport.request(calls))
+            self.assertEqual(server.batches, 1)
+        finally:
+            server.close()
+
+    def test_redacted_errors(self):
+        """A request refused by the node logs its HTTP status, but not the provider URL"""
+        server = RefusingServer(429, batches_only=False)
+
+        async def extract():
+            async with AsyncConnector() as connector:
+                w3 = AsyncWeb3(SessionHTTPProvider(server.url, connector.session))
+                return await self._exporter(w3, "sim_transfers_dates.json").extract_data()
+
+        try:
+            with self.assertLogs(level="ERROR") as logs:
+                self.assertIsNone(asyncio.run(extract()))
+        finally:
+            server.close()
+        self.assertTrue(any("HTTP 429" in line for line in logs.output))
+        self.assertFalse(any("secret-key" in line for line in logs.output), logs.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
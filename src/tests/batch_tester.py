@@ -0,0 +1,84 @@
+"""Offline tests for the JSON-RPC batch transport, against a simulated node provider"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import Web3
+from utils.block import BlockUtils
+from utils.batch import BatchTransport
+from requests.exceptions import HTTPError
+from tests.sim_provider import simulated_w3, RefusingServer, GENESIS_TS, BLOCK_TIME
+
+
+class BatchTester(unittest.TestCase):
+    def setUp(self):
+        self.w3 = simulated_w3([], head=5000, batch_limit=30)
+        self.provider = self.w3.provider
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def _get_blocks(self, transport, numbers):
+        return transport.request(
+            [("eth_getBlockByNumber", [hex(number), False]) for number in numbers]
+        )
+
+    def test_batches_in_order(self):
+        """Requests are grouped into batches, and results keep the request order"""
+        transport = BatchTransport(self.w3, max_batch_size=25)
+        blocks = self._get_blocks(transport, range(100))
+        self.assertEqual([int(block["number"], 16) for block in blocks], list(range(100)))
+        self.assertEqual(self.provider.batches, [25, 25, 25, 25])
+
+    def test_refused_batch_is_split(self):
+        """A refused batch is split in halves, and the accepted size is remembered"""
+        transport = BatchTransport(self.w3, max_batch_size=100)
+        blocks = self._get_blocks(transport, range(100))
+        self.assertEqual(len(blocks), 100)
+        self.assertEqual(transport.max_batch_size, 25)
+        self.provider.batches.clear()
+        self._get_blocks(transport, range(50))
+        self.assertEqual(self.provider.batches, [25, 25])
+
+    def test_node_error(self):
+        """Errors of single requests are raised"""
+        with self.assertRaises(ValueError):
+            BatchTransport(self.w3).request([("eth_chainId", [])])
+
+    def test_block_utils(self):
+        """Block search reads the chain bounds in one batch and probes through the cache"""
+        ts = GENESIS_TS + 1234 * BLOCK_TIME + 5
+        block_utils = BlockUtils(self.w3, "ETHEREUM", self.cache_dir.name)
+        self.assertEqual(block_utils.get_closest_block_number_by_timestamp(ts), 1234)
+        # chain bounds, then the estimated block & the next one
+        self.assertEqual(self.provider.batches, [2, 2])
+
+    def test_http_errors(self):
+        """Over plain HTTP, only 400/413 split a batch: other errors are raised as is"""
+        calls = [("eth_blockNumber", [])] * 4
+        server = RefusingServer(413)
+        try:
+            transport = BatchTransport(Web3(Web3.HTTPProvider(server.url)))
+            # split down to single requests, which the server answers
+            self.assertEqual(transport.request(calls), ["0x10"] * 4)
+            self.assertEqual(server.batches, 3)  # 4, then 2 & 2
+        finally:
+            server.close()
+
+        server = RefusingServer(429)
+        try:
+            transport = BatchTransport(Web3(Web3.HTTPProvider(server.url)))
+            with self.assertRaises(HTTPError):
+                transport.request(calls)
+            self.assertEqual(server.batches, 1)
+        finally:
+            server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+"""Checks of the offline benchmarks: fixtures, and deterministic metrics vs the baseline"""
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import Web3
+from utils.context import Context
+from exporters.follow import EventFollower
+from parsers.event_func_args_list import EventFuncArgsList
+from parsers.event_func_args_parser import EventFuncArgsParser
+from tests.benchmarks import compare, read_baseline, read_fixtures, run_benchmarks
+
+
+class BenchmarkTester(unittest.TestCase):
+    def test_stored_fixture(self):
+        """The stored ModuleAdded log decodes as in the readme example"""
+        signature, decimals, logs = read_fixtures()["module_added"]
+        w3 = Web3()
+        parsed_args = EventFuncArgsList(w3, Context.TEST_EVENT.INPUT).get_function_args_list(
+            signature
+        )
+        plan = EventFuncArgsParser(w3, Context.TEST_EVENT.INPUT).compile_plan(
+            parsed_args, {"decimals": decimals}
+        )
+        (row,) = plan.decode_batch([EventFollower.format_raw_log(log) for log in logs])
+        self.assertEqual(row["block_num"], 17677591)
+        self.assertEqual(row["_types"], [2, 6])
+        self.assertEqual(row["_module"], "0xfd326f612997251c736f781b38392fc86aa8243a")
+        self.assertEqual(row["_budget"], 0.0)
+
+    def test_compare(self):
+        """Throughputs regress below the tolerance, counts as soon as they grow"""
+        baseline = {"a": {"logs_per_second": 1000, "calls": 10}, "b": {"calls": 5}}
+        results = {"a": {"logs_per_second": 800, "calls": 10}, "b": {"calls": 6}, "c": {}}
+        self.assertEqual(compare(results, baseline), [("b", "calls", 5, 6)])
+        self.assertEqual(
+            compare(results, baseline, tolerance=0.1),
+            [("a", "logs_per_second", 1000, 800), ("b", "calls", 5, 6)],
+        )
+
+    def test_deterministic_metrics(self):
+        """eth_getLogs calls, range splits and block search probes don't exceed the baseline"""
+        results = run_benchmarks(["range_split", "block_lookup"])
+        baseline = read_baseline()
+        self.assertTrue(all(case in baseline for case in results))
+        # throughputs depend on the machine: only checked by `python -m tests.benchmarks`
+        self.assertEqual(compare(results, baseline, tolerance=1), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
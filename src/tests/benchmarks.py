@@ -0,0 +1,385 @@
+"""
+Offline benchmarks of the extraction, on synthetic logs, stored log fixtures and the
+simulated node provider (no live node needed). From src:
+
+    python -m tests.benchmarks                  # runs all & compares with the baseline
+    python -m tests.benchmarks decode export    # runs some benchmarks only
+    python -m tests.benchmarks --save           # stores the results as the new baseline
+
+Benchmarks:
+- decode: EventFuncArgsParser decoding plans on dense fixed-layout logs (transfers),
+  dynamic arrays, strings & bytes, and the stored fixtures (tests/data/benchmarks)
+- range_split: get_logs_in_range() over dense and sparse ranges, against a
+  simulated result limit (eth_getLogs calls & range splits)
+- export: FileUtils.json_to_csv() and the streaming CSV writer
+- block_lookup: probes of the BlockUtils timestamp to block search (constant block
+  time, block time change, block time index and bulk lookups)
+
+Metrics ending in `_per_second` are throughputs: a drop of more than TOLERANCE vs
+the baseline is a regression. As they depend on the machine, the baseline should be
+saved on the same machine before comparing a change. The other metrics (calls,
+splits, probes) are deterministic and must not grow.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import Web3
+from eth_abi import encode
+from utils.file import FileUtils
+from utils.block import BlockUtils
+from utils.context import Context
+from utils.writers import get_writer
+from utils.chunker import ChunkSizeStore
+from exporters.event import EventExporter
+from exporters.follow import EventFollower
+from parsers.event_func_args_list import EventFuncArgsList
+from parsers.event_func_args_parser import EventFuncArgsParser
+from tests.sim_provider import (
+    CONTRACT_ADDR,
+    GENESIS_TS,
+    TRANSFER_SIG,
+    SimulatedProvider,
+    make_transfer_logs,
+    simulated_w3,
+    to_topic,
+)
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "benchmarks")
+FIXTURES_FOLDER = os.path.join(DATA_FOLDER, "fixtures")
+BASELINE_FILE = os.path.join(DATA_FOLDER, "baseline.json")
+TOLERANCE = 0.25  # Max throughput drop vs the baseline before reporting a regression
+REPEATS = 3  # Runs of each timed benchmark (the best one is kept)
+
+DECODE_LOGS = 10_000  # Logs decoded per event type
+EXPORT_ROWS = 20_000  # Rows exported to CSV
+ARRAYS_SIG = (
+    "PoolBalanceChanged (index_topic_1 bytes32 poolId, index_topic_2 address "
+    "liquidityProvider, address[] tokens, int256[] deltas, uint256[] protocolFeeAmounts)"
+)
+STRINGS_SIG = (
+    "LogicContractSet (string _version, uint256 _upgrade, address _logicContract, "
+    "bytes _upgradeData)"
+)
+
+
+def make_raw_log(block: int, index: int, topics: list, types: list, values: list) -> dict:
+    """Returns a raw (JSON-RPC formatted) log of the benchmark contract"""
+    return {
+        "address": Web3.to_checksum_address(CONTRACT_ADDR),
+        "topics": topics,
+        "data": "0x" + encode(types, values).hex(),
+        "blockNumber": hex(block),
+        "blockHash": "0x" + f"{block:064x}",
+        "transactionHash": "0x" + f"{block:056x}{index:08x}",
+        "transactionIndex": hex(index),
+        "logIndex": hex(index),
+        "removed": False,
+    }
+
+
+def make_array_logs(num_logs: int) -> list:
+    """PoolBalanceChanged logs, with arrays of 2 to 4 tokens"""
+    rng = random.Random(1)
+    logs = []
+    for i in range(num_logs):
+        size = 2 + i % 3
+        tokens = [f"0x{rng.getrandbits(160):040x}" for _ in range(size)]
+        deltas = [rng.randrange(-(10**24), 10**24) for _ in range(size)]
+        fees = [rng.randrange(10**18) for _ in range(size)]
+        logs.append(
+            make_raw_log(
+                i + 1,
+                0,
+                ["0x" + "00" * 32, "0x" + f"{i:064x}", to_topic(tokens[0])],
+                ["address[]", "int256[]", "uint256[]"],
+                [tokens, deltas, fees],
+            )
+        )
+    return logs
+
+
+def make_string_logs(num_logs: int) -> list:
+    """LogicContractSet logs, with strings and bytes of several lengths"""
+    rng = random.Random(2)
+    logs = []
+    for i in range(num_logs):
+        version = f"v{i % 10}.{i % 7}.{i}" + "-rc" * (i % 4)
+        upgrade_data = rng.randbytes(4 + (i % 5) * 32)
+        logs.append(
+            make_raw_log(
+                i + 1,
+                0,
+                ["0x" + "00" * 32],
+                ["string", "uint256", "address", "bytes"],
+                [version, i, CONTRACT_ADDR, upgrade_data],
+            )
+        )
+    return logs
+
+
+def read_fixtures() -> dict:
+    """
+    Returns the stored fixtures: {name: (event signature, decimals, raw logs)}, one per
+    JSON file in tests/data/benchmarks/fixtures (e.g.: logs saved from eth_getLogs)
+    """
+    fixtures = {}
+    for file_name in sorted(os.listdir(FIXTURES_FOLDER)):
+        if file_name.endswith(".json"):
+            with open(os.path.join(FIXTURES_FOLDER, file_name), "r") as f:
+                fixture = json.load(f)
+            fixtures[os.path.splitext(file_name)[0]] = (
+                fixture["function_sig"],
+                fixture.get("decimals", {}),
+                fixture["logs"],
+            )
+    return fixtures
+
+
+def best_time(function, repeats: int = REPEATS) -> float:
+    """Returns the best duration (seconds) of several runs of a function"""
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def bench_decode() -> dict:
+    w3 = Web3()
+    parser = EventFuncArgsParser(w3, Context.TEST_EVENT.INPUT)
+    args_list = EventFuncArgsList(w3, Context.TEST_EVENT.INPUT)
+    cases = {
+        "transfers": (TRANSFER_SIG, {"wad": 18}, make_transfer_logs(1, DECODE_LOGS)),
+        "dynamic_arrays": (
+            ARRAYS_SIG,
+            {"deltas": 18, "protocolFeeAmounts": 18},
+            make_array_logs(DECODE_LOGS),
+        ),
+        "strings": (STRINGS_SIG, {"_upgrade": 0}, make_string_logs(DECODE_LOGS)),
+    }
+    for name, (signature, decimals, logs) in read_fixtures().items():
+        # stored fixtures are repeated up to the same number of logs
+        repeated = logs * (DECODE_LOGS // len(logs) + 1)
+        cases[name] = (signature, decimals, repeated[:DECODE_LOGS])
+
+    results = {}
+    for name, (signature, decimals, raw_logs) in cases.items():
+        logs = [EventFollower.format_raw_log(log) for log in raw_logs]
+        plan = parser.compile_plan(
+            args_list.get_function_args_list(signature), {"decimals": decimals}
+        )
+        seconds = best_time(lambda: plan.decode_batch(logs))
+        results[f"decode.{name}"] = {"logs_per_second": round(len(logs) / seconds)}
+    return results
+
+
+def bench_range_split() -> dict:
+    sparse_logs = [
+        log for block in range(1, 2_000_000, 1_000) for log in make_transfer_logs(block, block)
+    ]
+    cases = {
+        # 5 logs per block: chunks shrink to the result limit
+        "dense": (make_transfer_logs(1, 4_000, logs_per_block=5), 4_000),
+        # a log every 1000 blocks: chunks grow
+        "sparse": (sparse_logs, 2_000_000),
+    }
+    results = {}
+    for name, (logs, to_block) in cases.items():
+        params = {"fromBlock": 1, "toBlock": to_block}
+        with tempfile.TemporaryDirectory() as cache_dir:
+            w3 = simulated_w3(logs, result_limit=1_000)
+            exporter = EventExporter(w3, "sim_transfers.json", Context.TEST_EVENT.INPUT)
+            exporter.workers = 1  # calls & splits don't depend on thread timing
+            exporter.use_cache = False
+            exporter.cache_folder = cache_dir
+            exporter.chunk_sizes = ChunkSizeStore(cache_dir)
+            start = time.perf_counter()
+            fetched = exporter.get_logs_in_range(params)
+            seconds = time.perf_counter() - start
+        assert len(fetched) == len(logs), f"{name}: {len(fetched)} logs of {len(logs)}"
+        results[f"range_split.{name}"] = {
+            "calls": len(w3.provider.calls),
+            "range_splits": exporter.metrics.counters["range_splits"],
+            "logs_per_second": round(len(logs) / seconds),
+        }
+    return results
+
+
+def bench_export() -> dict:
+    w3 = Web3()
+    parsed_args = EventFuncArgsList(w3, Context.TEST_EVENT.INPUT).get_function_args_list(
+        TRANSFER_SIG
+    )
+    plan = EventFuncArgsParser(w3, Context.TEST_EVENT.INPUT).compile_plan(
+        parsed_args, {"decimals": {"wad": 18}}
+    )
+    rows = plan.decode_batch(
+        [EventFollower.format_raw_log(log) for log in make_transfer_logs(1, EXPORT_ROWS)]
+    )
+
+    def write_stream(folder):
+        writer = get_writer("bench_stream.json", folder, columns=plan.columns).open()
+        for i in range(0, len(rows), 1_000):  # chunk by chunk, as in the extraction
+            writer.write_rows(rows[i : i + 1_000])
+        writer.close()
+
+    with tempfile.TemporaryDirectory() as folder:
+        json_to_csv = best_time(lambda: FileUtils.json_to_csv(rows, "bench.json", folder))
+        stream = best_time(lambda: write_stream(folder))
+    return {
+        "export.json_to_csv": {"rows_per_second": round(len(rows) / json_to_csv)},
+        "export.csv_writer": {"rows_per_second": round(len(rows) / stream)},
+    }
+
+
+def bench_block_lookup() -> dict:
+    head = 2_000_000
+    cases = {
+        "constant_block_time": {"head": head},
+        "block_time_change": {"head": head, "slowdown_at": head // 2},
+        "block_time_index": {"head": head, "slowdown_at": 1_234_567},
+    }
+    results = {}
+    for name, provider_kwargs in cases.items():
+        with tempfile.TemporaryDirectory() as cache_dir:
+            provider, block_utils = _get_block_utils(name, provider_kwargs, cache_dir)
+            last_ts = provider.get_timestamp(provider.head)
+            timestamps = random.Random(3).sample(range(GENESIS_TS, last_ts), 100)
+
+            round_trips = []
+            headers = 0
+            for timestamp in timestamps:
+                provider.batches.clear()
+                provider.methods.clear()
+                block_utils.get_closest_block_number_by_timestamp(timestamp)
+                round_trips.append(len(provider.batches))
+                headers += provider.methods["eth_getBlockByNumber"]
+
+        # bulk lookups reuse the blocks probed for the previous timestamps
+        with tempfile.TemporaryDirectory() as cache_dir:
+            provider, block_utils = _get_block_utils(name, provider_kwargs, cache_dir)
+            block_utils.get_closest_block_numbers_by_timestamps(timestamps)
+            bulk_headers = provider.methods["eth_getBlockByNumber"]
+
+        results[f"block_lookup.{name}"] = {
+            "round_trips_per_lookup": round(sum(round_trips) / len(round_trips), 2),
+            "max_round_trips": max(round_trips),
+            "headers_per_lookup": round(headers / len(timestamps), 2),
+            "bulk_headers_per_lookup": round(bulk_headers / len(timestamps), 2),
+        }
+    return results
+
+
+def _get_block_utils(name: str, provider_kwargs: dict, cache_dir: str):
+    """Returns a simulated provider and its BlockUtils, with a block time index if needed"""
+    provider = SimulatedProvider([], **provider_kwargs)
+    block_utils = BlockUtils(Web3(provider), "ETHEREUM", cache_dir)
+    block_utils.finalized_block = provider.head
+    if name == "block_time_index":
+        block_utils.update_index()
+    provider.methods.clear()
+    return provider, block_utils
+
+
+BENCHMARKS = {
+    "decode": bench_decode,
+    "range_split": bench_range_split,
+    "export": bench_export,
+    "block_lookup": bench_block_lookup,
+}
+
+
+def run_benchmarks(names: list = None) -> dict:
+    """Runs the given benchmarks (all by default), returning {case: {metric: value}}"""
+    results = {}
+    for name in names or BENCHMARKS:
+        results.update(BENCHMARKS[name]())
+    return results
+
+
+def read_baseline() -> dict:
+    if not os.path.isfile(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, "r") as f:
+        return json.load(f)
+
+
+def save_baseline(results: dict):
+    """Merges the results into the stored baseline"""
+    baseline = {**read_baseline(), **results}
+    with open(BASELINE_FILE, "w") as f:
+        json.dump(dict(sorted(baseline.items())), f, indent=4)
+
+
+def compare(results: dict, baseline: dict, tolerance: float = TOLERANCE) -> list:
+    """
+    Returns the regressions vs the baseline, as (case, metric, baseline, value):
+    throughputs below the tolerance, or deterministic counts above the baseline
+    """
+    regressions = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            expected = baseline.get(case, {}).get(metric)
+            if expected is None:
+                continue
+            if metric.endswith("_per_second"):
+                regressed = value < expected * (1 - tolerance)
+            else:
+                regressed = value > expected
+            if regressed:
+                regressions.append((case, metric, expected, value))
+    return regressions
+
+
+def print_results(results: dict, baseline: dict):
+    print(f"{'case':<36}{'metric':<26}{'baseline':>12}{'value':>12}{'change':>9}")
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            expected = baseline.get(case, {}).get(metric)
+            change = f"{(value - expected) / expected:+.0%}" if expected else ""
+            expected = "-" if expected is None else expected
+            print(f"{case:<36}{metric:<26}{expected:>12}{value:>12}{change:>9}")
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(description="Runs the offline benchmarks")
+    parser.add_argument(
+        "benchmarks", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)"
+    )
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help=f"max throughput drop vs the baseline (default: {TOLERANCE})",
+    )
+    args = parser.parse_args(args)
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    results = run_benchmarks(args.benchmarks)
+    baseline = read_baseline()
+    print_results(results, baseline)
+    if args.save:
+        save_baseline(results)
+        print(f"Baseline saved into {os.path.relpath(BASELINE_FILE)}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for case, metric, expected, value in regressions:
+        print(f"Regression: {case} {metric} {value} (baseline: {expected})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
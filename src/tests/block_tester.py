@@ -0,0 +1,169 @@
+"""Offline tests for the timestamp to block number search"""
+
+import os
+import sys
+import random
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import Web3
+from utils.block import BlockUtils
+from utils.context import Context
+from exporters.block import BlockExporter
+from utils.block_index import BlockTimeIndex
+from tests.sim_provider import SimulatedProvider, GENESIS_TS
+
+HEAD = 20_000_000
+
+
+class BlockTester(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def _block_utils(self, **provider_kwargs):
+        provider = SimulatedProvider([], **provider_kwargs)
+        block_utils = BlockUtils(Web3(provider), "ETHEREUM", self.cache_dir.name)
+        block_utils.finalized_block = provider.head
+        return block_utils, provider
+
+    def _expected(self, provider, timestamp):
+        """Last block before or at the timestamp, by bisection on the simulated clock"""
+        lower, upper = 0, provider.head
+        while lower < upper:
+            mid = (lower + upper + 1) // 2
+            if provider.get_timestamp(mid) <= timestamp:
+                lower = mid
+            else:
+                upper = mid - 1
+        return lower
+
+    def test_constant_block_time(self):
+        """Interpolation finds the block in a couple of probes"""
+        block_utils, provider = self._block_utils(head=HEAD)
+        for timestamp in random.Random(1).sample(range(GENESIS_TS, GENESIS_TS + HEAD * 12), 50):
+            provider.methods.clear()
+            block = block_utils.get_closest_block_number_by_timestamp(timestamp)
+            self.assertEqual(block, self._expected(provider, timestamp))
+            # 2 chain bounds + a single probe of the block & the next one
+            self.assertEqual(provider.methods["eth_getBlockByNumber"], 4)
+            self.assertEqual(provider.batches[-2:], [2, 2])
+
+    def test_block_time_change(self):
+        """Blocks 3 times slower after a fork still converge, well below bisection's 25"""
+        block_utils, provider = self._block_utils(head=HEAD // 2, slowdown_at=HEAD // 4)
+        rng = random.Random(2)
+        probes = []
+        for _ in range(50):
+            timestamp = rng.randrange(GENESIS_TS, provider.get_timestamp(provider.head) + 1)
+            provider.methods.clear()
+            block = block_utils.get_closest_block_number_by_timestamp(timestamp)
+            self.assertEqual(block, self._expected(provider, timestamp))
+            probes.append(len(provider.batches))
+            provider.batches.clear()
+        # chain bounds + probes (pairs of blocks), where bisection takes ~25 requests
+        self.assertLessEqual(max(probes), 10)
+
+    def test_block_time_index(self):
+        """Lookups start between index samples: a single probe, even across a fork"""
+        block_utils, provider = self._block_utils(head=2_000_000, slowdown_at=1_234_567)
+        self.assertEqual(block_utils.update_index(), 2001)
+        self.assertEqual(block_utils.index.last_block, 2_000_000)
+
+        rng = random.Random(3)
+        for _ in range(50):
+            timestamp = rng.randrange(GENESIS_TS, provider.get_timestamp(provider.head))
+            provider.methods.clear()
+            block = block_utils.get_closest_block_number_by_timestamp(timestamp)
+            self.assertEqual(block, self._expected(provider, timestamp))
+            self.assertLessEqual(provider.methods["eth_getBlockByNumber"], 4)
+
+    def test_incremental_index(self):
+        """The index is extended up to the new finalized block, and reloaded from disk"""
+        block_utils, provider = self._block_utils(head=50_000, finalized=20_500)
+        self.assertEqual(block_utils.update_index(), 21)
+        provider.finalized = 45_000
+        provider.methods.clear()
+        self.assertEqual(block_utils.update_index(), 25)
+        # the finalized block, then samples 21,000 to 45,000
+        self.assertEqual(provider.methods["eth_getBlockByNumber"], 1 + 25)
+
+        index = BlockTimeIndex("ETHEREUM", self.cache_dir.name)
+        self.assertEqual(len(index), 46)
+        self.assertEqual(index.get_bounds(provider.get_timestamp(30_500)), [
+            (30_000, provider.get_timestamp(30_000)),
+            (31_000, provider.get_timestamp(31_000)),
+        ])
+        self.assertIsNone(index.get_bounds(provider.get_timestamp(45_000)))
+
+    def test_bulk_sweep(self):
+        """Sorted timestamps reuse the bounds found so far: far fewer probes than lookups"""
+        block_utils, provider = self._block_utils(head=HEAD // 2, slowdown_at=HEAD // 4)
+        timestamps = list(range(GENESIS_TS, provider.get_timestamp(provider.head), 86400 * 7))
+        random.Random(4).shuffle(timestamps)
+        blocks = block_utils.get_closest_block_numbers_by_timestamps(timestamps)
+
+        self.assertEqual(blocks, {ts: self._expected(provider, ts) for ts in timestamps})
+        # a single lookup takes ~4-8 headers
+        self.assertLess(provider.methods["eth_getBlockByNumber"], 3 * len(timestamps))
+
+    def test_bulk_networks(self):
+        """
+        Networks are converted into a column each; dates before a genesis, or after
+        the latest block of a network get None
+        """
+        w3_instances = {}
+        for network, slowdown_at in [("ETHEREUM", None), ("OPTIMISM", 5_000_000)]:
+            w3_instances[network] = Web3(
+                SimulatedProvider([], head=HEAD, slowdown_at=slowdown_at)
+            )
+        exporter = BlockExporter(
+            w3_instances,
+            [
+                "20230101 00:00:00",
+                "1577836800",
+                "20220101 00:00:00",
+                "20230101 00:00:00",
+                "20240101 00:00:00",  # after the latest ETHEREUM block
+                "20991231 00:00:00",  # after now
+            ],
+            Context.TEST_CALL.INPUT,
+        )
+        exporter.cache_folder = self.cache_dir.name
+        rows = exporter.extract_data()
+
+        self.assertEqual(
+            [row["date"][:10] for row in rows],
+            ["2020-01-01", "2022-01-01", "2023-01-01", "2024-01-01", "2099-12-31"],
+        )
+        self.assertEqual(rows[0]["input"], "1577836800")
+        self.assertIsNone(rows[0]["OPTIMISM"])
+        self.assertIsNotNone(rows[2]["ETHEREUM"])
+        self.assertIsNone(rows[3]["ETHEREUM"])
+        self.assertIsNotNone(rows[3]["OPTIMISM"])
+        self.assertEqual([rows[4]["ETHEREUM"], rows[4]["OPTIMISM"]], [None, None])
+        for row in rows:
+            for network, w3 in w3_instances.items():
+                if row[network] is not None:
+                    self.assertEqual(row[network], self._expected(w3.provider, row["timestamp"]))
+
+    def test_bounds_and_cached_probes(self):
+        """Chain bounds are returned as is, and a repeated lookup only reads the bounds"""
+        block_utils, provider = self._block_utils(head=HEAD)
+        self.assertEqual(block_utils.get_closest_block_number_by_timestamp(GENESIS_TS), 0)
+        latest_ts = provider.get_timestamp(provider.head)
+        self.assertEqual(block_utils.get_closest_block_number_by_timestamp(latest_ts), HEAD)
+
+        timestamp = GENESIS_TS + 12_345_678 * 12 + 7
+        block_utils.get_closest_block_number_by_timestamp(timestamp)
+        provider.methods.clear()
+        self.assertEqual(block_utils.get_closest_block_number_by_timestamp(timestamp), 12_345_678)
+        self.assertEqual(provider.methods["eth_getBlockByNumber"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
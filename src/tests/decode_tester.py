@@ -0,0 +1,133 @@
+"""Offline tests for the compiled event decoding plans, on synthetic logs"""
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import Web3
+from eth_abi import encode
+from hexbytes import HexBytes
+from utils.context import Context
+from parsers.event_func_args_list import EventFuncArgsList
+from parsers.event_func_args_parser import EventFuncArgsParser
+
+TXN_HASH = "0x" + "ab" * 32
+ADDR = "0x5fafcfc0afd80d2f95133170172b045024ca8fd1"
+
+
+def make_log(topics, types, values):
+    return {
+        "transactionHash": HexBytes(TXN_HASH),
+        "blockNumber": 1,
+        "topics": [HexBytes(b"\x00" * 32)] + [HexBytes(topic) for topic in topics],
+        "data": HexBytes(encode(types, values)),
+    }
+
+
+class DecodeTester(unittest.TestCase):
+    def setUp(self):
+        self.w3 = Web3()
+        self.parser = EventFuncArgsParser(self.w3, Context.TEST_EVENT.INPUT)
+
+    def _decode(self, signature, decimals, log):
+        parsed_args = EventFuncArgsList(
+            self.w3, Context.TEST_EVENT.INPUT
+        ).get_function_args_list(signature)
+        plan = self.parser.compile_plan(parsed_args, {"decimals": decimals})
+        return plan.decode(log)
+
+    def test_indexed_bytes32_and_dynamic_array(self):
+        """Indexed bytes32 and address, uint8[] and bytes32 without 0x, bool"""
+        name = bytes.fromhex("47656e6572616c5472616e736665724d616e61676572").ljust(32, b"\0")
+        log = make_log(
+            [name, encode(["address"], [ADDR])],
+            ["uint8[]", "address", "uint256", "uint256", "bytes32", "bool"],
+            [[2, 6], ADDR, 0, 0, b"\0" * 32, False],
+        )
+        row = self._decode(
+            "ModuleAdded (uint8[] _types, index_topic_1 bytes32 _name, "
+            "index_topic_2 address _moduleFactory, address _module, uint256 _moduleCost, "
+            "uint256 _budget, bytes32 _label, bool _archived)",
+            {"_types": 0, "_moduleCost": 0, "_budget": 18},
+            log,
+        )
+        self.assertEqual(
+            row,
+            {
+                "txn_hash": TXN_HASH,
+                "block_num": 1,
+                "_name": name.hex(),
+                "_moduleFactory": ADDR,
+                "_types": [2, 6],
+                "_module": ADDR,
+                "_moduleCost": 0,
+                "_budget": 0.0,
+                "_label": "00" * 32,
+                "_archived": False,
+            },
+        )
+
+    def test_fixed_array_multi_decimals(self):
+        """Fixed-size arrays take the decimals of each item"""
+        log = make_log(
+            [],
+            ["uint256[3]", "int256"],
+            [[698 * 10**18, 5 * 10**6, 0], -12 * 10**17],
+        )
+        row = self._decode(
+            "Withdrawal (uint256[3] tokenAmounts, int256 delta)",
+            {"tokenAmounts": [18, 6, 6], "delta": 18},
+            log,
+        )
+        self.assertEqual(row["tokenAmounts"], [698.0, 5.0, 0.0])
+        self.assertEqual(row["delta"], -1.2)
+
+    def test_dynamic_string_and_bytes(self):
+        """Strings are utf-8 decoded, dynamic bytes are 0x-prefixed"""
+        log = make_log(
+            [],
+            ["string", "uint256", "address", "bytes"],
+            ["3.0.1", 1, ADDR, bytes.fromhex("1613ec9d")],
+        )
+        row = self._decode(
+            "LogicContractSet (string _version, uint256 _upgrade, "
+            "address _logicContract, bytes _upgradeData)",
+            {"_version": None, "_upgrade": 0, "_logicContract": None},
+            log,
+        )
+        self.assertEqual(row["_version"], "3.0.1")
+        self.assertEqual(row["_upgrade"], 1)
+        self.assertEqual(row["_logicContract"], ADDR)
+        self.assertEqual(row["_upgradeData"], "0x1613ec9d")
+
+    def test_batch_matches_scalar_path(self):
+        """Vectorised batch decoding returns the same rows as the per-log path"""
+        rng = random.Random(7)
+        logs = []
+        for _ in range(500):
+            amount = rng.choice([rng.randrange(2**53), rng.randrange(2**256)])
+            delta = rng.randrange(-(2**60), 2**60) * rng.choice([1, 2**100])
+            logs.append(
+                make_log(
+                    [encode(["address"], [ADDR]), encode(["int24"], [-rng.randrange(2**23)])],
+                    ["uint256", "int256", "bytes4", "bool", "uint8"],
+                    [amount, delta, b"\x12\x34\x56\x78", rng.random() < 0.5, 6],
+                )
+            )
+        parsed_args = EventFuncArgsList(
+            self.w3, Context.TEST_EVENT.INPUT
+        ).get_function_args_list(
+            "Swap (index_topic_1 address sender, index_topic_2 int24 tick, uint256 amount, "
+            "int256 delta, bytes4 selector, bool flag, uint8 decimals)"
+        )
+        for decimals in ({"amount": 18, "delta": 6}, {"amount": 0, "delta": 30}):
+            plan = self.parser.compile_plan(parsed_args, {"decimals": decimals})
+            self.assertTrue(plan.batch_decoder.enabled)
+            self.assertEqual(plan.decode_batch(logs), [plan.decode(log) for log in logs])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+"""Offline tests for the follow mode, against a simulated node and a local websocket"""
+
+import os
+import sys
+import json
+import tempfile
+import threading
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.context import Context
+from utils.chunker import ChunkSizeStore
+from exporters.follow import EventFollower
+from web3 import Web3
+from websockets.sync.server import serve
+from websockets.exceptions import ConnectionClosed
+from tests.sim_provider import make_transfer_logs, simulated_w3, SimulatedProvider
+
+MODEL = "sim_transfers.json"
+
+
+def reorged(log, salt=1):
+    """Returns the same log in a different block (hash) of the same height"""
+    return {**log, "blockHash": "0x" + f"{salt:02x}" + log["blockHash"][4:]}
+
+
+class ReorgProvider(SimulatedProvider):
+    """
+    Mines block 101 on the first poll of the head after the backfill, and reorgs it on
+    the next one: while mining block 102, or at the same height (`same_height`)
+    """
+
+    def __init__(self, logs, same_height=False):
+        super().__init__(logs, head=100)
+        self.same_height = same_height
+        self.polls = 0
+
+    def make_request(self, method, params):
+        if method == "eth_getBlockByNumber" and params[0] == "latest" and self.calls:
+            self.polls += 1
+            if self.polls == 1:
+                self.logs.extend(make_transfer_logs(101, 101))
+                self.head = 101
+            elif self.polls == 2:
+                self.logs[-1] = reorged(self.logs[-1])
+                if not self.same_height:
+                    self.logs.extend(make_transfer_logs(102, 102))
+                    self.head = 102
+            elif self.polls > 10:
+                raise KeyboardInterrupt  # stops following: nothing else is mined
+        return super().make_request(method, params)
+
+    def _get_block(self, block_id):
+        block = super()._get_block(block_id)
+        if block is not None and block["number"] == hex(101) and self.polls >= 2:
+            block = {**block, "hash": "0x01" + block["hash"][4:]}
+        return block
+
+
+class FollowTester(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def _follower(self, w3, ws_url=None):
+        follower = EventFollower(w3, MODEL, Context.TEST_EVENT.INPUT, ws_url=ws_url)
+        follower.use_cache = False
+        follower.poll_interval = 0
+        follower.chunk_sizes = ChunkSizeStore(self.cache_dir.name)
+        return follower
+
+    def test_polling_reorg(self):
+        """Polling emits new logs, and retracts logs dropped by a reorg"""
+        follower = self._follower(Web3(ReorgProvider(make_transfer_logs(1, 100))))
+        follower.follow(max_events=4)
+
+        live = follower.events[100:]
+        self.assertEqual([row["block_num"] for row in live], [101, 101, 101, 102])
+        self.assertEqual([row["removed"] for row in live], [False, True, False, False])
+
+    def test_polling_reorg_same_height(self):
+        """A reorg of the tip is detected by its hash, even if the head doesn't rise"""
+        provider = ReorgProvider(make_transfer_logs(1, 100), same_height=True)
+        follower = self._follower(Web3(provider))
+        follower.follow(max_events=3)
+
+        live = follower.events[100:]
+        self.assertEqual([row["block_num"] for row in live], [101, 101, 101])
+        self.assertEqual([row["removed"] for row in live], [False, True, False])
+        self.assertEqual(provider.polls, 2)
+
+    def test_websocket_subscription(self):
+        """
+        Logs notified by the websocket are emitted, removed logs are retracted, and
+        other messages are skipped
+        """
+        new_log = make_transfer_logs(101, 101)[0]
+        notifications = [
+            new_log,
+            {**new_log, "removed": True},
+            reorged(new_log),
+        ]
+
+        def handler(ws):
+            request = json.loads(ws.recv())
+            self.assertEqual(request["method"], "eth_subscribe")
+            ws.send(json.dumps({"jsonrpc": "2.0", "id": 1, "result": "0x1"}))
+            # a message that isn't a notification is skipped
+            error = {"code": -32000, "message": "subscription lagging"}
+            ws.send(json.dumps({"jsonrpc": "2.0", "id": None, "error": error}))
+            for log in notifications:
+                message = {"subscription": "0x1", "result": log}
+                ws.send(json.dumps({"method": "eth_subscription", "params": message}))
+            try:
+                ws.recv()  # wait until the client closes the connection
+            except ConnectionClosed:
+                pass
+
+        with serve(handler, "localhost", 0) as server:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            port = server.socket.getsockname()[1]
+            w3 = simulated_w3(make_transfer_logs(1, 100))
+            follower = self._follower(w3, ws_url=f"ws://localhost:{port}")
+            follower.follow(max_events=3)
+            server.shutdown()
+
+        self.assertEqual(len(follower.events), 103)
+        live = follower.events[100:]
+        self.assertEqual([row["removed"] for row in live], [False, True, False])
+        self.assertEqual(live[0]["src"], "0x" + f"{101:040x}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""Tests for the process-wide queue logging & the rate-limited progress messages"""
+
+import os
+import sys
+import logging
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import logger as log_utils
+from utils.logger import setup_logger, set_quiet, ProgressLogger
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class LoggerTester(unittest.TestCase):
+    def setUp(self):
+        self.logger = setup_logger("tests.logger_tester")
+        self.handler = RecordingHandler()
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        set_quiet(False)
+
+    def test_single_queue_handler(self):
+        """Loggers share one queue handler, added once however many times they're set up"""
+        setup_logger("tests.logger_tester")
+        other = setup_logger("tests.other")
+        queue_handlers = [
+            h for h in self.logger.handlers if isinstance(h, logging.handlers.QueueHandler)
+        ]
+        self.assertEqual(len(queue_handlers), 1)
+        self.assertIs(other.handlers[0], queue_handlers[0])
+
+    def test_progress_rate_limit(self):
+        """Progress messages within the interval are dropped"""
+        progress = ProgressLogger(self.logger, interval=60)
+        for block in range(100):
+            progress.info("Processed events up to block %s", block)
+        self.assertEqual(self.handler.messages, ["Processed events up to block 0"])
+
+    def test_quiet_mode(self):
+        """Quiet mode drops progress messages and hides info messages on the console"""
+        set_quiet()
+        ProgressLogger(self.logger, interval=0).info("Processed")
+        self.assertEqual(self.handler.messages, [])
+        self.assertEqual(log_utils._console_handler.level, logging.WARNING)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Offline tests for the run metrics of the extractions, over a simulated node pool"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import Web3
+from utils.context import Context
+from utils.metrics import RunMetrics
+from utils.chunker import ChunkSizeStore
+from utils.provider_pool import Endpoint, PoolProvider
+from exporters.event import EventExporter
+from tests.sim_provider import SimulatedProvider, make_transfer_logs
+
+MODEL = "sim_transfers.json"
+
+
+class MetricsTester(unittest.TestCase):
+    def setUp(self):
+        self.logs = make_transfer_logs(1, 1000, logs_per_block=2)
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.sim = SimulatedProvider(self.logs, result_limit=150, finalized=600)
+        self.w3 = Web3(PoolProvider([Endpoint("SIM#1", provider=self.sim)]))
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def _exporter(self):
+        exporter = EventExporter(self.w3, MODEL, Context.TEST_EVENT.INPUT)
+        exporter.workers = 4
+        exporter.use_cache = False
+        exporter.cache_folder = self.cache_dir.name
+        exporter.chunk_sizes = ChunkSizeStore(self.cache_dir.name)
+        return exporter
+
+    def test_extraction_metrics(self):
+        """Requests, range splits and stage times of an extraction are recorded"""
+        exporter = self._exporter()
+        exporter.block_timestamp = True
+        self.assertEqual(len(json.loads(exporter.extract_data())), len(self.logs))
+        summary = exporter.metrics.get_summary()
+
+        self.assertEqual(summary["logs"], len(self.logs))
+        self.assertGreater(summary["logs_per_second"], 0)
+        self.assertEqual(set(summary["stages"]), {"fetch", "decode", "write"})
+        # every eth_getLogs call is counted, the ones over the result limit as errors
+        get_logs = summary["requests"]["eth_getLogs"]
+        self.assertEqual(get_logs["calls"], len(self.sim.calls))
+        self.assertEqual(get_logs["errors"], summary["counters"]["range_splits"])
+        self.assertGreater(summary["counters"]["range_splits"], 0)
+        self.assertEqual(
+            summary["counters"]["chunks"], get_logs["calls"] - get_logs["errors"]
+        )
+        # headers are fetched in batches, by the threads of the header cache
+        self.assertEqual(summary["requests"]["eth_getBlockByNumber"]["calls"], 1001)
+        self.assertIn("eth_getBlockByNumber[batch]", summary["latency"])
+        latency = summary["latency"]["eth_getLogs"]
+        self.assertEqual(sum(latency["buckets"].values()), get_logs["calls"])
+        # snapshot of the pool counters (batches count as one request)
+        self.assertGreater(summary["providers"]["SIM#1"]["requests"], len(self.sim.calls))
+
+    def test_shared_connection(self):
+        """Extractions sharing a connection only record their own requests"""
+        exporters = [self._exporter(), self._exporter()]
+        threads = [threading.Thread(target=e.extract_data) for e in exporters]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        calls = [e.metrics.get_summary()["requests"]["eth_getLogs"]["calls"] for e in exporters]
+        self.assertTrue(all(calls))
+        self.assertEqual(sum(calls), len(self.sim.calls))
+        for exporter in exporters:
+            self.assertEqual(exporter.metrics.get_summary()["logs"], len(self.logs))
+
+    def test_saved_files(self):
+        """Summary, Prometheus text file and profile are written into the metrics folder"""
+        metrics = RunMetrics("nightly/sim_transfers.json", "ETHEREUM", profile=True)
+        with metrics.track():
+            metrics.record_request(["eth_getLogs"], 0.03)
+            metrics.record_request(["eth_getLogs"], 0.2, failed=True)
+            with metrics.stage("decode"):
+                sum(range(1000))
+        path = metrics.save(self.cache_dir.name, prometheus=True)
+
+        with open(path, "r") as f:
+            summary = json.load(f)
+        self.assertEqual(summary["requests"], {"eth_getLogs": {"calls": 2, "errors": 1}})
+        folder = os.path.dirname(path)
+        self.assertTrue(os.path.isfile(os.path.join(folder, "sim_transfers.prom")))
+        self.assertTrue(os.path.isfile(path.replace(".json", ".prof")))
+
+        with open(os.path.join(folder, "sim_transfers.prom"), "r") as f:
+            prometheus = f.read()
+        labels = 'model="nightly/sim_transfers.json",network="ETHEREUM",method="eth_getLogs"'
+        histogram = "demonic_tutor_rpc_latency_seconds"
+        self.assertIn(f'{histogram}_bucket{{{labels},le="0.05"}} 1', prometheus)
+        self.assertIn(f'{histogram}_bucket{{{labels},le="+Inf"}} 2', prometheus)
+        self.assertIn(f"{histogram}_count{{{labels}}} 2", prometheus)
+        self.assertIn(
+            f'demonic_tutor_rpc_requests_total{{{labels},outcome="error"}} 1', prometheus
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Offline tests for the Multicall3 argument sweeps of the call exporter"""
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import Web3
+from utils.context import Context
+from exporters.call import CallExporter
+from utils.exceptions import ParserCallError
+from tests.sim_provider import SimulatedProvider, make_transfer_logs
+
+HOLDERS = [f"0x{i:040x}" for i in range(1, 61)]
+# odd holders revert (e.g.: no balance entry), even holders own i tokens
+BALANCES = {holder: i * 10**18 for i, holder in enumerate(HOLDERS, 1) if i % 2 == 0}
+
+
+class MulticallTester(unittest.TestCase):
+    def _exporter(self, model, **provider_kwargs):
+        provider = SimulatedProvider(
+            make_transfer_logs(1, 10), balances=BALANCES, **provider_kwargs
+        )
+        return CallExporter(Web3(provider), model, Context.TEST_CALL.INPUT), provider
+
+    def test_sweep_with_failed_calls(self):
+        """60 holders in aggregate3 calls of 5; reverted sub-calls don't abort the rest"""
+        exporter, provider = self._exporter("sim_balance_sweep.json")
+        rows = exporter.extract_data()
+
+        self.assertEqual(provider.methods["eth_call"], 12)
+        self.assertEqual(len(rows), len(HOLDERS))
+        for i, (holder, row) in enumerate(zip(HOLDERS, rows), 1):
+            if i % 2 == 0:
+                self.assertEqual(row, {"holder": holder, "success": True, "balance": i})
+            else:
+                self.assertEqual(row, {"holder": holder, "success": False, "balance": None})
+
+    def test_sweep_split_on_failed_batch(self):
+        """aggregate3 calls running out of gas are split, without losing sub-calls"""
+        exporter, provider = self._exporter("sim_balance_sweep.json", multicall_limit=3)
+        rows = exporter.extract_data()
+
+        self.assertEqual([row["holder"] for row in rows], HOLDERS)
+        self.assertEqual(sum(row["success"] for row in rows), len(BALANCES))
+        self.assertTrue(all(size <= 3 for size in provider.calls if size != 5))
+
+    def test_sweep_raises_other_errors(self):
+        """Other errors of aggregate3 calls (e.g.: rate limits) are raised, not split"""
+        rate_limited = ValueError({"code": -32005, "message": "request rate exceeded"})
+        exporter, provider = self._exporter(
+            "sim_balance_sweep.json", failures=[None, rate_limited]
+        )
+        with self.assertRaises(ParserCallError):
+            exporter.extract_data()
+        self.assertTrue(all(size == 5 for size in provider.calls))
+
+    def test_functions_at_pinned_block(self):
+        """Models with `functions` return rows per function name"""
+        exporter, provider = self._exporter("sim_balance_functions.json")
+        rows = exporter.extract_data()
+
+        self.assertEqual(
+            rows,
+            {"balanceOf": [{"holder": HOLDERS[1], "success": True, "balance": 2}]},
+        )
+        self.assertEqual(provider.methods["eth_blockNumber"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
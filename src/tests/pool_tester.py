@@ -0,0 +1,128 @@
+"""Offline tests for the node provider pool, over simulated endpoints"""
+
+import os
+import sys
+import time
+import random
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import Web3
+from utils.batch import BatchTransport
+from utils.provider_pool import Endpoint, PoolProvider, TokenBucket
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from tests.sim_provider import SimulatedProvider
+
+SECRET = "secret-key"
+
+
+def make_pool(*endpoint_kwargs, **provider_kwargs):
+    endpoints = []
+    for i, kwargs in enumerate(endpoint_kwargs):
+        kwargs = dict(kwargs)
+        failures, delays = kwargs.pop("failures", None), kwargs.pop("delays", None)
+        provider = SimulatedProvider(
+            [], head=1000, failures=failures, delays=delays, **provider_kwargs
+        )
+        endpoints.append(Endpoint(f"SIM#{i + 1}", provider=provider, **kwargs))
+    return PoolProvider(endpoints)
+
+
+class PoolTester(unittest.TestCase):
+    def setUp(self):
+        random.seed(5)
+
+    def test_weights(self):
+        """Requests are spread by weight, which must be positive"""
+        pool = make_pool({"weight": 3}, {"weight": 1})
+        w3 = Web3(pool)
+        for _ in range(400):
+            self.assertEqual(w3.eth.block_number, 1000)
+        stats = pool.get_stats()
+        ratio = stats["SIM#1"]["requests"] / stats["SIM#2"]["requests"]
+        self.assertTrue(2 < ratio < 4.5, ratio)
+
+        # endpoints that would never be picked are rejected
+        with self.assertRaises(ValueError):
+            Endpoint("SIM#3", provider=SimulatedProvider([]), weight=0)
+        os.environ["PROVIDER_TEST_WEIGHTS"] = "1,0"
+        os.environ["PROVIDER_TEST"] = f"https://a.example/{SECRET},https://b.example/{SECRET}"
+        try:
+            with self.assertRaises(ConnectionError) as raised:
+                PoolProvider.from_env("TEST")
+            self.assertNotIn(SECRET, str(raised.exception))
+        finally:
+            del os.environ["PROVIDER_TEST"], os.environ["PROVIDER_TEST_WEIGHTS"]
+
+    def test_rate_limit_failover(self):
+        """A 429 rests the endpoint and the request fails over to the other one"""
+        pool = make_pool({"failures": [429]}, {})
+        pool.endpoints[1].weight = 10**-6  # the first endpoint is always picked first
+        self.assertEqual(Web3(pool).eth.block_number, 1000)
+
+        first, second = pool.endpoints
+        self.assertEqual(first.stats["rate_limited"], 1)
+        self.assertGreater(first.backoff_until, time.monotonic())
+        self.assertEqual(second.stats["requests"], 1)
+
+    def test_circuit_breaker(self):
+        """An endpoint failing in a row is left out, without failing any request"""
+        down = [RequestsConnectionError("down")] * 100
+        pool = make_pool({"failures": down}, {})
+        w3 = Web3(pool)
+        for _ in range(50):
+            self.assertEqual(w3.eth.block_number, 1000)
+        # 3 failures open the circuit, then no more requests until the cooldown
+        self.assertEqual(pool.endpoints[0].stats["failures"], 3)
+        self.assertEqual(pool.endpoints[1].stats["requests"], 50)
+
+    def test_compute_unit_budget(self):
+        """Requests beyond the compute units per second wait for the bucket to refill"""
+        pool = make_pool({"cu_per_second": 200})
+        w3 = Web3(pool)
+        start = time.monotonic()
+        for _ in range(30):  # 10 CU each: 20 within the burst, 10 more in 0.5s
+            w3.eth.block_number
+        self.assertGreaterEqual(time.monotonic() - start, 0.4)
+
+    def test_hedged_requests(self):
+        """A request running late is duplicated to the other endpoint, which wins"""
+        slow = [0.001] * 30 + [2] + [0.001] * 10
+        pool = make_pool({"delays": slow}, {"weight": 10**-6})
+        pool.hedge = True
+        w3 = Web3(pool)
+        for _ in range(30):
+            w3.eth.block_number
+        start = time.monotonic()
+        self.assertEqual(w3.eth.block_number, 1000)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(pool.get_stats()["hedging"], {"requests": 31, "hedges": 1, "wins": 1})
+
+    def test_hedge_rate_cap(self):
+        """Hedges are capped by a budget, so that slow periods don't double the load"""
+        pool = make_pool({"delays": [0.001] * 20 + [0.3] * 10}, {"weight": 10**-6})
+        pool.hedge = True
+        pool.hedge_budget = TokenBucket(0.01, 2)  # 2 hedges, next one in 100s
+        w3 = Web3(pool)
+        for _ in range(30):
+            w3.eth.block_number
+        stats = pool.get_stats()["hedging"]
+        self.assertEqual(stats["hedges"], 2)
+        self.assertEqual(stats["requests"], 30)
+
+    def test_batches_and_redaction(self):
+        """Batches go through the pool, and errors never show endpoint URLs"""
+        pool = make_pool({}, {})
+        transport = BatchTransport(Web3(pool))
+        blocks = transport.request([("eth_getBlockByNumber", [hex(n), False]) for n in range(10)])
+        self.assertEqual([int(b["number"], 16) for b in blocks], list(range(10)))
+
+        pool = make_pool({"failures": [500] * 10}, {"failures": [500] * 10})
+        with self.assertRaises(RequestsConnectionError) as context:
+            pool.make_request("eth_blockNumber", [])
+        self.assertNotIn(SECRET, str(context.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
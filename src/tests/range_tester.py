@@ -0,0 +1,265 @@
+"""Offline tests for block-range fetching, against a simulated node provider"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+import importlib.util
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.context import Context
+from utils.log_cache import LogCache
+from exporters.event import EventExporter
+from utils.chunker import BlockRangeChunker, ChunkSizeStore
+from tests.sim_provider import (
+    APPROVAL_TOPIC,
+    make_approval_logs,
+    make_transfer_logs,
+    simulated_w3,
+    BLOCK_TIME,
+    GENESIS_TS,
+    TRANSFER_TOPIC,
+)
+
+MODEL = "sim_transfers.json"
+PROFILE = {"max_range": None, "max_results": 150}
+
+
+class RangeTester(unittest.TestCase):
+    def setUp(self):
+        self.logs = make_transfer_logs(1, 1000, logs_per_block=2)
+        self.params = {"fromBlock": 1, "toBlock": 1000, "topics": [TRANSFER_TOPIC]}
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def _exporter(self, workers, use_cache=False, model=MODEL, **provider_kwargs):
+        w3 = simulated_w3(self.logs, result_limit=150, **provider_kwargs)
+        exporter = EventExporter(w3, model, Context.TEST_EVENT.INPUT)
+        exporter.workers = workers
+        exporter.use_cache = use_cache
+        exporter.cache_folder = self.cache_dir.name
+        exporter.chunk_sizes = ChunkSizeStore(self.cache_dir.name)
+        return exporter
+
+    def test_sequential_split(self):
+        """A single worker splits the range and returns every log in block order"""
+        logs = self._exporter(1).get_logs_in_range(self.params)
+        self.assertEqual(len(logs), len(self.logs))
+        self.assertEqual(
+            [log["transactionHash"].hex() for log in logs],
+            [log["transactionHash"] for log in self.logs],
+        )
+
+    def test_concurrent_split(self):
+        """Concurrent workers return the same logs as a single worker"""
+        sequential = self._exporter(1).get_logs_in_range(self.params)
+        concurrent = self._exporter(4).get_logs_in_range(self.params)
+        self.assertEqual(concurrent, sequential)
+
+    def test_other_provider_limit_error(self):
+        """Range limit errors from other providers also shrink the chunks"""
+        exporter = self._exporter(2, error_message="Log response size exceeded.")
+        self.assertEqual(len(exporter.get_logs_in_range(self.params)), len(self.logs))
+
+    def test_remembered_chunk_size(self):
+        """A second extraction starts with the remembered chunk size"""
+        first = self._exporter(1)
+        first.get_logs_in_range(self.params)
+        second = self._exporter(1)
+        second.get_logs_in_range(self.params)
+        remembered = first.chunk_sizes.get(
+            ChunkSizeStore.get_key(first.network, self.params)
+        )
+        from_block, to_block = second.w3.provider.calls[0]
+        self.assertEqual(to_block - from_block + 1, remembered)
+        self.assertLess(len(second.w3.provider.calls), len(first.w3.provider.calls))
+
+    def test_extract_data(self):
+        """Logs are streamed through the decoder in block order"""
+        events = json.loads(self._exporter(4).extract_data())
+        self.assertEqual(len(events), len(self.logs))
+        self.assertEqual(events[-1]["block_num"], 1000)
+        self.assertEqual(events[-1]["src"], "0x" + f"{1000:040x}")
+        self.assertEqual(events[-1]["wad"], 1000.000000000000000001)
+
+    def test_block_timestamp_enrichment(self):
+        """Timestamps come from unique block headers, cached on disk once finalized"""
+        exporter = self._exporter(2, finalized=600)
+        exporter.block_timestamp = exporter.log_index = True
+        events = json.loads(exporter.extract_data())
+
+        self.assertEqual(
+            list(events[1])[:4], ["txn_hash", "block_num", "block_timestamp", "log_index"]
+        )
+        self.assertEqual(events[1]["block_timestamp"], GENESIS_TS + BLOCK_TIME)
+        self.assertEqual(events[1]["log_index"], 1)
+        # one header per block (+ the finalized block)
+        self.assertEqual(exporter.w3.provider.methods["eth_getBlockByNumber"], 1001)
+
+        second = self._exporter(2, finalized=600)
+        second.block_timestamp = True
+        events = json.loads(second.extract_data())
+        self.assertEqual(events[-1]["block_timestamp"], GENESIS_TS + 1000 * BLOCK_TIME)
+        self.assertEqual(second.w3.provider.methods["eth_getBlockByNumber"], 401)
+
+    def test_start_end_dates(self):
+        """Dates resolve to the first block at or after the start and the last before the end"""
+        exporter = self._exporter(2, model="sim_transfers_dates.json")
+        events = json.loads(exporter.extract_data())
+        self.assertEqual(events[0]["block_num"], 101)
+        self.assertEqual(events[-1]["block_num"], 500)
+        self.assertEqual(len(events), 400 * 2)
+
+    def test_log_cache(self):
+        """Finalized ranges are served from the cache, and only the gaps are fetched"""
+        first = self._exporter(2, use_cache=True, finalized=600)
+        expected = first.get_logs_in_range(self.params)
+
+        wider = {**self.params, "toBlock": 1200}
+        self.logs.extend(make_transfer_logs(1001, 1200, logs_per_block=2))
+        second = self._exporter(2, use_cache=True, finalized=1100)
+        logs = second.get_logs_in_range(wider)
+
+        self.assertEqual(logs[: len(expected)], expected)
+        self.assertEqual(len(logs), len(self.logs))
+        self.assertTrue(all(from_block > 600 for from_block, _ in second.w3.provider.calls))
+
+    def test_log_cache_chunks(self):
+        """Cached ranges are read a file at a time, and overlapping ranges only once"""
+        expected = self._exporter(2, use_cache=True).get_logs_in_range(self.params)
+        log_cache = LogCache("ETHEREUM", self.params, self.cache_dir.name)
+        files = os.listdir(log_cache.path)
+        # a range already cached (e.g.: by another runner job) isn't stored again
+        overlap = [log for log in expected if 400 <= log["blockNumber"] <= 700]
+        log_cache.store(400, 700, overlap)
+        self.assertEqual(sorted(os.listdir(log_cache.path)), sorted(files))
+
+        # an overlapping file of the whole range, as stored by older versions
+        with open(os.path.join(log_cache.path, "1-1000.ndjson"), "w") as f:
+            f.writelines(json.dumps(LogCache._to_json(log)) + "\n" for log in expected)
+        chunks = list(log_cache.read(1, 1000))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual([log for _, _, logs in chunks for log in logs], expected)
+        # consecutive block ranges
+        self.assertEqual((chunks[0][0], chunks[-1][1]), (1, 1000))
+        self.assertEqual([c[0] for c in chunks[1:]], [c[1] + 1 for c in chunks[:-1]])
+
+        second = self._exporter(2, use_cache=True)
+        chunks = list(second.iter_logs_in_range(self.params))
+        self.assertEqual([log for _, _, logs in chunks for log in logs], expected)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(second.w3.provider.calls, [])
+
+    def test_checkpoint_resume(self):
+        """A crashed extraction resumes after its checkpoint, without duplicated rows"""
+        with tempfile.TemporaryDirectory() as crashed, tempfile.TemporaryDirectory() as clean:
+            for folder, fail_after in ((crashed, 5), (crashed, None), (clean, None)):
+                exporter = self._exporter(1, fail_after=fail_after)
+                exporter.context, exporter.output_folder = Context.MAIN.INPUT, folder
+                exporter.extract_data()
+
+            with open(os.path.join(crashed, "sim_transfers.csv")) as f:
+                resumed_csv = f.read()
+            with open(os.path.join(clean, "sim_transfers.csv")) as f:
+                self.assertEqual(resumed_csv, f.read())
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "requires pyarrow")
+    def test_parquet_output(self):
+        """Columnar output is typed from the signature, with a part file per resumed run"""
+        import pyarrow.parquet as pq
+
+        with tempfile.TemporaryDirectory() as folder:
+            for end_block in (500, 1000):
+                exporter = self._exporter(2)
+                exporter.context, exporter.output_folder = Context.MAIN.INPUT, folder
+                exporter.config.update({"output_format": "parquet", "end_block": end_block})
+                exporter.extract_data()
+
+            first = pq.read_table(os.path.join(folder, "sim_transfers.parquet"))
+            second = pq.read_table(os.path.join(folder, "sim_transfers.501.parquet"))
+            self.assertEqual(
+                [str(field.type) for field in first.schema],
+                ["string", "uint64", "string", "string", "double"],
+            )
+            self.assertEqual(first.num_rows + second.num_rows, len(self.logs))
+            self.assertEqual(second.column("block_num")[0].as_py(), 501)
+            self.assertGreater(pq.ParquetFile(
+                os.path.join(folder, "sim_transfers.parquet")
+            ).num_row_groups, 1)
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "requires pyarrow")
+    def test_parquet_resume_without_rows(self):
+        """Resumed columnar runs with no new rows keep the checkpoint of the previous ones"""
+        with tempfile.TemporaryDirectory() as folder:
+            calls = []
+            for end_block in (1000, 1100, 1200):
+                exporter = self._exporter(2, head=1200)
+                exporter.context, exporter.output_folder = Context.MAIN.INPUT, folder
+                exporter.config.update({"output_format": "parquet", "end_block": end_block})
+                exporter.extract_data()
+                calls.append(exporter.w3.provider.calls)
+
+            # no logs after block 1000: no part files, and no blocks extracted again
+            parquet_files = [f for f in os.listdir(folder) if f.endswith(".parquet")]
+            self.assertEqual(parquet_files, ["sim_transfers.parquet"])
+            self.assertEqual(min(from_block for from_block, _ in calls[2]), 1101)
+
+    def test_multi_event_dispatch(self):
+        """Several event types are fetched in one pass and decoded per topic0"""
+        approvals = make_approval_logs(1, 1000)
+        self.logs = sorted(
+            self.logs + approvals,
+            key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16)),
+        )
+        exporter = self._exporter(2, model="sim_multi_events.json")
+        events = json.loads(exporter.extract_data())
+
+        self.assertEqual(list(events), ["Approval", "Transfer"])
+        self.assertEqual(len(events["Approval"]), len(approvals))
+        self.assertEqual(len(events["Transfer"]), len(self.logs) - len(approvals))
+        self.assertEqual(events["Approval"][-1]["guy"], "0x" + f"{1:040x}")
+        self.assertEqual(events["Approval"][-1]["wad"], 991)
+        self.assertEqual(events["Transfer"][-1]["wad"], 1000.000000000000000001)
+        # a single pass over the block range, filtering on both topics
+        _, filter_params = exporter.prepare_filter()
+        self.assertEqual(filter_params["topics"], [[APPROVAL_TOPIC, TRANSFER_TOPIC]])
+
+        with tempfile.TemporaryDirectory() as folder:
+            exporter.context, exporter.output_folder = Context.MAIN.INPUT, folder
+            exporter.extract_data()
+            self.assertTrue(
+                {"sim_multi_events_Approval.csv", "sim_multi_events_Transfer.csv"}
+                <= set(os.listdir(folder))
+            )
+
+    def test_chunker_buffer_limit(self):
+        """Workers pause when the fetched chunks are not consumed"""
+        chunker = BlockRangeChunker({"fromBlock": 0, "toBlock": 999}, PROFILE, 100, 2)
+        first, second = chunker.next_range(), chunker.next_range()
+        chunker.report_success(second, [])
+        chunker.report_overflow(first)
+        # the buffer is full, but the range the consumer waits for is handed out
+        self.assertEqual(chunker.next_range()["fromBlock"], 0)
+        self.assertTrue(chunker._is_buffer_full())
+
+    def test_chunker_grows_and_shrinks(self):
+        """Chunks grow after sparse ranges and use the range hinted by the provider"""
+        chunker = BlockRangeChunker({"fromBlock": 0, "toBlock": 10**6}, PROFILE, 100)
+        chunk = chunker.next_range()
+        chunker.report_success(chunk, [{}])
+        self.assertEqual(chunker.size, 200)
+
+        chunk = chunker.next_range()
+        self.assertEqual((chunk["fromBlock"], chunk["toBlock"]), (100, 299))
+        chunker.report_overflow(chunk, "Try with this block range [0x64, 0x95]")
+        self.assertEqual(chunker.size, 50)
+        chunk = chunker.next_range()
+        self.assertEqual((chunk["fromBlock"], chunk["toBlock"]), (100, 149))
+
+
+if __name__ == "__main__":
+    unittest.main()
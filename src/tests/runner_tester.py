@@ -0,0 +1,91 @@
+"""Offline tests for the batch runner (job scheduling & merged requests)"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collections import Counter
+from utils.context import Context
+from scheduler import Job, JobScheduler, read_jobs
+from tests.sim_provider import make_transfer_logs, simulated_w3
+
+
+class RecordingScheduler(JobScheduler):
+    """Runs jobs that just wait, recording their order and concurrency per network"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.started = []
+        self.peak = Counter()
+        self.lock = threading.Lock()
+
+    def _run_job(self, job, w3):
+        with self.lock:
+            self.started.append(job.model)
+            for network, running in self.running.items():
+                self.peak[network] = max(self.peak[network], running)
+        time.sleep(0.02)
+
+
+class RunnerTester(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_read_manifest(self):
+        """Jobs get their network & kind, and duplicated or missing models are skipped"""
+        jobs = read_jobs("sim_manifest.json", "ETHEREUM", Context.TEST_EVENT.INPUT)
+        self.assertEqual(
+            jobs,
+            [
+                Job("sim_transfers.json", "ETHEREUM", "event", 0),
+                Job("sim_transfers_dates.json", "POLYGON", "event", 5),
+            ],
+        )
+
+    def test_limits_and_priorities(self):
+        """Higher priorities start first, within the max jobs per network"""
+        jobs = [Job(f"eth_{i}", "ETHEREUM", "event", 0) for i in range(6)]
+        jobs += [Job(f"matic_{i}", "POLYGON", "event", i) for i in range(3)]
+        scheduler = RecordingScheduler(
+            jobs, lambda network: simulated_w3([]), {"ETHEREUM": 2, "POLYGON": 1}
+        )
+        results = scheduler.run()
+
+        self.assertTrue(all(results.values()) and len(results) == 9)
+        self.assertEqual(scheduler.peak, {"ETHEREUM": 2, "POLYGON": 1})
+        polygon = [model for model in scheduler.started if model.startswith("matic")]
+        self.assertEqual(polygon, ["matic_2", "matic_1", "matic_0"])
+        self.assertEqual(scheduler.started[0], "matic_2")
+
+    def test_shared_connection(self):
+        """Jobs of a network share one connection, sending identical requests once"""
+        connections = []
+
+        def connect(network):
+            # slow responses, so that both jobs have the same requests in flight
+            w3 = simulated_w3(make_transfer_logs(1, 1000), delays=[0.01] * 10000)
+            connections.append(network)
+            return w3
+
+        jobs = [Job("sim_transfers.json", "ETHEREUM", "event", 0)] * 2
+        scheduler = JobScheduler(
+            jobs, connect, context=Context.TEST_EVENT.INPUT, cache_folder=self.cache_dir.name
+        )
+        scheduler.run()
+
+        self.assertEqual(connections, ["ETHEREUM"])
+        self.assertEqual(len(json.loads(scheduler.results[jobs[0]])), 1000)
+        self.assertGreater(scheduler.inflight["ETHEREUM"].stats["merged"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
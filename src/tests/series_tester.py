@@ -0,0 +1,84 @@
+"""Offline tests for the call time-series over block & date ranges"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import Web3
+from constants import NETWORKS
+from utils.block import BlockUtils
+from utils.context import Context
+from exporters.call import CallExporter
+from tests.sim_provider import (
+    SimulatedProvider,
+    make_transfer_logs,
+    GENESIS_TS,
+    BLOCK_TIME,
+)
+
+HOLDER = f"0x{2:040x}"
+
+
+class SeriesTester(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def _exporter(self, model, **provider_kwargs):
+        provider = SimulatedProvider(
+            make_transfer_logs(1, 10000), balances={HOLDER: 2 * 10**18}, **provider_kwargs
+        )
+        exporter = CallExporter(
+            Web3(provider), model, Context.TEST_CALL.INPUT, NETWORKS["ETHEREUM"]
+        )
+        exporter.cache_folder = self.cache_dir.name
+        return exporter, provider
+
+    def test_block_range(self):
+        """Every 10th block, in batches; blocks before the deployment get no outputs"""
+        exporter, provider = self._exporter("sim_balance_block_range.json", deployed_at=500)
+        rows = exporter.extract_data()
+
+        self.assertEqual([row["block_num"] for row in rows], list(range(100, 1001, 10)))
+        for row in rows:
+            self.assertEqual(row["block_timestamp"], GENESIS_TS + row["block_num"] * BLOCK_TIME)
+            self.assertEqual(row["balance"], None if row["block_num"] < 500 else 2)
+        self.assertEqual(provider.methods["eth_call"], 91 + 91)
+
+    def test_date_range(self):
+        """Hourly dates resolve to the closest block before or at each date"""
+        exporter, _ = self._exporter("sim_balance_date_range.json")
+        rows = exporter.extract_data()
+
+        timestamps = BlockUtils.get_date_series(
+            "20150730 16:00:00", "20150731 12:00:00", "hour"
+        )
+        self.assertEqual(len(rows), 21)
+        self.assertEqual(rows[0]["date"], "2015-07-30 16:00:00")
+        for ts, row in zip(timestamps, rows):
+            self.assertEqual(row["block_num"], (ts - GENESIS_TS) // BLOCK_TIME)
+            self.assertLessEqual(row["block_timestamp"], ts)
+            self.assertEqual(row["balance"], 2)
+
+    def test_month_interval(self):
+        """Calendar months keep the day of the start date when possible"""
+        timestamps = BlockUtils.get_date_series(
+            "20230131 00:00:00", "20230501 00:00:00", "month"
+        )
+        self.assertEqual(
+            timestamps,
+            [
+                BlockUtils.convert_date_to_ts(date)
+                for date in ["20230131 00:00:00", "20230228 00:00:00", "20230331 00:00:00",
+                             "20230430 00:00:00"]
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,321 @@
+"""
+Simulated node provider serving synthetic logs, so that the extraction logic
+(range splitting, ordering, decoding) can be tested without a live node.
+"""
+
+import json
+import time
+import asyncio
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from collections import Counter
+from requests import Response
+from requests.exceptions import HTTPError
+from eth_abi import encode, decode
+from web3 import Web3, AsyncWeb3
+from web3.providers.base import BaseProvider
+from web3.providers.async_base import AsyncBaseProvider
+
+TRANSFER_SIG = "Transfer (index_topic_1 address src, index_topic_2 address dst, uint256 wad)"
+TRANSFER_TOPIC = Web3.keccak(text="Transfer(address,address,uint256)").hex()
+APPROVAL_TOPIC = Web3.keccak(text="Approval(address,address,uint256)").hex()
+CONTRACT_ADDR = "0x6b175474e89094c44da98b954eedeac495271d0f"
+LIMIT_ERROR = "query returned more than 10000 results"
+GENESIS_TS = 1438269973
+BLOCK_TIME = 12
+MULTICALL3_ADDR = "0xca11bde05977b3631167028862be2a173976ca11"
+AGGREGATE3_SELECTOR = "0x82ad56cb"
+BALANCE_OF_SELECTOR = "0x70a08231"
+
+
+def to_topic(addr: str) -> str:
+    return "0x" + "0" * 24 + addr[2:].lower()
+
+
+def make_transfer_logs(start_block, end_block, logs_per_block=1):
+    """Returns raw (JSON-RPC formatted) Transfer logs for every block in the range"""
+    logs = []
+    for block in range(start_block, end_block + 1):
+        for i in range(logs_per_block):
+            src = "0x" + f"{block:040x}"
+            dst = "0x" + f"{i + 1:040x}"
+            logs.append(
+                {
+                    "address": Web3.to_checksum_address(CONTRACT_ADDR),
+                    "topics": [TRANSFER_TOPIC, to_topic(src), to_topic(dst)],
+                    "data": "0x" + encode(["uint256"], [block * 10**18 + i]).hex(),
+                    "blockNumber": hex(block),
+                    "blockHash": "0x" + f"{block:064x}",
+                    "transactionHash": "0x" + f"{block:056x}{i:08x}",
+                    "transactionIndex": hex(i),
+                    "logIndex": hex(i),
+                    "removed": False,
+                }
+            )
+    return logs
+
+
+def make_approval_logs(start_block, end_block, every=10):
+    """Returns raw Approval logs every `every` blocks, after the Transfer logs of the block"""
+    logs = []
+    for block in range(start_block, end_block + 1, every):
+        logs.append(
+            {
+                "address": Web3.to_checksum_address(CONTRACT_ADDR),
+                "topics": [APPROVAL_TOPIC, to_topic(f"0x{block:040x}"), to_topic(f"0x{1:040x}")],
+                "data": "0x" + encode(["uint256"], [block]).hex(),
+                "blockNumber": hex(block),
+                "blockHash": "0x" + f"{block:064x}",
+                "transactionHash": "0x" + f"{block:056x}{999:08x}",
+                "transactionIndex": hex(999),
+                "logIndex": hex(999),
+                "removed": False,
+            }
+        )
+    return logs
+
+
+class SimulatedProvider(BaseProvider):
+    """
+    Serves `eth_getLogs` from an in-memory list of logs, rejecting queries that
+    return more than `result_limit` records (with Infura's error message by default).
+    """
+
+    def __init__(
+        self,
+        logs,
+        result_limit=10000,
+        error_message=LIMIT_ERROR,
+        head=None,
+        finalized=None,
+        fail_after=None,
+        batch_limit=None,
+        balances=None,
+        multicall_limit=None,
+        deployed_at=0,
+        slowdown_at=None,
+        failures=None,
+        delays=None,
+    ):
+        self.logs = logs
+        self.balances = balances or {}
+        self.multicall_limit = multicall_limit
+        self.deployed_at = deployed_at
+        self.slowdown_at = slowdown_at
+        self.failures = list(failures or [])
+        self.delays = list(delays or [])
+        self.batch_limit = batch_limit
+        self.fail_after = fail_after
+        self.result_limit = result_limit
+        self.error_message = error_message
+        self.head = head or max([int(log["blockNumber"], 16) for log in logs] or [0])
+        self.finalized = self.head if finalized is None else finalized
+        self.calls = []
+        self.methods = Counter()
+        self.batches = []
+
+    def make_request(self, method, params):
+        self._fail()
+        self.methods[method] += 1
+        if method == "eth_getLogs":
+            return self._get_logs(params[0])
+        if method == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(self.head)}
+        if method == "eth_getBlockByNumber":
+            return {"jsonrpc": "2.0", "id": 0, "result": self._get_block(params[0])}
+        if method == "eth_call":
+            return self._call(*params)
+        return {"jsonrpc": "2.0", "id": 0, "error": {"code": -32601, "message": method}}
+
+    def make_batch_request(self, requests):
+        """Serves a JSON-RPC batch, refusing it as a whole if above `batch_limit`"""
+        self._fail()
+        self.batches.append(len(requests))
+        if self.batch_limit is not None and len(requests) > self.batch_limit:
+            error = {"code": -32600, "message": "batch too large"}
+            return {"jsonrpc": "2.0", "id": None, "error": error}
+        responses = []
+        for request in requests:
+            response = self.make_request(request["method"], request["params"])
+            responses.append({**response, "id": request["id"]})
+        return responses[::-1]  # JSON-RPC doesn't guarantee the order of responses
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+    def _fail(self):
+        """
+        Waits for the next of `delays` (seconds), then raises the next of `failures`:
+        an HTTP status code (e.g.: 429), or an exception. None lets the request through.
+        """
+        if self.delays:
+            time.sleep(self.delays.pop(0))  # e.g.: a slow response of the node
+        if not self.failures:
+            return
+        failure = self.failures.pop(0)
+        if isinstance(failure, int):
+            response = Response()
+            response.status_code = failure
+            raise HTTPError(
+                f"{failure} Error for url: https://node.example/v3/secret-key",
+                response=response,
+            )
+        if failure is not None:
+            raise failure
+
+    def _get_logs(self, params):
+        from_block, to_block = int(params["fromBlock"], 16), int(params["toBlock"], 16)
+        self.calls.append((from_block, to_block))
+        if self.fail_after is not None and len(self.calls) > self.fail_after:
+            error = {"code": -32000, "message": "simulated node failure"}
+            return {"jsonrpc": "2.0", "id": 0, "error": error}
+        topic0 = params.get("topics", [None])[0]
+        if isinstance(topic0, str):
+            topic0 = [topic0]
+        result = [
+            log
+            for log in self.logs
+            if from_block <= int(log["blockNumber"], 16) <= to_block
+            and (topic0 is None or log["topics"][0] in topic0)
+        ]
+        if len(result) > self.result_limit:
+            error = {"code": -32005, "message": self.error_message}
+            return {"jsonrpc": "2.0", "id": 0, "error": error}
+        return {"jsonrpc": "2.0", "id": 0, "result": result}
+
+    def _call(self, transaction, block_id="latest"):
+        """
+        Serves `balanceOf(address)` from `balances`, directly or through Multicall3's
+        aggregate3, which fails as a whole above `multicall_limit` sub-calls (out of gas).
+        Sub-calls for unknown holders revert. Before `deployed_at`, there's no contract
+        code and calls return nothing.
+        """
+        block = self._get_block(block_id)
+        if block is not None and int(block["number"], 16) < self.deployed_at:
+            return {"jsonrpc": "2.0", "id": 0, "result": "0x"}
+        data = transaction["data"]
+        if transaction["to"].lower() == MULTICALL3_ADDR and data.startswith(AGGREGATE3_SELECTOR):
+            (calls,) = decode(["(address,bool,bytes)[]"], bytes.fromhex(data[10:]))
+            self.calls.append(len(calls))
+            if self.multicall_limit is not None and len(calls) > self.multicall_limit:
+                error = {"code": -32000, "message": "out of gas"}
+                return {"jsonrpc": "2.0", "id": 0, "error": error}
+            results = [self._balance_of("0x" + call_data.hex()) for _, _, call_data in calls]
+            result = encode(["(bool,bytes)[]"], [results])
+            return {"jsonrpc": "2.0", "id": 0, "result": "0x" + result.hex()}
+        success, result = self._balance_of(data)
+        if not success:
+            return {"jsonrpc": "2.0", "id": 0, "error": {"code": 3, "message": "reverted"}}
+        return {"jsonrpc": "2.0", "id": 0, "result": "0x" + result.hex()}
+
+    def _balance_of(self, data: str):
+        if not data.startswith(BALANCE_OF_SELECTOR):
+            return False, b""
+        (holder,) = decode(["address"], bytes.fromhex(data[10:]))
+        if holder.lower() not in self.balances:
+            return False, b""
+        return True, encode(["uint256"], [self.balances[holder.lower()]])
+
+    def _get_block(self, block_id):
+        """Returns a block header (see `get_timestamp`)"""
+        tags = {"earliest": 0, "latest": self.head, "finalized": self.finalized}
+        number = tags[block_id] if block_id in tags else int(block_id, 16)
+        if number > self.head:
+            return None
+        return {
+            "number": hex(number),
+            "hash": "0x" + f"{number:064x}",
+            "parentHash": "0x" + f"{max(number - 1, 0):064x}",
+            "timestamp": hex(self.get_timestamp(number)),
+        }
+
+    def get_timestamp(self, number):
+        """One block every BLOCK_TIME seconds, or 3 times slower after `slowdown_at`"""
+        if self.slowdown_at is None or number <= self.slowdown_at:
+            return GENESIS_TS + number * BLOCK_TIME
+        slow_blocks = number - self.slowdown_at
+        return GENESIS_TS + (self.slowdown_at + slow_blocks * 3) * BLOCK_TIME
+
+
+def simulated_w3(logs, result_limit=10000, error_message=LIMIT_ERROR, **kwargs):
+    return Web3(SimulatedProvider(logs, result_limit, error_message, **kwargs))
+
+
+class AsyncSimulatedProvider(AsyncBaseProvider):
+    """
+    Serves the requests of a SimulatedProvider to AsyncWeb3, each one after `latency`
+    seconds, keeping track of the max number of requests in flight
+    """
+
+    def __init__(self, sim: SimulatedProvider, latency=0):
+        super().__init__()
+        self.sim = sim
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def make_request(self, method, params):
+        return await self._serve(self.sim.make_request, method, params)
+
+    async def make_batch_request(self, requests):
+        return await self._serve(self.sim.make_batch_request, requests)
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+    async def _serve(self, handler, *args):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            return handler(*args)
+        finally:
+            self.in_flight -= 1
+
+
+def simulated_async_w3(logs, result_limit=10000, latency=0, **kwargs):
+    sim = SimulatedProvider(logs, result_limit, **kwargs)
+    return AsyncWeb3(AsyncSimulatedProvider(sim, latency))
+
+
+class RefusingServer(ThreadingHTTPServer):
+    """
+    Local JSON-RPC server answering batches (or every request if `batches_only` is
+    False) with an HTTP error status, and single requests with "0x10". Its URL has
+    an API key, which must never be logged.
+    """
+
+    def __init__(self, status: int, batches_only: bool = True):
+        super().__init__(("127.0.0.1", 0), _RefusingHandler)
+        self.status = status
+        self.batches_only = batches_only
+        self.batches = 0
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/v3/secret-key"
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _RefusingHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if isinstance(payload, list):
+            self.server.batches += 1
+        if isinstance(payload, list) or not self.server.batches_only:
+            self.send_response(self.server.status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"jsonrpc": "2.0", "id": payload["id"], "result": "0x10"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """no console output"""
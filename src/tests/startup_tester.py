@@ -0,0 +1,60 @@
+"""Offline tests for the startup: heavy imports and node connections are deferred"""
+
+import os
+import sys
+import subprocess
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from demonic_tutor import DemonicTutor
+from tests.sim_provider import simulated_w3
+from constants import NETWORKS
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("web3", "pandas", "numpy", "aiohttp")
+
+
+class CountingTutor(DemonicTutor):
+    connected = []
+
+    @staticmethod
+    def connect(network: str):
+        CountingTutor.connected.append(network)
+        return simulated_w3([], head=1000)
+
+
+class StartupTester(unittest.TestCase):
+    def setUp(self):
+        CountingTutor.connected = []
+
+    def test_lazy_imports(self):
+        """The menu & the runner load without web3, pandas or numpy"""
+        for module in ("app", "runner"):
+            code = (
+                f"import sys, {module}; "
+                f"print(','.join(m for m in {HEAVY_MODULES} if m in sys.modules))"
+            )
+            result = subprocess.run(
+                [sys.executable, "-c", code], cwd=SRC, capture_output=True, text=True
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(result.stdout.strip(), "", module)
+
+    def test_deferred_connection(self):
+        """Nodes are connected on first use, once per network"""
+        dt = CountingTutor(NETWORKS["ETHEREUM"])
+        dt.set_network(NETWORKS["POLYGON"])
+        self.assertEqual(CountingTutor.connected, [])
+
+        self.assertEqual(dt.w3.eth.block_number, 1000)
+        self.assertIs(dt.w3, dt.get_connection(NETWORKS["POLYGON"]))
+        dt.set_network(NETWORKS["ETHEREUM"])
+        dt.w3
+        dt.set_network(NETWORKS["POLYGON"])
+        dt.w3
+        self.assertEqual(CountingTutor.connected, [NETWORKS["POLYGON"], NETWORKS["ETHEREUM"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+
+from web3 import AsyncWeb3
+from web3.providers.async_rpc import AsyncHTTPProvider
+from web3.middleware import async_geth_poa_middleware
+from aiohttp import (
+    ClientError,
+    ClientResponseError,
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+)
+from utils.logger import setup_logger
+from utils.provider_pool import redact
+from utils.metrics import record_bytes, record_request
+from constants import ASYNC_MAX_CONNECTIONS, ASYNC_MAX_CONNECTIONS_PER_HOST, POOL_TIMEOUT
+
+logger = setup_logger(__name__)
+
+
+class ProviderResponseError(ClientError):
+    """
+    HTTP error status of a node provider. Unlike aiohttp's ClientResponseError, its
+    message has no URL, which may contain an API key
+    """
+
+    def __init__(self, status: int, url: str):
+        super().__init__(f"HTTP {status} from {redact(url)}")
+        self.status = status
+
+
+class SessionHTTPProvider(AsyncHTTPProvider):
+    """
+    AsyncHTTPProvider posting through the given aiohttp session, so that the
+    connections of all networks share the same pool (web3 caches a session per URL)
+    """
+
+    def __init__(self, endpoint_uri: str, session: ClientSession):
+        super().__init__(endpoint_uri)
+        self.session = session
+
+    async def make_request(self, method, params):
+        start = time.monotonic()
+        response = None
+        try:
+            raw = await self._post(self.encode_rpc_request(method, params))
+            response = self.decode_rpc_response(raw)
+            return response
+        finally:
+            failed = response is None or "error" in response
+            record_request([method], time.monotonic() - start, failed)
+
+    async def make_batch_request(self, requests: list):
+        """
+        Sends a JSON-RPC batch. A batch refused as a whole (HTTP 400/413) returns a
+        single error object, so that utils.batch splits it.
+        """
+        start = time.monotonic()
+        failed = True
+        try:
+            raw = await self._post(json.dumps(requests).encode("utf-8"))
+            failed = False
+        except ProviderResponseError as e:
+            if e.status not in (400, 413):
+                raise
+            error = {"code": -32600, "message": f"HTTP {e.status}"}
+            return {"jsonrpc": "2.0", "id": None, "error": error}
+        finally:
+            methods = [request["method"] for request in requests]
+            record_request(methods, time.monotonic() - start, failed)
+        return json.loads(raw)
+
+    async def _post(self, data: bytes) -> bytes:
+        async with self.session.post(
+            self.endpoint_uri, data=data, headers=self.get_request_headers()
+        ) as response:
+            try:
+                response.raise_for_status()
+            except ClientResponseError as e:
+                # the error (and its traceback) would show the URL, incl. the API key
+                raise ProviderResponseError(e.status, self.endpoint_uri) from None
+            raw = await response.read()
+        record_bytes(len(data), len(raw))
+        return raw
+
+
+class AsyncConnector:
+    """
+    AsyncWeb3 connections to the node providers of several networks, sharing one
+    aiohttp session (and connection pool), so that a single process can keep
+    hundreds of requests in flight across models and networks. E.g.:
+
+        async with AsyncConnector() as connector:
+            w3 = await connector.connect("ETHEREUM")
+
+    Each network uses the first endpoint in PROVIDER_<NETWORK> (the endpoint pool
+    of utils.provider_pool is synchronous).
+    """
+
+    def __init__(self, max_connections: int = ASYNC_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self.session = None
+        self.connections = {}
+
+    async def __aenter__(self):
+        self.session = ClientSession(
+            connector=TCPConnector(
+                limit=self.max_connections, limit_per_host=ASYNC_MAX_CONNECTIONS_PER_HOST
+            ),
+            timeout=ClientTimeout(total=POOL_TIMEOUT),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+        self.connections = {}
+
+    async def connect(self, network: str, provider=None) -> AsyncWeb3:
+        """
+        Returns the connection to a network, created once. A provider can be given
+        instead of the one in `.env` (e.g.: a simulated one in tests).
+        """
+        if network in self.connections:
+            return self.connections[network]
+        if provider is None:
+            urls = [url.strip() for url in (os.getenv(f"PROVIDER_{network}") or "").split(",")]
+            if not urls[0]:
+                raise ConnectionError(f"No node provider set for {network} (.env)")
+            provider = SessionHTTPProvider(urls[0], self.session)
+        w3 = AsyncWeb3(provider)
+        # To properly interpret the PoA-specific block structure: (e.g.: Polygon network)
+        w3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+        try:
+            await w3.eth.block_number
+        except Exception as e:
+            # errors may contain the provider url, incl. the API key
+            raise ConnectionError(
+                f"Initial connection to node provider failed. Reason: {redact(e)}"
+            )
+        self.connections[network] = w3
+        return w3
@@ -0,0 +1,176 @@
+import json
+import asyncio
+import itertools
+import threading
+
+from utils.logger import setup_logger
+from constants import RPC_BATCH_SIZE
+from aiohttp import ClientResponseError
+from requests.exceptions import HTTPError
+from utils.async_connector import ProviderResponseError
+from web3._utils.request import make_post_request, async_make_post_request
+
+logger = setup_logger(__name__)
+
+
+class BatchRefusedError(Exception):
+    """The provider rejected a JSON-RPC batch as a whole (e.g.: too many requests)"""
+
+
+class BatchTransport:
+    """
+    Sends JSON-RPC requests grouped into batch arrays, so that N requests cost
+    N / max_batch_size round trips instead of N.
+    If the provider refuses a batch, it is split in halves (down to single requests),
+    and the largest accepted size is remembered for the next batches.
+    Providers that can't send batches (e.g.: websockets) get the requests one by one.
+    Results are returned raw (hex strings), as sent by the node.
+    """
+
+    _ids = itertools.count()
+
+    def __init__(self, w3_instance, max_batch_size: int = RPC_BATCH_SIZE):
+        self.w3 = w3_instance
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+
+    def request(self, calls: list) -> list:
+        """
+        Sends [(method, params), ...] and returns their results in the same order.
+        Raises ValueError with the node's error if any request fails.
+        """
+        results = []
+        for i in range(0, len(calls), self.max_batch_size):
+            results.extend(self._send(calls[i : i + self.max_batch_size]))
+        return results
+
+    def _send(self, calls: list) -> list:
+        """Sends a batch, splitting it in halves if refused by the provider"""
+        try:
+            responses = self._send_batch(calls)
+        except BatchRefusedError as e:
+            half = self._split(calls, e)
+            return self._send(calls[:half]) + self._send(calls[half:])
+        return self._get_results(responses)
+
+    def _send_batch(self, calls: list) -> list:
+        """Returns the responses of a batch, sorted as the calls"""
+        provider = self.w3.provider
+        if len(calls) == 1 or not self._can_batch(provider):
+            return [provider.make_request(method, params) for method, params in calls]
+
+        requests = self._get_requests(calls)
+        if hasattr(provider, "make_batch_request"):
+            responses = provider.make_batch_request(requests)
+        else:
+            try:
+                raw = make_post_request(
+                    provider.endpoint_uri,
+                    json.dumps(requests).encode("utf-8"),
+                    **provider.get_request_kwargs(),
+                )
+            except HTTPError as e:
+                # 413 (payload too large), or 400 if batches are not supported. Other
+                # errors (e.g.: 429, 5xx) are raised as is, not to split the batch.
+                status = e.response.status_code if e.response is not None else None
+                if status not in (400, 413):
+                    raise
+                raise BatchRefusedError(f"HTTP {status}")
+            responses = json.loads(raw)
+        return self._sort_responses(requests, responses)
+
+    def _split(self, calls: list, error) -> int:
+        """Returns the size of the halves of a refused batch, remembering it"""
+        if len(calls) == 1:
+            raise ValueError(f"Request refused by the provider: {error}")
+        half = len(calls) // 2
+        with self._lock:
+            if half < self.max_batch_size:
+                logger.warning(f"Batch of {len(calls)} requests refused, using {half}")
+                self.max_batch_size = half
+        return half
+
+    @classmethod
+    def _get_requests(cls, calls: list) -> list:
+        return [
+            {"jsonrpc": "2.0", "id": next(cls._ids), "method": method, "params": params}
+            for method, params in calls
+        ]
+
+    @staticmethod
+    def _get_results(responses: list) -> list:
+        results = []
+        for response in responses:
+            if "error" in response:
+                raise ValueError(response["error"])
+            results.append(response.get("result"))
+        return results
+
+    @staticmethod
+    def _sort_responses(requests: list, responses) -> list:
+        """Returns the responses of a batch sorted as its requests"""
+        # a batch refused as a whole returns a single error object instead of a list
+        if not isinstance(responses, list):
+            raise BatchRefusedError(responses.get("error", responses))
+        if len(responses) != len(requests):
+            raise BatchRefusedError(f"{len(responses)} responses to {len(requests)} requests")
+        by_id = {response.get("id"): response for response in responses}
+        return [by_id[request["id"]] for request in requests]
+
+    @staticmethod
+    def _can_batch(provider) -> bool:
+        if hasattr(provider, "make_batch_request"):
+            return True
+        return str(getattr(provider, "endpoint_uri", "")).startswith("http")
+
+
+class AsyncBatchTransport(BatchTransport):
+    """
+    BatchTransport for AsyncWeb3 connections: batches are posted through the aiohttp
+    session of the provider (see utils.async_connector), and concurrent batches run
+    in the event loop instead of threads.
+    """
+
+    async def request(self, calls: list) -> list:
+        """Sends [(method, params), ...] concurrently in batches, results in order"""
+        batches = await asyncio.gather(
+            *(
+                self._send(calls[i : i + self.max_batch_size])
+                for i in range(0, len(calls), self.max_batch_size)
+            )
+        )
+        return [result for batch in batches for result in batch]
+
+    async def _send(self, calls: list) -> list:
+        try:
+            responses = await self._send_batch(calls)
+        except BatchRefusedError as e:
+            half = self._split(calls, e)
+            return await self._send(calls[:half]) + await self._send(calls[half:])
+        return self._get_results(responses)
+
+    async def _send_batch(self, calls: list) -> list:
+        provider = self.w3.provider
+        if len(calls) == 1 or not self._can_batch(provider):
+            return await asyncio.gather(
+                *(provider.make_request(method, params) for method, params in calls)
+            )
+
+        requests = self._get_requests(calls)
+        if hasattr(provider, "make_batch_request"):
+            responses = await provider.make_batch_request(requests)
+        else:
+            try:
+                raw = await async_make_post_request(
+                    provider.endpoint_uri,
+                    json.dumps(requests).encode("utf-8"),
+                    **provider.get_request_kwargs(),
+                )
+            except ClientResponseError as e:
+                # as above, only 400/413 split the batch (the error shows the URL)
+                if e.status not in (400, 413):
+                    url = provider.endpoint_uri
+                    raise ProviderResponseError(e.status, url) from None
+                raise BatchRefusedError(f"HTTP {e.status}")
+            responses = json.loads(raw)
+        return self._sort_responses(requests, responses)
@@ -1,10 +1,14 @@
 import time
+import bisect
 import calendar
 
-from datetime import datetime
-from constants import GENESIS_TS
+from datetime import datetime, timedelta
+from constants import GENESIS_TS, FINALITY_DEPTH
+from utils.context import Context
 from utils.logger import setup_logger
 from utils.exceptions import BlockUtilsError
+from utils.block_index import BlockTimeIndex
+from utils.header_cache import BlockHeaderCache, AsyncBlockHeaderCache
 
 logger = setup_logger(__name__)
 
@@ -12,10 +16,17 @@ logger = setup_logger(__name__)
 class BlockUtils:
     TS_ERROR_MSG = "Wrong ts: {} (for reference, current ts = {}, genesis ts = {})"
     RANGE_ERROR_MSG = "Ts {} out of blockchain data range {} to {}"
+    DATE_INTERVALS = ["hour", "day", "week", "month"]
+    HEADER_CACHE = BlockHeaderCache
 
-    def __init__(self, w3_instance, network):
+    def __init__(self, w3_instance, network, cache_folder: str = Context.CACHE):
         self.w3 = w3_instance
         self.network = network
+        self.headers = self.HEADER_CACHE.shared(w3_instance, network, cache_folder)
+        self.transport = self.headers.transport
+        self.index = BlockTimeIndex(network, cache_folder)
+        self.cache_folder = cache_folder
+        self.finalized_block = None
 
     @staticmethod
     def convert_date_to_ts(date: str):
@@ -26,6 +37,34 @@ class BlockUtils:
             logger.error(e)
             raise BlockUtilsError()
 
+    @staticmethod
+    def get_date_series(start: str, end: str, interval: str) -> list:
+        """
+        Return the timestamps from `start` to `end` (both 'YYYYMMDD HH:MM:SS', UTC)
+        every calendar `interval` (hour, day, week or month)
+        """
+        if interval not in BlockUtils.DATE_INTERVALS:
+            logger.error(
+                f"Wrong interval: {interval} (options: {BlockUtils.DATE_INTERVALS})"
+            )
+            raise BlockUtilsError()
+        first = datetime.utcfromtimestamp(BlockUtils.convert_date_to_ts(start))
+        last = datetime.utcfromtimestamp(BlockUtils.convert_date_to_ts(end))
+        current = first
+        timestamps = []
+        months = 0
+        while current <= last:
+            timestamps.append(calendar.timegm(current.utctimetuple()))
+            if interval == "month":
+                # months are added to the start date, so that e.g. day 31 isn't lost
+                months += 1
+                year, month = divmod(first.month - 1 + months, 12)
+                day = min(first.day, calendar.monthrange(first.year + year, month + 1)[1])
+                current = first.replace(year=first.year + year, month=month + 1, day=day)
+            else:
+                current += timedelta(**{f"{interval}s": 1})
+        return timestamps
+
     def validate_timestamp(self, timestamp: int):
         """Validate if the provided timestamp format is correct and within a valid range."""
         current_ts = int(time.time())
@@ -40,54 +79,316 @@ class BlockUtils:
             )
             raise BlockUtilsError()
 
-    def validate_range(self, timestamp: int):
+    def get_chain_bounds(self):
+        """Return the (number, timestamp) of the earliest and latest blocks, in one batch"""
+        blocks = self.transport.request(
+            [
+                ("eth_getBlockByNumber", ["earliest", False]),
+                ("eth_getBlockByNumber", ["latest", False]),
+            ]
+        )
+        return [(int(b["number"], 16), int(b["timestamp"], 16)) for b in blocks]
+
+    def get_search_bounds(self, timestamp: int):
+        """
+        Return the blocks [(number, ts), (number, ts)] to search the timestamp between:
+        the samples of the block time index around it if covered (no requests needed),
+        or the chain bounds otherwise (from the last sample, if before the timestamp)
+        """
+        bounds = self.index.get_bounds(timestamp)
+        if bounds:
+            return bounds
+        bounds = self.get_chain_bounds()
+        if len(self.index) and self.index.timestamps[-1] <= timestamp:
+            bounds[0] = (self.index.last_block, int(self.index.timestamps[-1]))
+        return bounds
+
+    def update_index(self) -> int:
+        """Extend the block time index of the network up to the finalized block"""
+        finalized_block = self.get_finalized_block_number()
+        return self.index.update(self.w3, finalized_block, self.cache_folder)
+
+    def validate_range(self, timestamp: int, bounds: list = None):
         """Validate if the provided timestamp is within the range of the blockchain data"""
-        earliest_ts = self.w3.eth.get_block("earliest").timestamp
-        latest_ts = self.w3.eth.get_block("latest").timestamp
+        (_, earliest_ts), (_, latest_ts) = bounds or self.get_chain_bounds()
         if not (earliest_ts <= timestamp <= latest_ts):
             logger.error(self.RANGE_ERROR_MSG.format(timestamp, earliest_ts, latest_ts))
             raise BlockUtilsError()
 
-    def get_closest_block_number_by_timestamp(self, timestamp: int) -> int:
-        """Return the closest block number (before or at) the given timestamp using binary search."""
+    def get_finalized_block_number(self) -> int:
+        """
+        Return the latest finalized block number. If the node doesn't support the
+        `finalized` tag, a safe number of blocks behind the latest one is returned.
+        """
+        try:
+            return self.w3.eth.get_block("finalized").number
+        except Exception:
+            try:
+                return self.w3.eth.get_block("latest").number - FINALITY_DEPTH[self.network]
+            except Exception as e:
+                logger.error(f"Failed to get the finalized block number: {e}")
+                raise BlockUtilsError()
+
+    def get_block_timestamp(self, block_number: int) -> int:
+        """Return the timestamp of a block, through the shared block header cache"""
+        if self.finalized_block is None:
+            self.finalized_block = self.get_finalized_block_number()
+        return self.headers.get_timestamp(block_number, self.finalized_block)
+
+    def get_block_timestamps(self, block_numbers: list) -> dict:
+        """Return {block number: timestamp}, fetching the missing headers in one batch"""
+        if self.finalized_block is None:
+            self.finalized_block = self.get_finalized_block_number()
+        return self.headers.get_timestamps(block_numbers, self.finalized_block)
+
+    def get_closest_block_number_by_timestamp(
+        self, timestamp: int, bounds: list = None, probes: dict = None
+    ) -> int:
+        """
+        Return the closest block number (before or at) the given timestamp.
+        As block times are roughly constant, the block is estimated by interpolating
+        between the search bounds (secant search), falling back to bisection when an
+        estimate doesn't halve the range. Every estimate is probed together with the
+        next block in one batch, so that an exact estimate ends the search.
+        Probed headers are kept in the shared block header cache, so that later
+        lookups start with them for free, and if the block time index covers the
+        timestamp, the search starts between its samples without any request.
+        Probed blocks are also added to `probes` ({block number: timestamp}) if given.
+        """
         try:
             # Validate timestamp format
             self.validate_timestamp(timestamp)
 
-            # Validate timestamp range
-            self.validate_range(timestamp)
+            # Validate timestamp range (index samples or earliest & latest blocks)
+            bounds = bounds or self.get_search_bounds(timestamp)
+            self.validate_range(timestamp, bounds)
 
-            # start binary search
-            lower, upper = (
-                self.w3.eth.get_block("earliest").number,
-                self.w3.eth.get_block("latest").number,
-            )
+            search = self._search(timestamp, bounds)
+            probed = None
+            while True:
+                try:
+                    blocks = search.send(probed)
+                except StopIteration as result:
+                    return result.value
+                probed = self.get_block_timestamps(blocks)
+                if probes is not None:
+                    probes.update(probed)
+        except BlockUtilsError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to get closest block number by timestamp: {e}")
+            raise BlockUtilsError()
 
-            if timestamp <= self.w3.eth.get_block(lower).timestamp:
-                return lower
+    @staticmethod
+    def _search(timestamp: int, bounds: list):
+        """
+        Search steps of `get_closest_block_number_by_timestamp()`, as a generator
+        (shared with AsyncBlockUtils): yields the blocks to probe, gets back their
+        {block number: timestamp}, and returns the closest block number.
+        """
+        (lower, lower_ts), (upper, upper_ts) = bounds
+        if timestamp <= lower_ts:
+            return lower
+        if timestamp >= upper_ts:
+            return upper
+
+        # Invariant: ts(lower) <= timestamp < ts(upper)
+        interpolate = True
+        while upper - lower > 1:
+            if interpolate:
+                guess = lower + (timestamp - lower_ts) * (upper - lower) // (
+                    upper_ts - lower_ts
+                )
+                guess = min(max(guess, lower + 1), upper - 1)
+            else:
+                guess = (lower + upper) // 2
+            probed = yield [guess, guess + 1]
+            guess_ts, next_ts = probed[guess], probed[guess + 1]
 
-            while lower <= upper:
-                mid = (lower + upper) // 2
-                mid_block = self.w3.eth.get_block(mid)
-                mid_timestamp = mid_block.timestamp
+            previous_range = upper - lower
+            if guess_ts > timestamp:
+                upper, upper_ts = guess, guess_ts
+            elif next_ts > timestamp:
+                return guess
+            else:
+                lower, lower_ts = guess + 1, next_ts
+            # interpolate while estimates are good, bisect for a step otherwise
+            interpolate = not interpolate or (upper - lower) * 2 <= previous_range
 
-                if mid_timestamp == timestamp:
-                    return mid
-                elif mid_timestamp < timestamp:
-                    lower = mid + 1
-                else:
-                    upper = mid - 1
+        return lower
 
-            return lower - 1
+    def get_closest_block_numbers_by_timestamps(
+        self, timestamps, chain_bounds: list = None
+    ) -> dict:
+        """
+        Return {timestamp: closest block number (before or at)} for many timestamps.
+        Timestamps are searched in ascending order, each one between the tightest
+        blocks known so far (chain bounds, index samples, and the blocks probed by the
+        previous searches), so that the search range narrows down as the sweep goes on.
+        Chain bounds are read once for all the timestamps (unless already given).
+        """
+        try:
+            timestamps = sorted(set(timestamps))
+            if not timestamps:
+                return {}
+            for timestamp in timestamps:
+                self.validate_timestamp(timestamp)
+            chain_bounds = chain_bounds or self.get_chain_bounds()
+            self.validate_range(timestamps[0], chain_bounds)
+            self.validate_range(timestamps[-1], chain_bounds)
+
+            # known blocks & their timestamps, sorted (timestamps don't decrease)
+            known = ([number for number, _ in chain_bounds], [ts for _, ts in chain_bounds])
+            blocks = {}
+            for timestamp in timestamps:
+                probes = {}
+                blocks[timestamp] = self.get_closest_block_number_by_timestamp(
+                    timestamp, self._get_known_bounds(timestamp, known), probes
+                )
+                self._add_known(probes, known)
+            return blocks
         except BlockUtilsError:
             raise
         except Exception as e:
-            logger.error(f"Failed to get closest block number by timestamp: {e}")
+            logger.error(f"Failed to get closest block numbers by timestamps: {e}")
             raise BlockUtilsError()
 
+    def _get_known_bounds(self, timestamp: int, known: tuple) -> list:
+        """Returns the tightest known blocks (or index samples) around the timestamp"""
+        known_blocks, known_ts = known
+        upper = min(bisect.bisect_right(known_ts, timestamp), len(known_ts) - 1)
+        lower = max(upper - 1, 0)
+        bounds = [
+            (known_blocks[lower], known_ts[lower]),
+            (known_blocks[upper], known_ts[upper]),
+        ]
+        index_bounds = self.index.get_bounds(timestamp)
+        if index_bounds:
+            bounds = [max(bounds[0], index_bounds[0]), min(bounds[1], index_bounds[1])]
+        return bounds
+
+    @staticmethod
+    def _add_known(probes: dict, known: tuple):
+        """Inserts the probed blocks into the known blocks, keeping them sorted"""
+        known_blocks, known_ts = known
+        for number, ts in sorted(probes.items()):
+            i = bisect.bisect_left(known_blocks, number)
+            if i == len(known_blocks) or known_blocks[i] != number:
+                known_blocks.insert(i, number)
+                known_ts.insert(i, ts)
+
     def get_closest_block_number_by_date(self, date: str) -> int:
-        """Return the closest block number (before or at) the given date using binary search."""
+        """Return the closest block number (before or at) the given date."""
 
         # Validate date format
         ts = self.convert_date_to_ts(date)
         return self.get_closest_block_number_by_timestamp(ts)
+
+
+class AsyncBlockUtils(BlockUtils):
+    """
+    BlockUtils for AsyncWeb3 connections: the same searches (block time index,
+    interpolation, bulk sweeps) with requests awaited in the event loop, so that
+    many conversions can run concurrently across networks without threads.
+    """
+
+    HEADER_CACHE = AsyncBlockHeaderCache
+
+    async def get_chain_bounds(self):
+        blocks = await self.transport.request(
+            [
+                ("eth_getBlockByNumber", ["earliest", False]),
+                ("eth_getBlockByNumber", ["latest", False]),
+            ]
+        )
+        return [(int(b["number"], 16), int(b["timestamp"], 16)) for b in blocks]
+
+    async def get_search_bounds(self, timestamp: int):
+        bounds = self.index.get_bounds(timestamp)
+        if bounds:
+            return bounds
+        bounds = await self.get_chain_bounds()
+        if len(self.index) and self.index.timestamps[-1] <= timestamp:
+            bounds[0] = (self.index.last_block, int(self.index.timestamps[-1]))
+        return bounds
+
+    def update_index(self) -> int:
+        logger.error("The block time index is built with a (sync) BlockUtils")
+        raise BlockUtilsError()
+
+    async def get_finalized_block_number(self) -> int:
+        try:
+            return (await self.w3.eth.get_block("finalized")).number
+        except Exception:
+            try:
+                latest = await self.w3.eth.get_block("latest")
+                return latest.number - FINALITY_DEPTH[self.network]
+            except Exception as e:
+                logger.error(f"Failed to get the finalized block number: {e}")
+                raise BlockUtilsError()
+
+    async def get_block_timestamp(self, block_number: int) -> int:
+        if self.finalized_block is None:
+            self.finalized_block = await self.get_finalized_block_number()
+        return await self.headers.get_timestamp(block_number, self.finalized_block)
+
+    async def get_block_timestamps(self, block_numbers: list) -> dict:
+        if self.finalized_block is None:
+            self.finalized_block = await self.get_finalized_block_number()
+        return await self.headers.get_timestamps(block_numbers, self.finalized_block)
+
+    async def get_closest_block_number_by_timestamp(
+        self, timestamp: int, bounds: list = None, probes: dict = None
+    ) -> int:
+        try:
+            self.validate_timestamp(timestamp)
+            bounds = bounds or await self.get_search_bounds(timestamp)
+            self.validate_range(timestamp, bounds)
+
+            search = self._search(timestamp, bounds)
+            probed = None
+            while True:
+                try:
+                    blocks = search.send(probed)
+                except StopIteration as result:
+                    return result.value
+                probed = await self.get_block_timestamps(blocks)
+                if probes is not None:
+                    probes.update(probed)
+        except BlockUtilsError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to get closest block number by timestamp: {e}")
+            raise BlockUtilsError()
+
+    async def get_closest_block_numbers_by_timestamps(
+        self, timestamps, chain_bounds: list = None
+    ) -> dict:
+        try:
+            timestamps = sorted(set(timestamps))
+            if not timestamps:
+                return {}
+            for timestamp in timestamps:
+                self.validate_timestamp(timestamp)
+            chain_bounds = chain_bounds or await self.get_chain_bounds()
+            self.validate_range(timestamps[0], chain_bounds)
+            self.validate_range(timestamps[-1], chain_bounds)
+
+            known = ([number for number, _ in chain_bounds], [ts for _, ts in chain_bounds])
+            blocks = {}
+            for timestamp in timestamps:
+                probes = {}
+                blocks[timestamp] = await self.get_closest_block_number_by_timestamp(
+                    timestamp, self._get_known_bounds(timestamp, known), probes
+                )
+                self._add_known(probes, known)
+            return blocks
+        except BlockUtilsError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to get closest block numbers by timestamps: {e}")
+            raise BlockUtilsError()
+
+    async def get_closest_block_number_by_date(self, date: str) -> int:
+        ts = self.convert_date_to_ts(date)
+        return await self.get_closest_block_number_by_timestamp(ts)
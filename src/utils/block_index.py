@@ -0,0 +1,101 @@
+import os
+
+from utils.context import Context
+from utils.logger import setup_logger
+from utils.exceptions import BlockUtilsError
+from utils.header_cache import BlockHeaderCache
+from constants import GENESIS_TS, BLOCK_INDEX_FOLDER, BLOCK_INDEX_STEP, BLOCK_INDEX_BATCH
+
+logger = setup_logger(__name__)
+
+
+class BlockTimeIndex:
+    """
+    Sorted index of block timestamps sampled every `step` blocks, per network, so that
+    a timestamp can be bracketed between two samples with a local bisect instead of
+    RPC calls. Samples are stored as a flat array of int64 timestamps (the block of
+    sample i is i * step) in cache/blocks/<network>.<step>.bin, which is memory-mapped
+    when read and extended incrementally (finalized blocks only) by `update()`.
+    """
+
+    def __init__(self, network: str, folder: str = Context.CACHE, step: int = BLOCK_INDEX_STEP):
+        self.network = network
+        self.step = step
+        self.path = os.path.join(folder, BLOCK_INDEX_FOLDER, f"{network}.{step}.bin")
+        self.timestamps = self._load()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def last_block(self):
+        """Last block sampled, or None if the index is empty"""
+        return (len(self) - 1) * self.step if len(self) else None
+
+    def get_bounds(self, timestamp: int):
+        """
+        Returns the samples [(block, ts), (block, ts)] bracketing the timestamp, such
+        that ts(lower) <= timestamp < ts(upper), or None if not covered by the index
+        """
+        if len(self) < 2 or not (self.timestamps[0] <= timestamp < self.timestamps[-1]):
+            return None
+        import numpy as np
+
+        upper = int(np.searchsorted(self.timestamps, timestamp, side="right"))
+        lower = upper - 1
+        return [
+            (lower * self.step, int(self.timestamps[lower])),
+            (upper * self.step, int(self.timestamps[upper])),
+        ]
+
+    def update(self, w3_instance, to_block: int, cache_folder: str = Context.CACHE) -> int:
+        """
+        Extends the index with the samples up to `to_block` (which must be finalized),
+        fetching their headers in concurrent batches. Samples are appended to the file
+        every BLOCK_INDEX_BATCH, so that an interrupted build keeps its progress.
+        Returns the number of samples added.
+        """
+        import numpy as np
+
+        headers = BlockHeaderCache.shared(w3_instance, self.network, cache_folder)
+        first = len(self)
+        last = to_block // self.step
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            # drops a partially written sample, if any
+            os.truncate(self.path, first * 8)
+        try:
+            for start in range(first, last + 1, BLOCK_INDEX_BATCH):
+                samples = range(start, min(start + BLOCK_INDEX_BATCH, last + 1))
+                if start == 0:
+                    # the genesis timestamp seeds the index without a request
+                    timestamps = {0: GENESIS_TS[self.network]}
+                    timestamps.update(
+                        headers.get_timestamps([i * self.step for i in samples[1:]])
+                    )
+                else:
+                    timestamps = headers.get_timestamps([i * self.step for i in samples])
+                values = np.array([timestamps[i * self.step] for i in samples], dtype="<i8")
+                with open(self.path, "ab") as f:
+                    f.write(values.tobytes())
+                logger.info(
+                    f"Block time index ({self.network}): up to block {samples[-1] * self.step}"
+                )
+        except Exception as e:
+            logger.error(f"Failed to update the block time index: {e}")
+            raise BlockUtilsError()
+        finally:
+            self.timestamps = self._load()
+        return max(0, len(self) - first)
+
+    def _load(self):
+        """
+        Memory-maps the samples file (only whole samples, in case of a partial write).
+        numpy is only imported if there are samples, as it takes a while to load.
+        """
+        num_samples = os.path.getsize(self.path) // 8 if os.path.exists(self.path) else 0
+        if num_samples == 0:
+            return ()
+        import numpy as np
+
+        return np.memmap(self.path, dtype="<i8", mode="r", shape=(num_samples,))
@@ -0,0 +1,86 @@
+import os
+import json
+import hashlib
+
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Model fields that change the extracted data (end_block excluded, so it can move on)
+FINGERPRINT_FIELDS = (
+    "contract_addr",
+    "function_sig",
+    "function_sigs",
+    "abi",
+    "filters",
+    "decimals",
+    "start_block",
+    "output_format",
+    "compression",
+    "block_timestamp",
+    "log_index",
+)
+
+
+class Checkpoint:
+    """
+    Watermark of an extraction: the last block fully written into the output file(s),
+    and the size (offset) of each output file at that point.
+    A crashed run resumes after the watermark, and a scheduled run of the same model
+    only appends the blocks after the previous run's watermark.
+    Stored next to the output file, e.g.: src/data/default_event.checkpoint.json
+    """
+
+    def __init__(self, model: str, context: str, config: dict):
+        self.path = os.path.splitext(os.path.join(context, model))[0] + ".checkpoint.json"
+        fingerprint = {field: config.get(field) for field in FINGERPRINT_FIELDS}
+        self.fingerprint = hashlib.sha1(
+            json.dumps(fingerprint, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        # offsets of the previous run, kept for its files not written by this one
+        self.offsets = {}
+
+    def get_resume_block(self):
+        """
+        Returns the first block to be extracted after the watermark, truncating the
+        output files to their size at the watermark (discarding rows of a partial chunk).
+        Returns None if there is no valid checkpoint for the current model.
+        """
+        state = self._read()
+        if not state or state.get("fingerprint") != self.fingerprint:
+            return None
+
+        offsets = state["offsets"]
+        for path, offset in offsets.items():
+            if not os.path.exists(path) or os.path.getsize(path) < offset:
+                logger.warning(f"Output file {path} doesn't match its checkpoint")
+                return None
+
+        for path, offset in offsets.items():
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+
+        self.offsets = offsets
+        return state["last_block"] + 1
+
+    def save(self, last_block: int, offsets: dict):
+        """Records the watermark once all the output files are flushed up to `last_block`"""
+        state = {
+            "fingerprint": self.fingerprint,
+            "last_block": last_block,
+            "offsets": {**self.offsets, **offsets},
+        }
+        try:
+            # write into a temp file first, so that a crash can't leave a corrupt checkpoint
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(state, f, indent=4)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            logger.warning(f"Checkpoint not saved at block {last_block}: {e}")
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,311 @@
+import os
+import re
+import json
+import bisect
+import asyncio
+import threading
+
+from utils.context import Context
+from utils.logger import setup_logger
+from constants import (
+    CHUNK_INITIAL_SIZE,
+    CHUNK_GROWTH_FACTOR,
+    CHUNK_GROWTH_THRESHOLD,
+    CHUNK_SIZES_FILE,
+    PROVIDER_LIMIT_PROFILES,
+    PROVIDER_LIMIT_ERRORS,
+)
+
+logger = setup_logger(__name__)
+
+# Block range suggested by the provider, e.g.: "this block range should work: [0x1, 0x7d0]"
+HINT_RANGE_REGEX = re.compile(r"\[(0x[0-9a-fA-F]+),\s*(0x[0-9a-fA-F]+)\]")
+# Max block range stated by the provider, e.g.: "exceed maximum block range: 5000"
+HINT_SIZE_REGEX = re.compile(r"(?:block range:?\s*|to an? )(\d[\d,]*)")
+
+
+def get_provider_profile(w3_instance) -> dict:
+    """
+    Returns the eth_getLogs limits of the node provider, based on its host.
+    For a pool of endpoints (see utils.provider_pool), the tightest limits apply.
+    """
+    provider = w3_instance.provider
+    endpoints = getattr(provider, "endpoint_uris", None) or [
+        str(getattr(provider, "endpoint_uri", "") or "")
+    ]
+    profiles = [_get_host_profile(endpoint) for endpoint in endpoints]
+    return {
+        key: min((p[key] for p in profiles if p[key] is not None), default=None)
+        for key in ("max_range", "max_results")
+    }
+
+
+def _get_host_profile(endpoint: str) -> dict:
+    for host, profile in PROVIDER_LIMIT_PROFILES.items():
+        if host in endpoint:
+            return profile
+    return PROVIDER_LIMIT_PROFILES["default"]
+
+
+def is_limit_error(error_msg: str) -> bool:
+    """Checks if an error returned by a provider is due to a range or result limit"""
+    error_msg = error_msg.lower()
+    return any(err in error_msg for err in PROVIDER_LIMIT_ERRORS)
+
+
+class ChunkSizeStore:
+    """Keeps the last good chunk size per (network, contract, topic0) on disk"""
+
+    _lock = threading.Lock()
+
+    def __init__(self, folder: str = Context.CACHE):
+        self.path = os.path.join(folder, CHUNK_SIZES_FILE)
+
+    @staticmethod
+    def get_key(network: str, params: dict) -> str:
+        topics = params.get("topics") or [None]
+        return f"{network}:{str(params.get('address')).lower()}:{topics[0]}"
+
+    def get(self, key: str):
+        return self._read().get(key)
+
+    def set(self, key: str, size: int):
+        with self._lock:
+            try:
+                sizes = self._read()
+                sizes[key] = size
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "w") as f:
+                    json.dump(sizes, f, indent=4)
+            except OSError as e:
+                logger.warning(f"Chunk size for {key} not saved: {e}")
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+class BlockRangeChunker:
+    """
+    Hands out block ranges (chunks) to the fetch workers, and gives back the fetched
+    logs in block order. Chunks grow after sparse successful calls (without reaching
+    a size already rejected) and shrink when the provider rejects them for exceeding
+    its range or result limits. Thread-safe.
+
+    At most `max_buffered` chunks can be in flight or waiting to be consumed, so the
+    workers stop fetching (backpressure) while the consumer is busy.
+    """
+
+    def __init__(
+        self,
+        params: dict,
+        profile: dict,
+        initial_size: int = None,
+        max_buffered: int = None,
+    ):
+        self.params = params
+        self.max_range = profile["max_range"]
+        self.max_results = profile["max_results"]
+        self.max_buffered = max_buffered
+        self.size = self._cap(initial_size or CHUNK_INITIAL_SIZE)
+        # Remaining block intervals to be handed out, sorted by start block
+        self.pending = [(params["fromBlock"], params["toBlock"])]
+        # Fetched chunks waiting to be consumed: {from block: (to block, logs)}
+        self.completed = {}
+        self.next_block = params["fromBlock"]
+        # Smallest chunk size rejected by the provider during this extraction
+        self.ceiling = None
+        self.in_flight = 0
+        self.error = None
+        self.aborted = False
+        self.num_splits = 0
+        self._cond = threading.Condition()
+
+    def next_range(self):
+        """
+        Returns the next chunk to be fetched as filter params, waiting while other
+        workers may still give back a range or while the buffer is full.
+        Returns None once all ranges are done.
+        """
+        with self._cond:
+            self._cond.wait_for(self._can_hand_out)
+            return self._hand_out()
+
+    def report_success(self, chunk: dict, logs: list):
+        """
+        Stores the fetched logs, and grows the chunk size if the range was sparse
+        compared to the result limit
+        """
+        with self._cond:
+            self._store_success(chunk, logs)
+            self._cond.notify_all()
+
+    def report_overflow(self, chunk: dict, error_msg: str = ""):
+        """Shrinks the chunk size and gives back the rejected range to be fetched again"""
+        with self._cond:
+            self._store_overflow(chunk, error_msg)
+            self._cond.notify_all()
+
+    def iter_chunks(self):
+        """
+        Yields (from block, to block, logs) for every fetched chunk in block order,
+        as soon as all the previous chunks have been fetched. Re-raises any worker error.
+        """
+        while True:
+            with self._cond:
+                self._cond.wait_for(self._is_next_ready)
+                chunk = self._pop_next()
+                self._cond.notify_all()
+            if chunk is None:
+                return
+            yield chunk
+
+    def abort(self, error: Exception = None):
+        """Stops handing out ranges (e.g.: a worker found an unrecoverable error)"""
+        with self._cond:
+            self._abort(error)
+            self._cond.notify_all()
+
+    # State changes, called with the condition held (shared with the async chunker)
+
+    def _can_hand_out(self) -> bool:
+        """Checks if a worker can get a range (or None), instead of waiting"""
+        return self.aborted or not (
+            (not self.pending and self.in_flight) or self._is_buffer_full()
+        )
+
+    def _hand_out(self):
+        if not self.pending or self.aborted:
+            return None
+
+        from_block, to_block = self.pending.pop(0)
+        end_block = min(to_block, from_block + self.size - 1)
+        if end_block < to_block:
+            self.pending.insert(0, (end_block + 1, to_block))
+        self.in_flight += 1
+
+        chunk = self.params.copy()
+        chunk["fromBlock"], chunk["toBlock"] = from_block, end_block
+        return chunk
+
+    def _store_success(self, chunk: dict, logs: list):
+        num_blocks = chunk["toBlock"] - chunk["fromBlock"] + 1
+        new_size = self._cap(self.size * CHUNK_GROWTH_FACTOR)
+        if (
+            num_blocks >= self.size
+            and len(logs) < self.max_results * CHUNK_GROWTH_THRESHOLD
+            and (self.ceiling is None or new_size < self.ceiling)
+        ):
+            self.size = new_size
+        self.completed[chunk["fromBlock"]] = (chunk["toBlock"], logs)
+        self.in_flight -= 1
+
+    def _store_overflow(self, chunk: dict, error_msg: str):
+        from_block, to_block = chunk["fromBlock"], chunk["toBlock"]
+        num_blocks = to_block - from_block + 1
+        # safety check (1 block can't be further divided)
+        if num_blocks == 1:
+            logger.error(f"Too many results in a single block: {from_block}")
+            self.completed[from_block] = (to_block, [])
+        else:
+            hint = self._parse_hint(error_msg)
+            if not hint or hint >= num_blocks:
+                hint = num_blocks // 2
+            self.size = max(1, min(self.size, hint))
+            self.ceiling = min(self.ceiling or num_blocks, num_blocks)
+            bisect.insort(self.pending, (from_block, to_block))
+            self.num_splits += 1
+        self.in_flight -= 1
+
+    def _is_next_ready(self) -> bool:
+        """Checks if the consumer can get the next chunk (or stop), instead of waiting"""
+        return (
+            self.next_block in self.completed
+            or self.next_block > self.params["toBlock"]
+            or self.aborted
+        )
+
+    def _pop_next(self):
+        """Returns the next chunk in block order, None when done. Raises worker errors."""
+        if self.error:
+            raise self.error
+        if self.aborted or self.next_block > self.params["toBlock"]:
+            return None
+        from_block = self.next_block
+        to_block, logs = self.completed.pop(from_block)
+        self.next_block = to_block + 1
+        return from_block, to_block, logs
+
+    def _abort(self, error: Exception = None):
+        self.aborted = True
+        self.error = self.error or error
+
+    def _is_buffer_full(self):
+        """
+        Checks if the fetched chunks not consumed yet reached the buffer limit.
+        The range the consumer is waiting for is always handed out.
+        """
+        if not self.max_buffered or not self.pending:
+            return False
+        if self.pending[0][0] == self.next_block:
+            return False
+        return self.in_flight + len(self.completed) >= self.max_buffered
+
+    def _cap(self, size: int) -> int:
+        return min(size, self.max_range) if self.max_range else size
+
+    @staticmethod
+    def _parse_hint(error_msg: str):
+        """Returns the block range size suggested in the error message, if any"""
+        match = HINT_RANGE_REGEX.search(error_msg)
+        if match:
+            return int(match.group(2), 16) - int(match.group(1), 16) + 1
+        match = HINT_SIZE_REGEX.search(error_msg)
+        if match:
+            return int(match.group(1).replace(",", ""))
+        return None
+
+
+class AsyncBlockRangeChunker(BlockRangeChunker):
+    """
+    BlockRangeChunker for fetch tasks running in an event loop (see
+    exporters.async_event): same chunk sizing, ordering and backpressure, waiting on
+    an asyncio condition instead of blocking the thread.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cond = asyncio.Condition()
+
+    async def next_range(self):
+        async with self._cond:
+            await self._cond.wait_for(self._can_hand_out)
+            return self._hand_out()
+
+    async def report_success(self, chunk: dict, logs: list):
+        async with self._cond:
+            self._store_success(chunk, logs)
+            self._cond.notify_all()
+
+    async def report_overflow(self, chunk: dict, error_msg: str = ""):
+        async with self._cond:
+            self._store_overflow(chunk, error_msg)
+            self._cond.notify_all()
+
+    async def iter_chunks(self):
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(self._is_next_ready)
+                chunk = self._pop_next()
+                self._cond.notify_all()
+            if chunk is None:
+                return
+            yield chunk
+
+    async def abort(self, error: Exception = None):
+        async with self._cond:
+            self._abort(error)
+            self._cond.notify_all()
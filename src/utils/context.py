@@ -18,3 +18,5 @@ Context.TEST_EVENT = Context._Context(
 Context.TEST_CALL = Context._Context(
     input_folder="tests/data/calls/input", output_folder="tests/data/calls/output"
 )
+# Folder for local caches (e.g.: remembered chunk sizes)
+Context.CACHE = os.path.join(Context.current_dir, "..", "cache")
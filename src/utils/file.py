@@ -1,6 +1,5 @@
 import os
 import json
-import pandas as pd
 
 from typing import Dict, Any
 from utils.logger import setup_logger
@@ -29,6 +28,9 @@ class FileUtils:
 
         # Converts a JSON data structure into a CSV file
         try:
+            # pandas takes a while to import -> only when needed
+            import pandas as pd
+
             df = pd.DataFrame(data)
             df.to_csv(csv_path, index=False)
         except ValueError as error:
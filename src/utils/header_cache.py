@@ -0,0 +1,205 @@
+import os
+import asyncio
+import sqlite3
+import weakref
+import threading
+
+from collections import OrderedDict
+from utils.context import Context
+from utils.batch import BatchTransport, AsyncBatchTransport
+from utils.logger import setup_logger
+from utils.metrics import in_context
+from concurrent.futures import ThreadPoolExecutor
+from constants import (
+    FETCH_WORKERS,
+    HEADER_CACHE_SIZE,
+    HEADER_CACHE_FOLDER,
+    HEADER_FETCH_BATCH,
+)
+
+logger = setup_logger(__name__)
+
+
+class BlockHeaderCache:
+    """
+    Cache of block timestamps, per network: an in-memory LRU in front of an on-disk
+    SQLite table (cache/headers/<network>.sqlite). Missing blocks are fetched from
+    the node in concurrent JSON-RPC batches. Only finalized blocks are stored on disk, so that
+    reorgs can't poison the cache.
+    Use `BlockHeaderCache.shared()` so that all the users of a node connection (event
+    exporter, block utils) share the same cache.
+    """
+
+    # {node connection: {(network, folder): cache}}, dropped with the connection
+    _instances = weakref.WeakKeyDictionary()
+    _instances_lock = threading.Lock()
+
+    def __init__(self, w3_instance, network: str, folder: str = Context.CACHE):
+        self.w3 = weakref.proxy(w3_instance)
+        self.network = network
+        self.path = os.path.join(folder, HEADER_CACHE_FOLDER, f"{network}.sqlite")
+        self.workers = FETCH_WORKERS
+        self.transport = BatchTransport(self.w3)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    @classmethod
+    def shared(cls, w3_instance, network: str, folder: str = Context.CACHE):
+        """Returns the cache of the given node connection & network, created once"""
+        with cls._instances_lock:
+            caches = cls._instances.setdefault(w3_instance, {})
+            if (network, folder) not in caches:
+                caches[(network, folder)] = cls(w3_instance, network, folder)
+            return caches[(network, folder)]
+
+    def get_timestamp(self, block_number: int, finalized_block: int = None) -> int:
+        return self.get_timestamps([block_number], finalized_block)[block_number]
+
+    def get_timestamps(self, block_numbers, finalized_block: int = None) -> dict:
+        """
+        Returns {block number: timestamp} for the given blocks, reading the LRU, then
+        the disk, and fetching the rest from the node. Fetched blocks up to
+        `finalized_block` are stored on disk (none if not given).
+        """
+        timestamps, missing = self._lookup(block_numbers)
+        if missing:
+            stored = self._read(missing)
+            fetched = self._fetch([n for n in missing if n not in stored])
+            timestamps.update(self._keep(stored, fetched, finalized_block))
+        return timestamps
+
+    def _lookup(self, block_numbers):
+        """Returns the timestamps in the LRU, and the blocks missing from it"""
+        timestamps = {}
+        missing = []
+        with self._lock:
+            for number in set(block_numbers):
+                if number in self._lru:
+                    self._lru.move_to_end(number)
+                    timestamps[number] = self._lru[number]
+                else:
+                    missing.append(number)
+        return timestamps, missing
+
+    def _keep(self, stored: dict, fetched: dict, finalized_block: int = None) -> dict:
+        """Adds the timestamps read from disk & fetched to the LRU, storing the latter"""
+        self._write(
+            {
+                number: ts
+                for number, ts in fetched.items()
+                if finalized_block is not None and number <= finalized_block
+            }
+        )
+        self._remember({**stored, **fetched})
+        return {**stored, **fetched}
+
+    def _remember(self, timestamps: dict):
+        """Adds timestamps to the LRU, evicting the least recently used ones"""
+        with self._lock:
+            self._lru.update(timestamps)
+            while len(self._lru) > HEADER_CACHE_SIZE:
+                self._lru.popitem(last=False)
+
+    def _fetch(self, block_numbers: list) -> dict:
+        """Fetches the headers of the given blocks in concurrent batches"""
+        if not block_numbers:
+            return {}
+        block_numbers = sorted(block_numbers)
+        batches = [
+            block_numbers[i : i + HEADER_FETCH_BATCH]
+            for i in range(0, len(block_numbers), HEADER_FETCH_BATCH)
+        ]
+        timestamps = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            for batch in executor.map(in_context(self._fetch_batch), batches):
+                timestamps.update(batch)
+        return timestamps
+
+    def _fetch_batch(self, block_numbers: list) -> dict:
+        headers = self.transport.request(
+            [("eth_getBlockByNumber", [hex(number), False]) for number in block_numbers]
+        )
+        return {
+            number: int(header["timestamp"], 16)
+            for number, header in zip(block_numbers, headers)
+        }
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS headers "
+                "(number INTEGER PRIMARY KEY, timestamp INTEGER NOT NULL)"
+            )
+        return self._db
+
+    def _read(self, block_numbers: list) -> dict:
+        timestamps = {}
+        try:
+            with self._lock:
+                db = self._connect()
+                # SQLite limits the number of query parameters
+                for i in range(0, len(block_numbers), 500):
+                    batch = block_numbers[i : i + 500]
+                    query = "SELECT number, timestamp FROM headers WHERE number IN ({})"
+                    rows = db.execute(query.format(",".join("?" * len(batch))), batch)
+                    timestamps.update(rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Block header cache not readable: {e}")
+        return timestamps
+
+    def _write(self, timestamps: dict):
+        if not timestamps:
+            return
+        try:
+            with self._lock:
+                db = self._connect()
+                with db:
+                    db.executemany(
+                        "INSERT OR REPLACE INTO headers VALUES (?, ?)", timestamps.items()
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Block headers not cached: {e}")
+
+
+class AsyncBlockHeaderCache(BlockHeaderCache):
+    """
+    BlockHeaderCache for AsyncWeb3 connections (same LRU & SQLite table), fetching
+    the missing headers with concurrent batches in the event loop
+    """
+
+    def __init__(self, w3_instance, network: str, folder: str = Context.CACHE):
+        super().__init__(w3_instance, network, folder)
+        self.transport = AsyncBatchTransport(self.w3)
+
+    async def get_timestamp(self, block_number: int, finalized_block: int = None) -> int:
+        return (await self.get_timestamps([block_number], finalized_block))[block_number]
+
+    async def get_timestamps(self, block_numbers, finalized_block: int = None) -> dict:
+        timestamps, missing = self._lookup(block_numbers)
+        if missing:
+            stored = self._read(missing)
+            fetched = await self._fetch([n for n in missing if n not in stored])
+            timestamps.update(self._keep(stored, fetched, finalized_block))
+        return timestamps
+
+    async def _fetch(self, block_numbers: list) -> dict:
+        block_numbers = sorted(block_numbers)
+        batches = await asyncio.gather(
+            *(
+                self._fetch_batch(block_numbers[i : i + HEADER_FETCH_BATCH])
+                for i in range(0, len(block_numbers), HEADER_FETCH_BATCH)
+            )
+        )
+        return {number: ts for batch in batches for number, ts in batch.items()}
+
+    async def _fetch_batch(self, block_numbers: list) -> dict:
+        headers = await self.transport.request(
+            [("eth_getBlockByNumber", [hex(number), False]) for number in block_numbers]
+        )
+        return {
+            number: int(header["timestamp"], 16)
+            for number, header in zip(block_numbers, headers)
+        }
@@ -0,0 +1,54 @@
+import json
+import threading
+
+from collections import Counter
+from concurrent.futures import Future
+from constants import MERGE_METHODS
+
+
+class InFlightRequests:
+    """
+    Merges identical read requests in flight on a node connection: the first caller
+    sends the request, and the callers asking for the same method & params meanwhile
+    wait for its response instead of sending it again (e.g.: jobs of the batch runner
+    reading the same logs or blocks at the same time). Used as a web3 middleware:
+
+        w3.middleware_onion.inject(InFlightRequests().middleware, "inflight", layer=0)
+    """
+
+    def __init__(self, methods: tuple = MERGE_METHODS):
+        self.methods = methods
+        self.stats = Counter()
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def middleware(self, make_request, w3):
+        def merge_requests(method, params):
+            if method not in self.methods:
+                return make_request(method, params)
+            key = (method, json.dumps(params, sort_keys=True, default=str))
+            return self.run(key, lambda: make_request(method, params))
+
+        return merge_requests
+
+    def run(self, key, send):
+        """Returns the response of `send()`, or of the identical request in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+            self.stats["merged" if not leader else "sent"] += 1
+        if not leader:
+            return call.result()
+
+        try:
+            response = send()
+            call.set_result(response)
+            return response
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
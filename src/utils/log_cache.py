@@ -0,0 +1,161 @@
+import os
+import json
+import hashlib
+import threading
+
+from hexbytes import HexBytes
+from utils.context import Context
+from utils.logger import setup_logger
+from constants import LOG_CACHE_FOLDER
+from web3.datastructures import AttributeDict
+
+logger = setup_logger(__name__)
+
+INDEX_FILE = "index.json"
+
+
+class LogCache:
+    """
+    On-disk cache of raw `eth_getLogs` results, per network, contract and topics.
+    Keeps track of the block intervals already covered, so that only the gaps need
+    to be requested to the node provider. Only finalized blocks must be stored.
+    Folder structure: cache/logs/<network>/<hash of address & topics>/<from>-<to>.ndjson
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, network: str, params: dict, folder: str = Context.CACHE):
+        self.key = {
+            "network": network,
+            "address": str(params.get("address")).lower(),
+            "topics": params.get("topics") or [],
+        }
+        digest = hashlib.sha1(json.dumps(self.key).encode("utf-8")).hexdigest()
+        self.path = os.path.join(folder, LOG_CACHE_FOLDER, network, digest)
+        self.intervals = self._read_index()
+
+    def plan(self, from_block: int, to_block: int) -> list:
+        """
+        Splits the block range into consecutive (from, to, cached) segments, where
+        cached segments can be read locally and the others must be fetched.
+        E.g.: [(100, 199, True), (200, 450, False), (451, 500, True)]
+        """
+        segments = []
+        current = from_block
+        for start, end in self.intervals:
+            if end < current or start > to_block:
+                continue
+            if start > current:
+                segments.append((current, start - 1, False))
+            segments.append((max(start, current), min(end, to_block), True))
+            current = min(end, to_block) + 1
+        if current <= to_block:
+            segments.append((current, to_block, False))
+        return segments
+
+    def read(self, from_block: int, to_block: int):
+        """
+        Yields (from, to, logs) for the cached block range, a chunk per cached file
+        (i.e.: as fetched), in block order. Blocks stored more than once (e.g.: files
+        of overlapping ranges, from older versions) are only read from the first file.
+        """
+        covered_to = from_block - 1
+        for file_from, file_to, file_name in self._list_files():
+            if file_to <= covered_to or file_from > to_block:
+                continue
+            chunk_from, chunk_to = max(file_from, covered_to + 1), min(file_to, to_block)
+            logs = []
+            with open(os.path.join(self.path, file_name), "r") as f:
+                for line in f:
+                    log = self._from_json(json.loads(line))
+                    if chunk_from <= log["blockNumber"] <= chunk_to:
+                        logs.append(log)
+            covered_to = chunk_to
+            yield chunk_from, chunk_to, logs
+
+    def store(self, from_block: int, to_block: int, logs: list):
+        """
+        Saves the logs of a block range (fully fetched) and marks it as covered. Only
+        the parts of the range not cached yet are saved, a file each.
+        """
+        with self._lock:
+            try:
+                # re-read, as other extractions (e.g.: batch runner jobs) may have stored ranges
+                self.intervals = self._merge(self._read_index() + self.intervals)
+                gaps = [
+                    (start, end)
+                    for start, end, cached in self.plan(from_block, to_block)
+                    if not cached
+                ]
+                os.makedirs(self.path, exist_ok=True)
+                for gap_from, gap_to in gaps:
+                    file_path = os.path.join(self.path, f"{gap_from}-{gap_to}.ndjson")
+                    with open(file_path, "w") as f:
+                        for log in logs:
+                            if gap_from <= log["blockNumber"] <= gap_to:
+                                f.write(json.dumps(self._to_json(log)) + "\n")
+                self.intervals = self._merge(self.intervals + [[from_block, to_block]])
+                self._write_index()
+            except OSError as e:
+                logger.warning(f"Logs for blocks {from_block}-{to_block} not cached: {e}")
+
+    def _list_files(self):
+        """Returns the (from, to, file name) of every cached block range, sorted"""
+        files = []
+        for file_name in os.listdir(self.path) if os.path.isdir(self.path) else []:
+            if file_name.endswith(".ndjson"):
+                file_from, file_to = os.path.splitext(file_name)[0].split("-")
+                files.append((int(file_from), int(file_to), file_name))
+        return sorted(files)
+
+    def _read_index(self) -> list:
+        try:
+            with open(os.path.join(self.path, INDEX_FILE), "r") as f:
+                return json.load(f)["intervals"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def _write_index(self):
+        # write into a temp file first, so that a crash can't leave a corrupt index
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump({**self.key, "intervals": self.intervals}, f)
+        os.replace(index_path + ".tmp", index_path)
+
+    @staticmethod
+    def _merge(intervals: list) -> list:
+        """Merges overlapping or adjacent block intervals"""
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    @staticmethod
+    def _to_json(log) -> dict:
+        return {
+            "address": log["address"],
+            "topics": [HexBytes(topic).hex() for topic in log["topics"]],
+            "data": HexBytes(log["data"]).hex(),
+            "blockNumber": log["blockNumber"],
+            "blockHash": HexBytes(log["blockHash"]).hex(),
+            "transactionHash": HexBytes(log["transactionHash"]).hex(),
+            "transactionIndex": log["transactionIndex"],
+            "logIndex": log["logIndex"],
+            "removed": log.get("removed", False),
+        }
+
+    @staticmethod
+    def _from_json(log: dict) -> AttributeDict:
+        """Rebuilds a log as returned by web3 (hex strings -> HexBytes)"""
+        return AttributeDict(
+            {
+                **log,
+                "topics": [HexBytes(topic) for topic in log["topics"]],
+                "data": HexBytes(log["data"]),
+                "blockHash": HexBytes(log["blockHash"]),
+                "transactionHash": HexBytes(log["transactionHash"]),
+            }
+        )
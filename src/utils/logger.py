@@ -6,44 +6,120 @@
 #     logger.critical("a scary critical one 😅")
 #     ----
 #     print(datetime.datetime.utcnow().date().isoformat())
+#
+# All the loggers share one QueueHandler: records are queued by the caller and
+# written to the console & the dated log file by a single listener thread, so that
+# logging never blocks the extraction on disk or terminal I/O.
 """
 
+import os
+import time
+import queue
+import atexit
 import datetime
+import threading
 import logging.handlers
 
-from constants import LOG_FILE_MAX_SIZE, LOG_BACKUP_COUNT
+from constants import (
+    LOG_FILE_MAX_SIZE,
+    LOG_BACKUP_COUNT,
+    LOG_LEVEL,
+    LOG_FOLDER,
+    LOG_PROGRESS_INTERVAL,
+)
+
+_queue_handler = None
+_console_handler = None
+_listener = None
+_setup_lock = threading.Lock()
+_quiet = False
 
 
 def setup_logger(name):
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(os.getenv("LOG_LEVEL") or LOG_LEVEL)
+    handler = _get_queue_handler()
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+    return logger
 
-    # Dynamically generate the filename based on the current date
-    current_date = (
-        datetime.date.today().isoformat()
-    )  # returns date in the format YYYY-MM-DD
-    filename = f"logs/app-{current_date}.txt"
 
-    # Create a rotating file handler
-    file_handler = logging.handlers.RotatingFileHandler(
-        filename, maxBytes=LOG_FILE_MAX_SIZE, backupCount=LOG_BACKUP_COUNT
-    )
+def _get_queue_handler():
+    """Creates the process-wide queue, and starts its listener thread, once"""
+    global _queue_handler, _console_handler, _listener
+    with _setup_lock:
+        if _queue_handler is not None:
+            return _queue_handler
 
-    # Create a StreamHandler for console output
-    console_handler = logging.StreamHandler()
+        # Dynamically generate the filename based on the current date
+        current_date = (
+            datetime.date.today().isoformat()
+        )  # returns date in the format YYYY-MM-DD
+        filename = os.path.join(LOG_FOLDER, f"app-{current_date}.txt")
+        os.makedirs(LOG_FOLDER, exist_ok=True)
 
-    # Create a formatter and set it for the handler
-    formatter = logging.Formatter(
-        "%(asctime)s %(levelname)-8s: [%(name)s.py:%(lineno)d] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+        # Create a rotating file handler, and a StreamHandler for console output
+        file_handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=LOG_FILE_MAX_SIZE, backupCount=LOG_BACKUP_COUNT
+        )
+        _console_handler = logging.StreamHandler()
+        if _quiet:
+            _console_handler.setLevel(logging.WARNING)
 
-    # Set formatter for both handlers
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
+        # Create a formatter and set it for both handlers
+        formatter = logging.Formatter(
+            "%(asctime)s %(levelname)-8s: [%(name)s.py:%(lineno)d] %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
+        file_handler.setFormatter(formatter)
+        _console_handler.setFormatter(formatter)
 
-    # Add both handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+        # Records are written by a single thread, in the order they were queued
+        log_queue = queue.SimpleQueue()
+        _queue_handler = logging.handlers.QueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(
+            log_queue, file_handler, _console_handler, respect_handler_level=True
+        )
+        _listener.start()
+        # flush the queued records on exit
+        atexit.register(_listener.stop)
+        return _queue_handler
 
-    return logger
+
+def set_quiet(quiet: bool = True):
+    """
+    Quiet mode: only warnings & errors are shown on the console (the log file keeps
+    everything), and progress messages are dropped
+    """
+    global _quiet
+    _quiet = quiet
+    if _console_handler is not None:
+        _console_handler.setLevel(logging.WARNING if quiet else logging.NOTSET)
+
+
+def is_quiet() -> bool:
+    return _quiet
+
+
+class ProgressLogger:
+    """
+    Logs progress messages (e.g.: block ranges processed) at most once every
+    `interval` seconds, dropping the ones in between, and none in quiet mode
+    """
+
+    def __init__(self, logger, interval: float = LOG_PROGRESS_INTERVAL):
+        self.logger = logger
+        self.interval = interval
+        self.last = None
+        self._lock = threading.Lock()
+
+    def info(self, message: str, *args):
+        """Logs the message (formatted with `args`, only if logged) if its turn has come"""
+        if _quiet:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self.last is not None and now - self.last < self.interval:
+                return
+            self.last = now
+        self.logger.info(message, *args, stacklevel=2)
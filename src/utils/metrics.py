@@ -0,0 +1,303 @@
+"""
+Run metrics of an extraction: RPC calls and latency histograms per JSON-RPC method,
+bytes transferred, range splits, retries, logs per second, time spent per stage
+(fetching, decoding, writing) and peak memory, optionally with a cProfile dump.
+
+The metrics of a run are active in the context (thread or asyncio task) running it,
+so that the node providers record the requests into the right run even when the
+connection is shared by several extractions (e.g.: batch runner). Threads started
+by the run must be given its context with `in_context()`.
+"""
+
+import os
+import sys
+import json
+import time
+import datetime
+import threading
+import contextvars
+
+from contextlib import contextmanager
+from collections import Counter, defaultdict
+from utils.logger import setup_logger
+from constants import METRICS_FOLDER, METRICS_LATENCY_BUCKETS, METRICS_PREFIX
+
+logger = setup_logger(__name__)
+
+_current = contextvars.ContextVar("run_metrics", default=None)
+
+
+def in_context(function):
+    """Wraps a function to record into the caller's run when called by other threads"""
+    metrics = _current.get()
+
+    def wrapper(*args, **kwargs):
+        token = _current.set(metrics)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return wrapper
+
+
+def record_request(methods: list, seconds: float, failed: bool = False):
+    """Records a JSON-RPC request (or batch) into the active run, if any"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.record_request(methods, seconds, failed)
+
+
+def record_bytes(sent: int, received: int):
+    """Records the bytes sent & received over HTTP into the active run, if any"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.count("bytes_sent", sent)
+        metrics.count("bytes_received", received)
+
+
+def get_peak_memory():
+    """Returns the peak resident memory of the process in bytes (None if unknown)"""
+    try:
+        import resource
+    except ImportError:  # e.g.: Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RunMetrics:
+    """
+    Metrics of an extraction (model) on a network. E.g.:
+
+        metrics = RunMetrics("dai_transfers.json", "ETHEREUM")
+        with metrics.track():
+            with metrics.stage("decode"):
+                ...
+        metrics.save(folder, prometheus=True)
+    """
+
+    def __init__(self, model: str, network: str, profile: bool = False):
+        self.model = model
+        self.network = network
+        self.counters = Counter()
+        self.requests = defaultdict(Counter)
+        self.latency = defaultdict(lambda: [0] * (len(METRICS_LATENCY_BUCKETS) + 1))
+        self.latency_sum = defaultdict(float)
+        self.stages = defaultdict(float)
+        self.providers = {}
+        self.started_at = None
+        self.ended_at = None
+        self.duration = 0.0
+        self.profiler = None
+        if profile:
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, provider=None):
+        """
+        Activates the metrics in the current context while the run lasts. The counters
+        of the node provider pool (if any) are kept at the end, as a snapshot.
+        """
+        token = _current.set(self)
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        start = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        try:
+            yield self
+        finally:
+            if self.profiler is not None:
+                self.profiler.disable()
+            self.duration = time.perf_counter() - start
+            self.ended_at = datetime.datetime.now(datetime.timezone.utc)
+            _current.reset(token)
+            if hasattr(provider, "get_stats"):
+                self.providers = provider.get_stats()
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def record_request(self, methods: list, seconds: float, failed: bool = False):
+        """
+        Counts the calls of a request (or batch), and its latency: under its method,
+        or <method>[batch] for batches (as all the calls are answered at once)
+        """
+        key = f"{methods[0]}[batch]" if len(methods) > 1 else methods[0]
+        bucket = next(
+            (i for i, limit in enumerate(METRICS_LATENCY_BUCKETS) if seconds <= limit),
+            len(METRICS_LATENCY_BUCKETS),
+        )
+        with self._lock:
+            for method in methods:
+                self.requests[method]["calls"] += 1
+                if failed:
+                    self.requests[method]["errors"] += 1
+            self.latency[key][bucket] += 1
+            self.latency_sum[key] += seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        """Adds the time spent within the block to a stage (e.g.: decode, write)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages[name] += elapsed
+
+    def timed(self, name: str, iterable):
+        """Yields the items of an iterable, adding the time spent waiting for them to a stage"""
+        iterator = iter(iterable)
+        try:
+            while True:
+                with self.stage(name):
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                yield item
+        finally:
+            # e.g.: stops the workers of a generator if the consumer stops early
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def get_summary(self) -> dict:
+        with self._lock:
+            logs = self.counters["logs"]
+            return {
+                "model": self.model,
+                "network": self.network,
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "ended_at": self.ended_at.isoformat() if self.ended_at else None,
+                "duration": round(self.duration, 3),
+                "logs": logs,
+                "logs_per_second": round(logs / self.duration, 1) if self.duration else 0,
+                "stages": {name: round(s, 3) for name, s in self.stages.items()},
+                "counters": dict(self.counters),
+                "requests": {method: dict(c) for method, c in self.requests.items()},
+                "latency": {
+                    key: {
+                        "count": sum(counts),
+                        "mean": round(self.latency_sum[key] / max(1, sum(counts)), 4),
+                        "buckets": dict(
+                            zip([*map(str, METRICS_LATENCY_BUCKETS), "+Inf"], counts)
+                        ),
+                    }
+                    for key, counts in self.latency.items()
+                },
+                "peak_memory": get_peak_memory(),
+                "providers": self.providers,
+            }
+
+    def to_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text format (e.g.: textfile collector)"""
+        summary = self.get_summary()
+        base = f'model="{self.model}",network="{self.network}"'
+        lines = []
+
+        def add(name, kind, help_text, samples):
+            name = f"{METRICS_PREFIX}_{name}"
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+            for suffix, labels, value in samples:
+                labels = ",".join(filter(None, [base, labels]))
+                lines.append(f"{name}{suffix}{{{labels}}} {value}")
+
+        add("duration_seconds", "gauge", "Duration of the run", [("", "", summary["duration"])])
+        add("logs_total", "counter", "Event logs extracted", [("", "", summary["logs"])])
+        add(
+            "logs_per_second",
+            "gauge",
+            "Event logs extracted per second",
+            [("", "", summary["logs_per_second"])],
+        )
+        add(
+            "stage_seconds",
+            "gauge",
+            "Time spent per stage of the run",
+            [("", f'stage="{name}"', s) for name, s in summary["stages"].items()],
+        )
+        add(
+            "run_counters_total",
+            "counter",
+            "Chunks, retries, range splits and bytes transferred of the run",
+            [
+                ("", f'counter="{name}"', n)
+                for name, n in summary["counters"].items()
+                if name != "logs"
+            ],
+        )
+        add(
+            "rpc_requests_total",
+            "counter",
+            "JSON-RPC calls per method",
+            [
+                ("", f'method="{method}",outcome="{outcome}"', n)
+                for method, counts in summary["requests"].items()
+                for outcome, n in (
+                    ("ok", counts.get("calls", 0) - counts.get("errors", 0)),
+                    ("error", counts.get("errors", 0)),
+                )
+            ],
+        )
+
+        samples = []
+        for key, counts in self.latency.items():
+            labels = f'method="{key}"'
+            cumulative = 0
+            for limit, n in zip([*map(str, METRICS_LATENCY_BUCKETS), "+Inf"], counts):
+                cumulative += n
+                samples.append(("_bucket", f'{labels},le="{limit}"', cumulative))
+            samples.append(("_sum", labels, round(self.latency_sum[key], 6)))
+            samples.append(("_count", labels, cumulative))
+        add("rpc_latency_seconds", "histogram", "JSON-RPC latency per method", samples)
+
+        if summary["peak_memory"] is not None:
+            add(
+                "peak_memory_bytes",
+                "gauge",
+                "Peak resident memory of the process",
+                [("", "", summary["peak_memory"])],
+            )
+        return "\n".join(lines) + "\n"
+
+    def save(self, output_folder: str, prometheus: bool = False) -> str:
+        """
+        Writes the summary into <output folder>/metrics/<model>-<start time>.json, and
+        optionally <model>.prom (Prometheus, latest run) and <model>-<start time>.prof
+        (cProfile). Returns the path of the summary.
+        """
+        folder = os.path.join(output_folder, METRICS_FOLDER)
+        base_name = os.path.join(folder, os.path.splitext(self.model)[0])
+        os.makedirs(os.path.dirname(base_name), exist_ok=True)
+        stamp = (self.started_at or datetime.datetime.now()).strftime("%Y%m%d-%H%M%S")
+
+        path = f"{base_name}-{stamp}.json"
+        with open(path, "w") as f:
+            json.dump(self.get_summary(), f, indent=4)
+        if prometheus:
+            # written then renamed, so that collectors never read a partial file
+            with open(f"{base_name}.prom.tmp", "w") as f:
+                f.write(self.to_prometheus())
+            os.replace(f"{base_name}.prom.tmp", f"{base_name}.prom")
+        if self.profiler is not None:
+            self.profiler.dump_stats(f"{base_name}-{stamp}.prof")
+        return path
+
+    def log_summary(self, path: str = None):
+        """Logs a one-line summary of the run"""
+        summary = self.get_summary()
+        parts = [f"{summary['duration']:.1f}s"]
+        if summary["logs"]:
+            parts.append(f"{summary['logs']} logs ({summary['logs_per_second']:.0f}/s)")
+        parts.extend(f"{name} {s:.1f}s" for name, s in sorted(summary["stages"].items()))
+        calls = sum(counts["calls"] for counts in summary["requests"].values())
+        parts.append(f"{calls} RPC calls")
+        logger.info(f"Run metrics: {', '.join(parts)}{f' -> {path}' if path else ''}")
@@ -0,0 +1,100 @@
+import threading
+
+from hexbytes import HexBytes
+from utils.logger import setup_logger
+from utils.metrics import in_context
+from utils.batch import BatchTransport
+from utils.exceptions import ParserCallError
+from concurrent.futures import ThreadPoolExecutor
+from constants import (
+    FETCH_WORKERS,
+    MULTICALL3_ADDR,
+    MULTICALL_GAS_LIMIT,
+    MULTICALL_CALL_GAS,
+    MULTICALL_SPLIT_ERRORS,
+)
+
+logger = setup_logger(__name__)
+
+# aggregate3((address target, bool allowFailure, bytes callData)[])
+AGGREGATE3_SELECTOR = "0x82ad56cb"
+AGGREGATE3_INPUT = ["(address,bool,bytes)[]"]
+AGGREGATE3_OUTPUT = ["(bool,bytes)[]"]
+
+
+class Multicall:
+    """
+    Packs many contract calls into Multicall3 `aggregate3` calls, all executed at the
+    same (pinned) block. Each aggregate3 call holds as many sub-calls as fit in the gas
+    limit (at `call_gas` per sub-call), and they are sent concurrently.
+    Sub-calls are sent with allowFailure, so a failing sub-call doesn't abort the rest;
+    if a whole aggregate3 call fails (e.g.: out of gas), it is split in halves, and the
+    smaller size is used for the next calls. Other errors (e.g.: rate limits) are raised.
+    """
+
+    def __init__(
+        self,
+        w3_instance,
+        block,
+        call_gas: int = MULTICALL_CALL_GAS,
+        workers: int = FETCH_WORKERS,
+    ):
+        self.w3 = w3_instance
+        self.block = hex(block) if isinstance(block, int) else block
+        self.batch_size = max(1, MULTICALL_GAS_LIMIT // call_gas)
+        self.workers = max(1, workers)
+        self.transport = BatchTransport(w3_instance)
+        self._lock = threading.Lock()
+
+    def aggregate(self, calls: list) -> list:
+        """
+        Executes [(target address, call data), ...] and returns [(success, return data)]
+        in the same order
+        """
+        batches = [
+            calls[i : i + self.batch_size] for i in range(0, len(calls), self.batch_size)
+        ]
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for batch_results in executor.map(in_context(self._aggregate_batch), batches):
+                results.extend(batch_results)
+        return results
+
+    def _aggregate_batch(self, calls: list) -> list:
+        try:
+            return self._aggregate3(calls)
+        except ValueError as e:
+            if not self._is_split_error(e):
+                raise
+            if len(calls) == 1:
+                logger.warning(f"Multicall sub-call to {calls[0][0]} failed: {e}")
+                return [(False, b"")]
+            half = len(calls) // 2
+            with self._lock:
+                if half < self.batch_size:
+                    logger.warning(f"aggregate3 of {len(calls)} calls failed, using {half}: {e}")
+                    self.batch_size = half
+            return self._aggregate_batch(calls[:half]) + self._aggregate_batch(calls[half:])
+
+    @staticmethod
+    def _is_split_error(error) -> bool:
+        """Checks if a failed aggregate3 call may succeed with fewer sub-calls"""
+        message = str(error).lower()
+        return any(err in message for err in MULTICALL_SPLIT_ERRORS)
+
+    def _aggregate3(self, calls: list) -> list:
+        data = self.w3.codec.encode(
+            AGGREGATE3_INPUT,
+            [[(target, True, HexBytes(call_data)) for target, call_data in calls]],
+        )
+        transaction = {
+            "to": MULTICALL3_ADDR,
+            "data": AGGREGATE3_SELECTOR + data.hex(),
+            "gas": hex(MULTICALL_GAS_LIMIT),
+        }
+        (raw_result,) = self.transport.request([("eth_call", [transaction, self.block])])
+        if HexBytes(raw_result) == b"":
+            logger.error(f"Multicall3 is not deployed at block {self.block}")
+            raise ParserCallError()
+        (results,) = self.w3.codec.decode(AGGREGATE3_OUTPUT, HexBytes(raw_result))
+        return [(success, bytes(return_data)) for success, return_data in results]
@@ -0,0 +1,414 @@
+import os
+import re
+import json
+import time
+import random
+import threading
+
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.logger import setup_logger
+from utils.metrics import in_context, record_bytes, record_request
+from web3.providers.base import JSONBaseProvider
+from web3._utils.request import make_post_request
+from requests.exceptions import HTTPError, RequestException
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from constants import (
+    COMPUTE_UNITS,
+    HEDGE_WINDOW,
+    HEDGE_METHODS,
+    HEDGE_WORKERS,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_MAX_PER_SECOND,
+    POOL_TIMEOUT,
+    POOL_MAX_ATTEMPTS,
+    POOL_BACKOFF_MAX,
+    POOL_BACKOFF_BASE,
+    POOL_BREAKER_COOLDOWN,
+    POOL_BREAKER_THRESHOLD,
+    PROVIDER_RATE_LIMIT_ERRORS,
+)
+
+logger = setup_logger(__name__)
+
+URL_PATTERN = re.compile(r"\w+://\S+")
+
+
+def redact(text) -> str:
+    """Removes URLs (which may contain API keys) from a message before logging it"""
+    return URL_PATTERN.sub("<url>", str(text))
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` units per second, up to `capacity` (1s of burst)"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_take(self, amount: float) -> bool:
+        """Takes the tokens if available. Costs above the capacity need a full bucket."""
+        with self._lock:
+            self._refill()
+            amount = min(amount, self.capacity)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return True
+            return False
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class LatencyTracker:
+    """Recent latencies per request kind, to know when a request is running late"""
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE):
+        self.percentile = percentile
+        self.latencies = defaultdict(lambda: deque(maxlen=HEDGE_WINDOW))
+        self._lock = threading.Lock()
+
+    def add(self, key: str, seconds: float):
+        with self._lock:
+            self.latencies[key].append(seconds)
+
+    def get_percentile(self, key: str):
+        """Returns the latency percentile, or None until there are enough samples"""
+        with self._lock:
+            samples = sorted(self.latencies[key])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.percentile / 100))]
+
+
+class Endpoint:
+    """
+    A node endpoint of the pool, with its weight, compute-unit rate limit, circuit
+    breaker and 429 backoff state. Requests go to `url` (raw JSON-RPC over HTTP, so
+    that the URL is never logged) or to a `provider` (e.g.: a simulated one).
+    """
+
+    def __init__(
+        self,
+        label: str,
+        url: str = None,
+        provider=None,
+        weight: float = 1,
+        cu_per_second: float = None,
+    ):
+        if not weight > 0:
+            raise ValueError(f"Weight of endpoint {label} must be positive: {weight}")
+        self.label = label
+        self.url = url
+        self.provider = provider
+        self.weight = weight
+        self.bucket = TokenBucket(cu_per_second) if cu_per_second else None
+        self.stats = Counter()
+        self.failures = 0
+        self.half_open = False
+        self.open_until = 0.0
+        self.rate_limits = 0
+        self.backoff_until = 0.0
+        self._lock = threading.Lock()
+
+    def available_at(self) -> float:
+        """Monotonic time from which the endpoint can take requests again"""
+        return max(self.open_until, self.backoff_until)
+
+    def send(self, payload):
+        """Sends a JSON-RPC request (dict) or batch (list) and returns the response(s)"""
+        if self.provider is not None:
+            if isinstance(payload, list):
+                return self.provider.make_batch_request(payload)
+            response = self.provider.make_request(payload["method"], payload["params"])
+            return {**response, "id": payload["id"]}
+        data = json.dumps(payload).encode("utf-8")
+        raw = make_post_request(
+            self.url,
+            data,
+            headers={"Content-Type": "application/json"},
+            timeout=POOL_TIMEOUT,
+        )
+        record_bytes(len(data), len(raw))
+        return json.loads(raw)
+
+    def count(self, cost: int):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["compute_units"] += cost
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.half_open = False
+            self.rate_limits = 0
+
+    def on_failure(self, error):
+        """Opens the circuit after consecutive failures (or a failed half-open trial)"""
+        with self._lock:
+            self.stats["failures"] += 1
+            self.failures += 1
+            if self.half_open or self.failures >= POOL_BREAKER_THRESHOLD:
+                logger.warning(
+                    f"Endpoint {self.label} failing ({redact(error)}): "
+                    f"left out for {POOL_BREAKER_COOLDOWN}s"
+                )
+                self.open_until = time.monotonic() + POOL_BREAKER_COOLDOWN
+                self.half_open = True
+                self.failures = 0
+
+    def on_rate_limited(self, retry_after: float = None):
+        """Rests the endpoint for Retry-After, or an exponential backoff"""
+        with self._lock:
+            self.stats["rate_limited"] += 1
+            self.rate_limits += 1
+            delay = retry_after or min(
+                POOL_BACKOFF_BASE * 2 ** (self.rate_limits - 1), POOL_BACKOFF_MAX
+            )
+            self.backoff_until = time.monotonic() + delay
+        logger.warning(f"Endpoint {self.label} rate limited: resting for {delay}s")
+
+
+class PoolProvider(JSONBaseProvider):
+    """
+    Node provider spreading the requests of a network over several endpoints:
+    - endpoints are picked at random by weight, among those with compute units left
+      in their token bucket (per-method costs in COMPUTE_UNITS)
+    - rate-limited endpoints (HTTP 429 or rate limit errors) rest with a backoff
+    - endpoints failing repeatedly (connection errors, 5xx) are left out for a while
+      (circuit breaker), and the request fails over to the other endpoints
+    - optionally, read requests still running after their latency percentile are
+      hedged: a duplicate goes to another endpoint (or connection), the first answer
+      wins, and the late one is dropped (up to HEDGE_MAX_PER_SECOND)
+    URLs are never logged: endpoints are referred to by their label (e.g.: ETHEREUM#2).
+    """
+
+    def __init__(self, endpoints: list, hedge: bool = False):
+        super().__init__()
+        self.endpoints = endpoints
+        self.hedge = hedge
+        self.latency = LatencyTracker()
+        self.hedge_budget = TokenBucket(HEDGE_MAX_PER_SECOND)
+        self.hedge_stats = Counter()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, network: str):
+        """
+        Builds the pool of a network from `.env`: PROVIDER_<NETWORK> holds one or
+        several comma-separated URLs, with optional PROVIDER_<NETWORK>_WEIGHTS and
+        PROVIDER_<NETWORK>_CUPS (compute units per second, empty if unlimited) lists.
+        Hedging is enabled with PROVIDER_<NETWORK>_HEDGE=true.
+        """
+        urls = cls._get_list(f"PROVIDER_{network}")
+        weights = cls._get_list(f"PROVIDER_{network}_WEIGHTS")
+        cups = cls._get_list(f"PROVIDER_{network}_CUPS")
+        try:
+            endpoints = [
+                Endpoint(
+                    f"{network}#{i + 1}",
+                    url=url,
+                    weight=float(weights[i]) if i < len(weights) and weights[i] else 1,
+                    cu_per_second=float(cups[i]) if i < len(cups) and cups[i] else None,
+                )
+                for i, url in enumerate(urls)
+            ]
+        except ValueError as e:
+            raise ConnectionError(
+                f"Invalid node provider settings for {network} (.env): {e}"
+            )
+        hedge = (os.getenv(f"PROVIDER_{network}_HEDGE") or "").lower() == "true"
+        return cls(endpoints, hedge)
+
+    @staticmethod
+    def _get_list(name: str) -> list:
+        value = os.getenv(name) or ""
+        return [item.strip() for item in value.split(",")] if value.strip() else []
+
+    @property
+    def endpoint_uris(self) -> list:
+        """URLs of the endpoints (e.g.: to match the providers' eth_getLogs limits)"""
+        return [endpoint.url for endpoint in self.endpoints if endpoint.url]
+
+    def get_stats(self) -> dict:
+        """Returns the request counters per endpoint label, and the hedging counters"""
+        stats = {endpoint.label: dict(endpoint.stats) for endpoint in self.endpoints}
+        if self.hedge:
+            stats["hedging"] = dict(self.hedge_stats)
+        return stats
+
+    def make_request(self, method, params):
+        request = {
+            "jsonrpc": "2.0",
+            "id": next(self.request_counter),
+            "method": method,
+            "params": params or [],
+        }
+        return self._timed_request(request, [method])
+
+    def make_batch_request(self, requests: list):
+        """
+        Sends a JSON-RPC batch to a single endpoint. A batch refused as a whole
+        (HTTP 400/413) returns a single error object, so that utils.batch splits it.
+        """
+        return self._timed_request(requests, [request["method"] for request in requests])
+
+    @staticmethod
+    def get_cost(methods: list) -> int:
+        return sum(COMPUTE_UNITS.get(method, COMPUTE_UNITS["default"]) for method in methods)
+
+    def _timed_request(self, payload, methods: list):
+        """Sends the request, recording its latency into the active run metrics"""
+        start = time.monotonic()
+        failed = True
+        try:
+            response = self._request(payload, methods)
+            failed = isinstance(response, dict) and "error" in response
+            return response
+        finally:
+            record_request(methods, time.monotonic() - start, failed)
+
+    def _request(self, payload, methods: list):
+        """Sends the request, hedging it if enabled, read-only and running late"""
+        cost = self.get_cost(methods)
+        if not self.hedge or not all(method in HEDGE_METHODS for method in methods):
+            return self._send(payload, cost)
+
+        key = f"{methods[0]}[{len(methods)}]" if isinstance(payload, list) else methods[0]
+        delay = self.latency.get_percentile(key)
+        tried = set()
+        start = time.monotonic()
+        primary = self._get_executor().submit(in_context(self._send), payload, cost, tried)
+
+        def add_latency(future):
+            if future.exception() is None:
+                self.latency.add(key, time.monotonic() - start)
+
+        primary.add_done_callback(add_latency)
+        self._count("requests")
+        if delay is None:
+            return primary.result()
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.hedge_budget.try_take(1):
+            return primary.result()
+
+        # hedge: the same request to another endpoint (if any), first answer wins
+        self._count("hedges")
+        hedge = self._get_executor().submit(in_context(self._send), payload, cost, tried)
+        pending = {primary, hedge}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [future for future in done if future.exception() is None]
+            if succeeded or not pending:
+                for late in pending:
+                    late.cancel()  # a request already sent is left to finish
+                winner = succeeded[0] if succeeded else done.pop()
+                if winner is hedge and succeeded:
+                    self._count("wins")
+                return winner.result()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.hedge_stats[name] += 1
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS)
+            return self._executor
+
+    def _send(self, payload, cost: int, tried: set = None):
+        if not self.endpoints:
+            raise RequestsConnectionError("No endpoints configured for the node provider")
+        tried = set() if tried is None else tried
+        last_error = None
+        for _ in range(max(POOL_MAX_ATTEMPTS, len(self.endpoints))):
+            endpoint = self._acquire(cost, tried)
+            tried.add(endpoint)
+            endpoint.count(cost)
+            try:
+                response = endpoint.send(payload)
+            except HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status == 429:
+                    endpoint.on_rate_limited(self._get_retry_after(e.response))
+                elif status in (400, 413) and isinstance(payload, list):
+                    endpoint.on_success()
+                    error = {"code": -32600, "message": f"HTTP {status}"}
+                    return {"jsonrpc": "2.0", "id": None, "error": error}
+                else:
+                    endpoint.on_failure(e)
+                last_error = e
+                continue
+            except (RequestException, OSError, ValueError) as e:
+                endpoint.on_failure(e)
+                last_error = e
+                continue
+
+            if self._is_rate_limited(response):
+                endpoint.on_rate_limited()
+                last_error = "rate limited"
+                continue
+            endpoint.on_success()
+            return response
+
+        raise RequestsConnectionError(f"All node endpoints failed: {redact(last_error)}")
+
+    def _acquire(self, cost: int, tried: set) -> Endpoint:
+        """
+        Returns an available endpoint with enough compute units, preferring the ones
+        not tried yet for this request, and waiting for one if needed
+        """
+        while True:
+            now = time.monotonic()
+            available = [e for e in self.endpoints if e.available_at() <= now] or [
+                # if all circuits are open, they are tried anyway rather than failing
+                e
+                for e in self.endpoints
+                if e.backoff_until <= now
+            ]
+            candidates = [e for e in available if e not in tried] or available
+            # weighted random order (a higher weight means earlier, more often)
+            candidates.sort(key=lambda e: random.random() ** (1 / e.weight), reverse=True)
+            for endpoint in candidates:
+                if endpoint.bucket is None or endpoint.bucket.try_take(cost):
+                    return endpoint
+
+            if candidates:
+                wait = min(e.bucket.wait_time(cost) for e in candidates)
+            else:
+                wait = min(e.backoff_until for e in self.endpoints) - now
+            time.sleep(min(max(wait, 0.01), POOL_BACKOFF_MAX))
+
+    @staticmethod
+    def _get_retry_after(response):
+        try:
+            return float(response.headers.get("Retry-After"))
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+    @staticmethod
+    def _is_rate_limited(response) -> bool:
+        responses = response if isinstance(response, list) else [response]
+        for item in responses:
+            error = item.get("error") if isinstance(item, dict) else None
+            if isinstance(error, dict):
+                message = str(error.get("message", "")).lower()
+                if error.get("code") == 429 or any(
+                    err in message for err in PROVIDER_RATE_LIMIT_ERRORS
+                ):
+                    return True
+        return False
@@ -0,0 +1,339 @@
+import io
+import os
+import re
+import csv
+import gzip
+import json
+
+from utils.logger import setup_logger
+from utils.exceptions import FileUtilsError
+
+logger = setup_logger(__name__)
+
+COMPRESSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+# Outermost array dimension of an ABI type, e.g.: uint256[3] -> uint256
+ARRAY_TYPE = re.compile(r"^(.*)\[\d*\]$")
+
+
+class RowWriter:
+    """
+    Appends rows (dicts) to an output file, one chunk at a time, so that the
+    extracted data never needs to be kept in memory.
+    With compression, every chunk is written as an independent gzip member / zstd
+    frame: the file remains valid after each chunk and can be appended to.
+    """
+
+    extension = ""
+    # rows can be appended to the file after a crash (see utils.checkpoint)
+    resumable = True
+
+    def __init__(
+        self, file_name: str, context: str, compression: str = None, columns: list = None
+    ):
+        if compression not in COMPRESSIONS:
+            logger.error(f"Unsupported compression: {compression}")
+            raise FileUtilsError()
+        base_path = os.path.splitext(os.path.join(context, file_name))[0]
+        self.path = base_path + self.extension + COMPRESSIONS[compression]
+        self.compressor = self._get_compressor(compression)
+        self.num_rows = 0
+        self._file = None
+
+    def open(self, append: bool = False, from_block: int = None):
+        """Opens the file, either new or to append rows (`from_block` is not needed)"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "ab" if append else "wb")
+            return self
+        except OSError as e:
+            logger.error(f"open(): {e}")
+            raise FileUtilsError()
+
+    def write_rows(self, rows: list):
+        """Encodes and appends a chunk of rows, flushing it to disk"""
+        if not rows:
+            return
+        try:
+            buffer = io.StringIO()
+            self._encode(rows, buffer)
+            data = buffer.getvalue().encode("utf-8")
+            self._file.write(self.compressor(data) if self.compressor else data)
+            self._file.flush()
+            self.num_rows += len(rows)
+        except Exception as e:
+            logger.error(f"write_rows(): error writing into '{self.path}': {e}")
+            raise FileUtilsError()
+
+    @property
+    def offset(self) -> int:
+        """Number of bytes in the output file"""
+        return self._file.tell()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _encode(self, rows: list, buffer: io.StringIO):
+        raise NotImplementedError
+
+    @staticmethod
+    def _get_compressor(compression: str):
+        if compression == "gzip":
+            return gzip.compress
+        if compression == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                logger.error("zstd compression requires `pip install zstandard`")
+                raise FileUtilsError()
+            return zstandard.ZstdCompressor().compress
+        return None
+
+
+class CsvWriter(RowWriter):
+    """Writes rows as CSV, with the header taken from the first row"""
+
+    extension = ".csv"
+
+    def __init__(
+        self, file_name: str, context: str, compression: str = None, columns: list = None
+    ):
+        super().__init__(file_name, context, compression)
+        self.fieldnames = None
+        self.write_header = True
+
+    def open(self, append: bool = False, from_block: int = None):
+        # the header is only written into a new (or empty) file
+        self.write_header = not (
+            append and os.path.exists(self.path) and os.path.getsize(self.path)
+        )
+        return super().open(append)
+
+    def _encode(self, rows: list, buffer: io.StringIO):
+        writer = csv.writer(buffer, lineterminator="\n")
+        if self.fieldnames is None:
+            self.fieldnames = list(rows[0].keys())
+        if self.write_header:
+            writer.writerow(self.fieldnames)
+            self.write_header = False
+        writer.writerows([row.get(field) for field in self.fieldnames] for row in rows)
+
+
+class NdjsonWriter(RowWriter):
+    """Writes rows as newline-delimited JSON"""
+
+    extension = ".ndjson"
+
+    def _encode(self, rows: list, buffer: io.StringIO):
+        for row in rows:
+            buffer.write(json.dumps(row))
+            buffer.write("\n")
+
+
+class ColumnarWriter:
+    """
+    Writes rows into a typed columnar file (requires pyarrow), one row group / record
+    batch per chunk. Column types are taken from the event signature, as a list of
+    (column name, ABI type, decimals), e.g.: ('wad', 'uint256', 18) -> float64
+    Columnar files can't be appended to, so every resumed run writes a new part file
+    named after its first block, e.g.: default_event.18473343.parquet
+    The file is written as <path>.tmp and renamed once closed.
+    """
+
+    extension = ""
+    resumable = False
+    compressions = (None,)
+
+    def __init__(
+        self, file_name: str, context: str, compression: str = None, columns: list = None
+    ):
+        if compression not in self.compressions:
+            logger.error(
+                f"Unsupported compression for {self.extension} files: {compression} "
+                f"(options: {list(self.compressions)})"
+            )
+            raise FileUtilsError()
+        self.pa = self._import_pyarrow()
+        self.base_path = os.path.splitext(os.path.join(context, file_name))[0]
+        self.path = self.base_path + self.extension
+        self.compression = compression
+        self.columns = columns
+        self.schema = None
+        self.converters = None
+        self.num_rows = 0
+        self._writer = None
+
+    def open(self, append: bool = False, from_block: int = None):
+        """Opens the file: a new part file if appending to a previous run"""
+        if append and from_block is not None:
+            self.path = f"{self.base_path}.{from_block}{self.extension}"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            return self
+        except OSError as e:
+            logger.error(f"open(): {e}")
+            raise FileUtilsError()
+
+    def write_rows(self, rows: list):
+        """Converts a chunk of rows into typed columns, written as one row group"""
+        if not rows:
+            return
+        try:
+            if self.schema is None:
+                self._build_schema(rows[0])
+            arrays = [
+                self.pa.array(
+                    [convert(row.get(field.name)) for row in rows], type=field.type
+                )
+                for field, convert in zip(self.schema, self.converters)
+            ]
+            batch = self.pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+            if self._writer is None:
+                self._writer = self._open_writer(self.path + ".tmp")
+            self._writer.write(batch)
+            self.num_rows += len(rows)
+        except Exception as e:
+            logger.error(f"write_rows(): error writing into '{self.path}': {e}")
+            raise FileUtilsError()
+
+    @property
+    def offset(self) -> int:
+        """Number of bytes in the output file (once closed)"""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+            os.replace(self.path + ".tmp", self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open_writer(self, path: str):
+        raise NotImplementedError
+
+    def _build_schema(self, row: dict):
+        """
+        Builds the schema from the declared column types, in the order of the row.
+        Columns not declared (if any) are inferred from the first row.
+        """
+        declared = {
+            name: (arg_type, decimals) for name, arg_type, decimals in self.columns or []
+        }
+        fields, converters = [], []
+        for name, value in row.items():
+            if name in declared:
+                arrow_type, convert = self._get_column_type(*declared[name])
+            else:
+                arrow_type, convert = self.pa.array([value]).type, lambda v: v
+            fields.append(self.pa.field(name, arrow_type))
+            converters.append(convert)
+        self.schema = self.pa.schema(fields)
+        self.converters = converters
+
+    def _get_column_type(self, arg_type: str, decimals):
+        """Returns the arrow type of an ABI type, and the converter of its row values"""
+        pa = self.pa
+        array = ARRAY_TYPE.match(arg_type)
+        if array:
+            item_decimals = max(decimals) if isinstance(decimals, list) else decimals
+            item_type, convert = self._get_column_type(array.group(1), item_decimals)
+            return pa.list_(item_type), lambda values: (
+                None if values is None else [convert(value) for value in values]
+            )
+
+        if arg_type.startswith("uint") or arg_type.startswith("int"):
+            signed = arg_type.startswith("int")
+            bits = int(arg_type[len("int" if signed else "uint") :] or 256)
+            if decimals:
+                return pa.float64(), lambda v: v
+            if bits <= 64:
+                return (pa.int64() if signed or bits < 64 else pa.uint64()), lambda v: v
+            # wider integers are scaled as floats by the decoder (exact up to 2**53)
+            return pa.float64(), lambda v: None if v is None else float(v)
+
+        if arg_type == "bool":
+            return pa.bool_(), lambda v: v
+        if arg_type == "bytes":
+            return pa.binary(), lambda v: None if v is None else bytes.fromhex(v[2:])
+        if arg_type.startswith("bytes"):
+            size = int(arg_type[len("bytes") :])
+            return pa.binary(size), lambda v: None if v is None else bytes.fromhex(v)
+        # address, string and anything else is kept as text
+        return pa.string(), lambda v: v
+
+    @staticmethod
+    def _import_pyarrow():
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            logger.error("Parquet/Arrow output requires `pip install pyarrow`")
+            raise FileUtilsError()
+        return pyarrow
+
+
+class ParquetWriter(ColumnarWriter):
+    """Writes rows as Parquet, one row group per chunk (snappy compression by default)"""
+
+    extension = ".parquet"
+    compressions = (None, "gzip", "zstd")
+
+    def _open_writer(self, path: str):
+        return self.pa.parquet.ParquetWriter(
+            path, self.schema, compression=self.compression or "snappy"
+        )
+
+
+class ArrowWriter(ColumnarWriter):
+    """
+    Writes rows as an Arrow IPC file, one record batch per chunk. Uncompressed files
+    can be memory-mapped downstream without any copy (pyarrow.memory_map)
+    """
+
+    extension = ".arrow"
+    compressions = (None, "zstd")
+
+    def _open_writer(self, path: str):
+        options = self.pa.ipc.IpcWriteOptions(compression=self.compression)
+        return self.pa.ipc.new_file(path, self.schema, options=options)
+
+
+WRITERS = {
+    "csv": CsvWriter,
+    "ndjson": NdjsonWriter,
+    "parquet": ParquetWriter,
+    "arrow": ArrowWriter,
+}
+
+
+def get_writer(
+    file_name: str,
+    context: str,
+    output_format: str = None,
+    compression: str = None,
+    columns: list = None,
+):
+    """
+    Returns the writer for the given output format (csv by default).
+    `columns` (name, ABI type, decimals) set the column types of columnar formats.
+    """
+    output_format = output_format or "csv"
+    if output_format not in WRITERS:
+        logger.error(
+            f"Unsupported output format: {output_format} (options: {list(WRITERS)})"
+        )
+        raise FileUtilsError()
+    return WRITERS[output_format](file_name, context, compression, columns)